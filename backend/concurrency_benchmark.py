@@ -0,0 +1,113 @@
+"""
+Script pour vérifier que /api/chat ne bloque pas la boucle d'événements:
+- un serveur uvicorn (un worker), fournisseur stub à latence fixe
+- N conversations envoyées en même temps
+- /health et /api/conversations interrogés pendant la charge
+
+Si les appels au modèle, le décodage d'images et l'ORM tournent bien sur
+l'exécuteur borné, les N réponses arrivent en à peu près une latence du modèle,
+et non N fois cette latence.
+
+Usage:
+  python concurrency_benchmark.py
+  python concurrency_benchmark.py --chats 32 --latency-ms 2000 --workers 8
+
+Code de sortie 1 si les N réponses prennent plus de --max-ratio latences.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from load_benchmark import percentile, send, start_server
+
+def poll(base_url, stop, latencies):
+    """GET /health and /api/conversations until stop is set"""
+    while not stop.is_set():
+        for path in ("/health", "/api/conversations"):
+            started = time.perf_counter()
+            with urllib.request.urlopen(f"{base_url}{path}", timeout=30) as response:
+                response.read()
+            latencies.append(time.perf_counter() - started)
+        time.sleep(0.05)
+
+def main():
+    parser = argparse.ArgumentParser(description="N conversations simultanées contre un modèle à latence fixe")
+    parser.add_argument("--chats", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="CHAT_EXECUTOR_WORKERS (défaut: --chats)")
+    parser.add_argument("--max-ratio", type=float, default=2.0)
+    args = parser.parse_args()
+    workers = args.workers or args.chats
+
+    workdir = tempfile.mkdtemp(prefix="concurrency_benchmark_")
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'chat.db')}",
+        "RESPONSE_CACHE_BACKEND": "none",
+        "SEMANTIC_CACHE_ENABLED": "false",
+        "LLM_PROVIDER": "stub",
+        # Fixed latency, whole answer at once, same on both tiers
+        "STUB_LATENCY_MS": str(args.latency_ms),
+        "STUB_LATENCY_SIGMA": "0",
+        "STUB_TAIL_PROB": "0",
+        "STUB_TOKENS_PER_SECOND": "0",
+        "STUB_STRONG_LATENCY_FACTOR": "1",
+        "STUB_ERROR_RATE": "0",
+        "CHAT_EXECUTOR_WORKERS": str(workers),
+        # Only the executor may limit concurrency here
+        "CHAT_MAX_IN_FLIGHT": str(args.chats),
+        "UPSTREAM_INITIAL_CONCURRENCY": str(args.chats),
+        "UPSTREAM_MAX_CONCURRENCY": str(args.chats),
+        "UPSTREAM_RPM": "0",
+        "UPSTREAM_TPM": "0",
+    })
+
+    try:
+        server, base_url = start_server(env)
+    except RuntimeError as e:
+        shutil.rmtree(workdir, ignore_errors=True)
+        print(f"❌ {e}")
+        sys.exit(1)
+    try:
+        stop = threading.Event()
+        cheap_latencies = []
+        poller = threading.Thread(target=poll, args=(base_url, stop, cheap_latencies))
+        poller.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.chats) as pool:
+            results = list(pool.map(lambda index: send(base_url, index, False), range(args.chats)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        poller.join()
+        with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+            metrics = json.loads(response.read())
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latency = args.latency_ms / 1000
+    ok = sum(1 for status, _, _, _ in results if status == 200)
+    ratio = elapsed / latency
+    print(f"\n📊 {args.chats} conversations simultanées, latence du modèle {args.latency_ms:.0f} ms, "
+          f"{workers} worker(s) d'exécution")
+    print(f"  Réponses 200: {ok}/{args.chats} en {elapsed:.2f} s, soit {ratio:.1f} latence(s) du modèle "
+          f"(bloquant: ~{args.chats})")
+    print(f"  /health + /api/conversations pendant la charge: {len(cheap_latencies)} requêtes, "
+          f"p50 {percentile(cheap_latencies, 0.5) * 1000:.0f} ms, max {max(cheap_latencies, default=0) * 1000:.0f} ms")
+    print(f"  Exécuteur: {json.dumps(metrics.get('executor'))}")
+
+    if ok < args.chats or ratio > args.max_ratio:
+        print(f"❌ Attendu: {args.chats} réponses en moins de {args.max_ratio:g} latences")
+        sys.exit(1)
+    print("✅ Les conversations sont traitées en parallèle")
+
+if __name__ == "__main__":
+    main()
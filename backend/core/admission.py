@@ -0,0 +1,165 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Dict
+
+class AdmissionController:
+    """
+    Caps concurrent chat turns. Requests over the cap wait in a bounded FIFO
+    queue for at most queue_timeout seconds; beyond that they are shed, so a
+    slow upstream cannot pile up sessions and upload buffers without limit.
+    Lives on the event loop (no locks needed).
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: deque = deque()
+        # Moving average of turn durations, to tell shed clients when to come back
+        self._avg_seconds = 0.0
+
+        self.admitted = 0
+        self.queued_total = 0
+        self.admitted_from_queue = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.max_queued = 0
+        self.total_wait = 0.0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed. False when the request is shed."""
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed_queue_full += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued_total += 1
+        self.max_queued = max(self.max_queued, len(self._waiters))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait({future}, timeout=self.queue_timeout)
+        except BaseException:
+            # Client went away while waiting
+            self._abandon(future)
+            raise
+        if not future.done():
+            self._abandon(future)
+            self.shed_timeout += 1
+            return False
+        self.admitted += 1
+        self.admitted_from_queue += 1
+        self.total_wait += time.perf_counter() - started
+        return True
+
+    def _abandon(self, future: asyncio.Future):
+        if future.done() and not future.cancelled():
+            # The slot was handed over just before: pass it on
+            self.release()
+            return
+        future.cancel()
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+    def release(self, seconds: float = None):
+        """Free a slot (handing it to the oldest waiter); seconds is how long the turn took"""
+        if seconds is not None:
+            self._avg_seconds = seconds if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * seconds
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)  # The slot moves to the waiter
+                return
+        self._in_flight -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead has likely drained"""
+        turns_ahead = (len(self._waiters) + self._in_flight) / self.max_in_flight
+        return max(1, math.ceil(turns_ahead * (self._avg_seconds or 1.0)))
+
+    def stats(self) -> Dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "avg_queue_wait_ms": round(self.total_wait / self.admitted_from_queue * 1000, 1) if self.admitted_from_queue else 0.0,
+            "avg_turn_seconds": round(self._avg_seconds, 3),
+        }
+
+class AdmissionMiddleware:
+    """
+    Admission control for POST requests on the given paths, before the body
+    is read: over the limit, a quick 503 + Retry-After. The slot is released
+    once the response is fully sent (streams included), before background tasks.
+    Other endpoints (/health, listings...) are never shed.
+    """
+
+    def __init__(self, app, paths, controller: AdmissionController):
+        self.app = app
+        self.paths = tuple(paths)
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.controller.acquire():
+            await self._shed(send)
+            return
+
+        started = time.perf_counter()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.controller.release(time.perf_counter() - started)
+
+        async def tracked_send(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                release()
+
+        try:
+            await self.app(scope, receive, tracked_send)
+        finally:
+            release()
+
+    async def _shed(self, send):
+        body = json.dumps({"detail": "The server is busy, please retry shortly"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.controller.retry_after()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+# Global instance
+chat_admission = AdmissionController(
+    max_in_flight=int(os.getenv("CHAT_MAX_IN_FLIGHT", "16")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", "32")),
+    queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT", "10")),
+)
@@ -0,0 +1,147 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+from .upstream_scheduler import UpstreamBusy
+
+# Languages the local responder answers in while the circuit is open
+LOCAL_FALLBACK_LANGUAGES = [
+    language.strip() for language in os.getenv("CIRCUIT_LOCAL_LANGUAGES", "fr,en,ar").split(",") if language.strip()
+]
+
+class CircuitOpen(UpstreamBusy):
+    """The circuit is open and the request has no local answer (503 unless the endpoint has one)."""
+
+class CircuitBreaker:
+    """
+    Tracks the outcome and latency of the last `window` upstream calls.
+    Opens when, over at least `min_calls` calls, the error rate reaches
+    `max_error_rate` or the p95 latency exceeds `max_p95_latency` seconds.
+    While open, calls are refused for `open_seconds`; then it is half-open:
+    one probe call at a time goes through, closing the circuit on success
+    and reopening it on failure. A request let through that makes no
+    upstream call after all (answered by a coalesced call, refused locally,
+    stream abandoned) gives the probe back with release(); a probe that
+    never reports back is replaced after `open_seconds`.
+    Thread-safe: calls are recorded from worker threads.
+    """
+
+    def __init__(self, window: int, min_calls: int, max_error_rate: float, max_p95_latency: float, open_seconds: float):
+        self.window = window
+        self.min_calls = min_calls
+        self.max_error_rate = max_error_rate
+        self.max_p95_latency = max_p95_latency
+        self.open_seconds = open_seconds
+        # (success, latency) of the last calls
+        self._calls: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probe_started = None
+        self.trips = 0
+        self.refused = 0
+        self.last_reason = None
+
+    def allow(self) -> bool:
+        """Whether an upstream call may be made now (False: use the fallback)"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self._opened_at < self.open_seconds:
+                    self.refused += 1
+                    return False
+                self.state = "half_open"
+                self._probe_started = None
+            # Half-open: a single probe in flight
+            if self._probe_started is None or now - self._probe_started >= self.open_seconds:
+                self._probe_started = now
+                return True
+            self.refused += 1
+            return False
+
+    def release(self):
+        """
+        Call once a request let through by allow() is over. If it was the
+        half-open probe and no upstream call was recorded, the next request
+        may probe (after a recorded call the circuit is no longer half-open).
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_started = None
+
+    def record(self, success: bool, latency: float):
+        """Report the outcome of an upstream call made after allow()"""
+        with self._lock:
+            if self.state == "half_open":
+                if success and latency <= self.max_p95_latency:
+                    print("✅ Circuit closed: the AI service answered the probe")
+                    self.state = "closed"
+                    self._calls.clear()
+                else:
+                    self._open("probe failed" if not success else f"probe took {latency:.1f}s")
+                return
+            if self.state == "open":
+                return  # Call started before the circuit opened
+
+            self._calls.append((success, latency))
+            if len(self._calls) < self.min_calls:
+                return
+            error_rate = self._error_rate()
+            p95 = self._p95()
+            if error_rate >= self.max_error_rate:
+                self._open(f"error rate {error_rate:.0%}")
+            elif p95 is not None and p95 > self.max_p95_latency:
+                self._open(f"p95 latency {p95:.1f}s")
+
+    def _open(self, reason: str):
+        """Lock held"""
+        print(f"⚡ Circuit opened ({reason}): local answers for {self.open_seconds:g}s")
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._probe_started = None
+        self.trips += 1
+        self.last_reason = reason
+
+    def _error_rate(self) -> float:
+        return sum(1 for success, _ in self._calls if not success) / len(self._calls) if self._calls else 0.0
+
+    def _p95(self):
+        """Nearest-rank p95 of successful call latencies"""
+        latencies = sorted(latency for success, latency in self._calls if success)
+        if not latencies:
+            return None
+        return latencies[math.ceil(0.95 * len(latencies)) - 1]
+
+    def retry_after(self) -> int:
+        """Seconds until the next probe may be made"""
+        with self._lock:
+            if self.state != "open":
+                return 1
+            return max(1, math.ceil(self.open_seconds - (time.monotonic() - self._opened_at)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            p95 = self._p95()
+            return {
+                "state": self.state,
+                "calls": len(self._calls),
+                "error_rate": round(self._error_rate(), 3),
+                "p95_seconds": round(p95, 3) if p95 is not None else None,
+                "trips": self.trips,
+                "refused": self.refused,
+                "last_reason": self.last_reason,
+                "local_languages": LOCAL_FALLBACK_LANGUAGES,
+            }
+
+# Global instance
+llm_breaker = CircuitBreaker(
+    window=int(os.getenv("CIRCUIT_WINDOW", "20")),
+    min_calls=int(os.getenv("CIRCUIT_MIN_CALLS", "5")),
+    max_error_rate=float(os.getenv("CIRCUIT_MAX_ERROR_RATE", "0.5")),
+    max_p95_latency=float(os.getenv("CIRCUIT_MAX_P95_LATENCY", "20")),
+    open_seconds=float(os.getenv("CIRCUIT_OPEN_SECONDS", "30")),
+)
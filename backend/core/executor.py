@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+class BlockingExecutor:
+    """
+    Dedicated, bounded thread pool for blocking work (Gemini calls, PIL decoding,
+    ORM queries) so it never runs on the event loop.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or int(os.getenv("CHAT_EXECUTOR_WORKERS", "16"))
+        self._pool = None
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queued = 0
+        self._completed = 0
+
+    def _track(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking callable on the pool and await its result.
+        Context variables (e.g. upstream_conversation) are carried over, as asyncio.to_thread does.
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="chat-worker")
+            pool = self._pool
+            self._queued += 1
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            pool, functools.partial(context.run, self._track, fn, *args, **kwargs)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "completed": self._completed,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+# Global instance
+blocking_executor = BlockingExecutor()
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Shortcut for blocking_executor.run()"""
+    return await blocking_executor.run(fn, *args, **kwargs)
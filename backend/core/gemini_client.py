@@ -1,15 +1,39 @@
 import os
 import warnings
-# Note: google.generativeai is deprecated but still works
-with warnings.catch_warnings():
-    warnings.filterwarnings("ignore", category=FutureWarning)
-    import google.generativeai as genai
-from typing import Optional, List, Dict
-import base64
-import io
-from PIL import Image
+from typing import Optional, Dict
+import threading
+import time
+from .llm_provider import LLMProvider
+from .model_discovery import discover_models, is_model_unavailable_error, model_cache, tier_preferences
+
+# How the model was chosen at startup (reported under /metrics)
+model_discovery_stats = {}
+
+_genai = None
+
+def load_genai():
+    """
+    Import google.generativeai on first use: it takes most of the backend's
+    import time, and only the warmed-up client needs it.
+    """
+    global _genai
+    if _genai is None:
+        # Note: google.generativeai is deprecated but still works
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=FutureWarning)
+            import google.generativeai as genai
+        _genai = genai
+    return _genai
+
+class GeminiClient(LLMProvider):
+    """The Google Gemini provider (LLM_PROVIDER=gemini, the default)"""
+
+    name = "gemini"
+
+    @classmethod
+    def missing_configuration(cls) -> Optional[str]:
+        return None if os.getenv("GOOGLE_API_KEY") else "GOOGLE_API_KEY is not set"
 
-class GeminiClient:
     def __init__(self, api_key: Optional[str] = None):
         """
         Initialize Gemini API client with automatic model discovery.
@@ -18,237 +42,77 @@ class GeminiClient:
         if not self.api_key:
             raise ValueError("Google API key not found. Please set GOOGLE_API_KEY in environment variables.")
         
+        genai = load_genai()
         genai.configure(api_key=self.api_key)
         
-        # Try models in order - gemini-pro is most reliable
-        models_to_try = [
-            'gemini-pro',           # Most stable and widely available
-            'models/gemini-pro',    # With prefix
-            'gemini-1.5-pro',       # Newer version
-            'gemini-1.5-flash',    # Faster version
-        ]
-        
-        model_initialized = False
-        working_model = None
-        
-        print("🔍 Initializing Gemini model...")
-        
-        for model_name in models_to_try:
-            try:
-                print(f"  Trying: {model_name}...")
-                test_model = genai.GenerativeModel(model_name)
-                # Quick test
-                test_response = test_model.generate_content("hi")
-                if test_response:
-                    self.model = test_model
-                    self.vision_model = genai.GenerativeModel(model_name)
-                    working_model = model_name
-                    print(f"✅ Successfully initialized: {model_name}")
-                    model_initialized = True
-                    break
-            except Exception as e:
-                error_msg = str(e)
-                if "404" in error_msg or "not found" in error_msg.lower():
-                    print(f"  ❌ {model_name} not available")
-                else:
-                    print(f"  ⚠️ {model_name} error: {str(e)[:80]}")
-                continue
+        # One model per routing tier (fast / strong), see model_router
+        self.tier_preferences = tier_preferences()
+        self._revalidate_lock = threading.Lock()
         
-        if not model_initialized:
-            # Last attempt: list all models and try first available
+        print("🔍 Initializing Gemini models...")
+        started = time.perf_counter()
+        models = model_cache.load(self.api_key, self.tier_preferences)
+        source = "cache"
+        if not models or set(models) != set(self.tier_preferences):
+            # No generation call: the choice comes from list_models() metadata
             try:
-                print("\n🔍 Listing all available models...")
-                all_models = list(genai.list_models())
-                for model in all_models[:10]:  # Check first 10
-                    model_name = model.name.split('/')[-1] if '/' in model.name else model.name
-                    if model_name in models_to_try:
-                        continue  # Already tried
-                    
-                    try:
-                        print(f"  Trying: {model_name}...")
-                        test_model = genai.GenerativeModel(model_name)
-                        test_response = test_model.generate_content("hi")
-                        if test_response:
-                            self.model = test_model
-                            self.vision_model = genai.GenerativeModel(model_name)
-                            working_model = model_name
-                            print(f"✅ Successfully initialized: {model_name}")
-                            model_initialized = True
-                            break
-                    except:
-                        continue
+                models = discover_models(genai, self.tier_preferences)
             except Exception as e:
-                print(f"⚠️ Could not list models: {e}")
-        
-        if not model_initialized:
-            error_msg = """
-❌ CRITICAL: Could not initialize any Gemini model!
+                print(f"""
+❌ CRITICAL: Could not initialize any Gemini model! ({str(e)[:120]})
 
 Possible solutions:
 1. Check your API key in backend/.env
 2. Verify API is enabled in Google Cloud Console
 3. Check API quota/limits
 4. Run: python backend/test_models.py
-
-Error details will be shown above.
-"""
-            print(error_msg)
-            raise ValueError("Could not initialize Gemini model")
+""")
+                raise ValueError("Could not initialize Gemini model")
+            model_cache.save(self.api_key, models, self.tier_preferences)
+            source = "list_models"
+        self._use_models(models)
         
-        print(f"🎯 Using model: {working_model}\n")
-
-    def generate_text_response(
-        self, 
-        user_message: str, 
-        conversation_history: Optional[List[Dict]] = None,
-        language: str = "fr"
-    ) -> str:
-        """Generate a text response using Gemini API."""
-        try:
-            system_prompts = {
-                "fr": """Tu es un assistant IA intelligent et très utile. Tu dois:
-- Répondre à TOUTES les questions de manière directe et précise
-- Comprendre le contexte et donner des réponses complètes
-- Si tu ne connais pas quelque chose, dis-le honnêtement
-- Sois naturel, amical et professionnel
-- Réponds toujours en français""",
-                "en": """You are an intelligent and very helpful AI assistant. You must:
-- Answer ALL questions directly and accurately
-- Understand context and provide complete answers
-- If you don't know something, say so honestly
-- Be natural, friendly, and professional
-- Always respond in English""",
-                "ar": """أنت مساعد ذكي ومفيد جدًا. يجب عليك:
-- الإجابة على جميع الأسئلة بشكل مباشر ودقيق
-- فهم السياق وإعطاء إجابات كاملة
-- إذا كنت لا تعرف شيئًا، قل ذلك بصراحة
-- كن طبيعيًا وودودًا ومهنيًا
-- أجب دائمًا بالعربية"""
-            }
-            
-            system_prompt = system_prompts.get(language, system_prompts["fr"])
-            
-            # Build conversation context
-            conversation_context = ""
-            if conversation_history:
-                recent_history = conversation_history[-6:]
-                for msg in recent_history:
-                    role_label = {
-                        "fr": {"user": "Utilisateur", "assistant": "Assistant"},
-                        "en": {"user": "User", "assistant": "Assistant"},
-                        "ar": {"user": "المستخدم", "assistant": "المساعد"}
-                    }
-                    role_name = role_label[language].get(msg.get("role", "user"), "User")
-                    conversation_context += f"{role_name}: {msg.get('content', '')}\n"
-            
-            # Build prompt
-            if conversation_context:
-                if language == "ar":
-                    prompt = f"{system_prompt}\n\nتاريخ المحادثة:\n{conversation_context}\nالمستخدم: {user_message}\nالمساعد:"
-                elif language == "fr":
-                    prompt = f"{system_prompt}\n\nHistorique de la conversation:\n{conversation_context}\nUtilisateur: {user_message}\nAssistant:"
-                else:
-                    prompt = f"{system_prompt}\n\nConversation history:\n{conversation_context}\nUser: {user_message}\nAssistant:"
-            else:
-                if language == "ar":
-                    prompt = f"{system_prompt}\n\nالمستخدم: {user_message}\nالمساعد:"
-                elif language == "fr":
-                    prompt = f"{system_prompt}\n\nUtilisateur: {user_message}\nAssistant:"
-                else:
-                    prompt = f"{system_prompt}\n\nUser: {user_message}\nAssistant:"
-            
-            # Generate response
-            response = self.model.generate_content(prompt)
-            
-            # Extract text from response
-            if hasattr(response, 'text') and response.text:
-                return response.text.strip()
-            
-            if hasattr(response, 'candidates') and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    if len(candidate.content.parts) > 0:
-                        part = candidate.content.parts[0]
-                        if hasattr(part, 'text') and part.text:
-                            return part.text.strip()
-            
-            return str(response).strip()
-            
-        except Exception as e:
-            error_msg = {
-                "fr": f"Désolé, une erreur s'est produite: {str(e)[:150]}",
-                "en": f"Sorry, an error occurred: {str(e)[:150]}",
-                "ar": f"عذرًا، حدث خطأ: {str(e)[:150]}"
-            }
-            print(f"❌ Gemini API Error: {e}")
-            return error_msg.get(language, error_msg["fr"])
+        elapsed = time.perf_counter() - started
+        model_discovery_stats.update({
+            "models": dict(models),
+            "source": source,
+            "startup_seconds": round(elapsed, 3),
+            "probe_calls": 0,
+        })
+        print(f"🎯 Using models: {self.model_name} (from {source}, {elapsed:.2f}s, 0 probe calls)\n")
 
-    def generate_image_response(
-        self,
-        user_message: str,
-        image_data: bytes,
-        conversation_history: Optional[List[Dict]] = None,
-        language: str = "fr"
-    ) -> str:
-        """Generate a response based on image and text using Gemini Vision API."""
-        try:
-            # Convert image bytes to PIL Image
-            image = Image.open(io.BytesIO(image_data))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Build prompt
-            if not user_message or not user_message.strip():
-                prompts = {
-                    "fr": "Analyse cette image en détail et décris tout ce que tu vois.",
-                    "en": "Analyze this image in detail and describe everything you see.",
-                    "ar": "حلل هذه الصورة بالتفصيل ووصف كل ما تراه."
-                }
-            else:
-                prompts = {
-                    "fr": f"Analyse cette image et réponds à cette question en français: {user_message}",
-                    "en": f"Analyze this image and answer this question in English: {user_message}",
-                    "ar": f"حلل هذه الصورة وأجب على هذا السؤال بالعربية: {user_message}"
-                }
-            
-            prompt = prompts.get(language, prompts["fr"])
-            
-            # Generate response
-            response = self.vision_model.generate_content([prompt, image])
-            
-            # Extract text
-            if hasattr(response, 'text') and response.text:
-                return response.text.strip()
-            
-            if hasattr(response, 'candidates') and len(response.candidates) > 0:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    if len(candidate.content.parts) > 0:
-                        part = candidate.content.parts[0]
-                        if hasattr(part, 'text') and part.text:
-                            return part.text.strip()
-            
-            return str(response).strip()
-            
-        except Exception as e:
-            error_msg = {
-                "fr": f"Erreur lors de l'analyse de l'image: {str(e)[:150]}",
-                "en": f"Error analyzing image: {str(e)[:150]}",
-                "ar": f"خطأ في تحليل الصورة: {str(e)[:150]}"
-            }
-            print(f"❌ Vision API Error: {e}")
-            return error_msg.get(language, error_msg["fr"])
+    def _use_models(self, models: Dict[str, str]):
+        genai = load_genai()
+        # Tiers sharing a model share one GenerativeModel
+        instances = {name: genai.GenerativeModel(name) for name in set(models.values())}
+        self.tier_models = dict(models)
+        self._models = {tier: instances[name] for tier, name in models.items()}
 
-# Global instance
-gemini_client = None
+    def _revalidate_model(self, failed_model: str):
+        """
+        Called when a real request says a model is gone: drop the cached
+        choice and rediscover the tiers without it. Concurrent failures revalidate once.
+        """
+        with self._revalidate_lock:
+            if failed_model not in self.tier_models.values():
+                return  # Another request already switched model
+            print(f"🔄 Model {failed_model} unavailable, rediscovering...")
+            model_cache.invalidate()
+            models = discover_models(load_genai(), self.tier_preferences, exclude=[failed_model])
+            model_cache.save(self.api_key, models, self.tier_preferences)
+            self._use_models(models)
+            model_discovery_stats["models"] = dict(models)
+            model_discovery_stats["source"] = "revalidation"
+            model_discovery_stats["revalidations"] = model_discovery_stats.get("revalidations", 0) + 1
+            print(f"🎯 Switched to models: {self.model_name}")
 
-def get_gemini_client() -> Optional[GeminiClient]:
-    """Get or create Gemini client instance"""
-    global gemini_client
-    if gemini_client is None:
+    def _generate_content(self, tier: str, contents, stream: bool = False):
+        """generate_content on a tier's current model, retried once on a new model if it is gone"""
+        model_name = self.tier_models[tier]
         try:
-            gemini_client = GeminiClient()
+            return self._models[tier].generate_content(contents, stream=stream)
         except Exception as e:
-            print(f"⚠️ Warning: Could not initialize Gemini client: {e}")
-            return None
-    return gemini_client
+            if not is_model_unavailable_error(e):
+                raise
+            self._revalidate_model(model_name)
+            return self._models[tier].generate_content(contents, stream=stream)
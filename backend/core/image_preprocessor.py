@@ -0,0 +1,181 @@
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, TYPE_CHECKING
+from .image_store import file_sha256
+from .singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+def to_rgb(image: "Image.Image") -> "Image.Image":
+    """RGB copy of an image for JPEG encoding, transparency flattened on white"""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+class PreparedImage:
+    """An image payload ready for the vision model (encoded bytes + MIME type)."""
+
+    def __init__(self, data: bytes, mime_type: str, width: int, height: int):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+
+    def as_blob(self) -> Dict:
+        """Inline blob part for google.generativeai contents"""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+class ImagePreprocessor:
+    """
+    Shrinks images before they are sent to Gemini: the longest side is capped
+    at max_side and the result re-encoded as JPEG. JPEGs are decoded at reduced
+    scale (draft) and resampling goes through reduce() first, so a 12MP phone
+    photo never has to be fully decoded.
+
+    Prepared payloads are cached by content hash, in memory (LRU bounded by
+    bytes) and on disk, so an image is processed once per settings.
+    """
+
+    def __init__(self, max_side: int, quality: int, cache_dir: Optional[str], max_memory_bytes: int):
+        self.max_side = max_side
+        self.quality = quality
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self._memory = OrderedDict()  # cache key -> PreparedImage
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        # Own instance: image decodes do not show up in the chat coalescing counters
+        self._singleflight = SingleFlight()
+        self.prepared = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _cache_key(self, sha256: str) -> str:
+        return f"{sha256}-{self.max_side}-q{self.quality}"
+
+    def _disk_path(self, key: str) -> str:
+        return f"{self.cache_dir}/{key[:2]}/{key}.jpg"
+
+    def prepare(self, image_path: str, sha256: Optional[str] = None) -> PreparedImage:
+        """Prepared payload of an image file; sha256 is computed when not given"""
+        if sha256 is None:
+            sha256 = file_sha256(image_path)
+        key = self._cache_key(sha256)
+
+        with self._lock:
+            prepared = self._memory.get(key)
+            if prepared is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return prepared
+
+        # Concurrent requests for the same image share one decode
+        return self._singleflight.do(f"image:{key}", self._load_or_process, image_path, key)
+
+    def _load_or_process(self, image_path: str, key: str) -> PreparedImage:
+        prepared = self._load_from_disk(key)
+        if prepared is None:
+            prepared = self._process(image_path)
+            self._save_to_disk(key, prepared)
+        self._remember(key, prepared)
+        return prepared
+
+    def _process(self, image_path: str) -> PreparedImage:
+        from PIL import Image, ImageOps
+
+        with Image.open(image_path) as image:
+            # JPEG: let the decoder downscale by a power of two while decoding
+            image.draft("RGB", (self.max_side, self.max_side))
+            image = ImageOps.exif_transpose(image)
+            image = to_rgb(image)
+            # reducing_gap: integer reduce() first, then a cheap final resample
+            image.thumbnail((self.max_side, self.max_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+            out = io.BytesIO()
+            image.save(out, "JPEG", quality=self.quality, optimize=True)
+            prepared = PreparedImage(out.getvalue(), "image/jpeg", image.width, image.height)
+
+        with self._lock:
+            self.prepared += 1
+            self.bytes_in += os.path.getsize(image_path)
+            self.bytes_out += len(prepared.data)
+        return prepared
+
+    def _load_from_disk(self, key: str) -> Optional[PreparedImage]:
+        from PIL import Image
+
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                data = f.read()
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        return PreparedImage(data, "image/jpeg", width, height)
+
+    def _save_to_disk(self, key: str, prepared: PreparedImage):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so a reader never sees a partial file
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(prepared.data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ Warning: Could not cache prepared image: {e}")
+
+    def _remember(self, key: str, prepared: PreparedImage):
+        size = len(prepared.data)
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = prepared
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.data)
+
+    def stats(self) -> Dict:
+        coalescing = self._singleflight.stats()
+        with self._lock:
+            return {
+                "max_side": self.max_side,
+                "prepared": self.prepared,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "coalescing": coalescing,
+            }
+
+# Global instance
+image_preprocessor = ImagePreprocessor(
+    max_side=int(os.getenv("IMAGE_MAX_SIDE", "1536")),
+    quality=int(os.getenv("IMAGE_JPEG_QUALITY", "85")),
+    cache_dir=os.getenv("IMAGE_CACHE_DIR", "cache/images") or None,
+    max_memory_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
@@ -0,0 +1,98 @@
+import hashlib
+import os
+from typing import Optional, Tuple
+
+# Magic bytes of the image formats we accept, for the blob file extension
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+]
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in chunks"""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+# Bytes needed to recognize every format above
+IMAGE_HEADER_BYTES = 12
+
+def image_extension(header: bytes) -> Optional[str]:
+    """Extension of the image format starting with these bytes, None if it is not one we accept"""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return ".webp"
+    for signature, extension in _SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+def sniff_extension(path: str) -> str:
+    """File extension from the file's magic bytes (not from the client's file name)"""
+    with open(path, "rb") as f:
+        header = f.read(IMAGE_HEADER_BYTES)
+    return image_extension(header) or ".img"
+
+class ImageStore:
+    """
+    Content-addressed image storage: a blob is named by its SHA-256 and
+    sharded in two directory levels (ab/cd/abcd....png), so identical
+    uploads are stored once. Reference counts live in the image_blobs table.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def blob_path(self, sha256: str, extension: str) -> str:
+        return f"{self.root}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+    def path_for(self, temp_path: str, sha256: str) -> str:
+        """Where put() will store this file"""
+        return self.blob_path(sha256, sniff_extension(temp_path))
+
+    def put(self, temp_path: str, sha256: str) -> Tuple[str, bool]:
+        """
+        Move a hashed temporary file into the store.
+        Returns (blob path, created); when the blob already exists the temp file is dropped.
+        Call it once the reference is committed, so a concurrent delete that
+        removed the file in the meantime is repaired (see retire()).
+        """
+        path = self.path_for(temp_path, sha256)
+        if os.path.exists(path):
+            os.remove(temp_path)
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return path, True
+
+    def retire(self, path: str) -> Optional[str]:
+        """
+        First step of deleting a blob: rename it aside. The caller then checks
+        that the blob is still unreferenced and either remove()s the returned
+        path or restore()s it; a concurrent put() meanwhile re-creates the file.
+        Returns None when the file is already gone.
+        """
+        retired = f"{path}.deleting"
+        try:
+            os.replace(path, retired)
+        except FileNotFoundError:
+            return None
+        return retired
+
+    def restore(self, retired: str, path: str):
+        """Put back a retired blob that got referenced again"""
+        os.replace(retired, path)
+
+    def remove(self, path: str):
+        """Delete a blob file that is no longer referenced"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+# Global instance
+image_store = ImageStore("uploads/blobs")
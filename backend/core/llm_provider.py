@@ -0,0 +1,463 @@
+import asyncio
+import importlib
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+from .circuit_breaker import llm_breaker
+from .executor import run_blocking
+from .image_preprocessor import image_preprocessor
+from .model_router import is_complex_message, model_router
+from .tokens import estimate_tokens, message_tokens, select_history
+from .upstream_scheduler import is_upstream_failure, upstream_scheduler
+
+# Maximum number of previous messages loaded for the prompt
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "20"))
+# Tokens of history (summary included) a prompt may carry, newest messages first
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+# What an image costs the vision model, taken from the history budget
+IMAGE_PROMPT_TOKENS = int(os.getenv("IMAGE_PROMPT_TOKENS", "258"))
+# Refresh the conversation summary every N turns (0 disables summaries)
+SUMMARY_EVERY_TURNS = int(os.getenv("SUMMARY_EVERY_TURNS", "5"))
+
+def trim_history(conversation_history: List[Dict], with_image: bool = False) -> List[Dict]:
+    """
+    The part of a history that goes into a prompt: the summary entry
+    (role "summary", always first) plus the most recent messages that fit
+    in the token budget (less the image's share on the vision path).
+    """
+    budget = HISTORY_TOKEN_BUDGET - (IMAGE_PROMPT_TOKENS if with_image else 0)
+    return select_history(conversation_history[-(HISTORY_WINDOW + 1):], budget)
+
+def estimate_contents_tokens(contents) -> int:
+    """Prompt tokens of a request, for the per-minute token quota"""
+    if isinstance(contents, str):
+        return estimate_tokens(contents)
+    return sum(estimate_tokens(part) if isinstance(part, str) else IMAGE_PROMPT_TOKENS for part in contents)
+
+def usage_tokens(response) -> Optional[int]:
+    """Tokens the API says a response used (prompt + answer), when it reports them"""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) or None
+
+class LLMProvider(ABC):
+    """
+    A text + vision model behind the chat: builds the prompts (budgeted
+    history, system prompt, prepared image) and sends them through the
+    model router (fast/strong tiers, hedging) and the upstream scheduler
+    (quotas, adaptive concurrency, retries), so every provider is measured
+    under the same pipeline.
+    Implementations set `name` and `tier_models` ({"fast": ..., "strong": ...})
+    and implement _generate_content(); responses expose `.text` (and
+    `usage_metadata.total_token_count` when known), streams yield such chunks.
+    Errors carrying an HTTP status in `.code` are retried like API errors.
+    """
+
+    name = "provider"
+    tier_models: Dict[str, str] = {}
+
+    @classmethod
+    def missing_configuration(cls) -> Optional[str]:
+        """Why the provider cannot start (e.g. a missing API key), None when it can"""
+        return None
+
+    @property
+    def model_name(self) -> str:
+        """The models in use ("fast|strong"), e.g. for cache keys"""
+        return "|".join(self.tier_models[tier] for tier in sorted(self.tier_models))
+
+    def stats(self) -> Dict:
+        """Reported under /metrics"""
+        return {"name": self.name, "models": dict(self.tier_models)}
+
+    @abstractmethod
+    def _generate_content(self, tier: str, contents, stream: bool = False):
+        """One request to a tier's model: contents is a prompt or [prompt, image blob]"""
+
+    def _generate(self, vision: bool, contents, stream: bool = False, user_message: Optional[str] = None, conversation_history: Optional[List[Dict]] = None):
+        """
+        _generate_content on the model the router picks (fast or strong tier,
+        possibly hedged on the other), through the upstream scheduler (quotas,
+        adaptive concurrency, retries). Streams are returned as an iterator of chunks.
+        The tier depends on the user's message and, separately, on the history
+        sent with it; without a user message (e.g. summaries), on the whole prompt.
+        Only this upstream call is reported to the circuit breaker (prompt and
+        image preparation happen before it).
+        """
+        tokens = estimate_contents_tokens(contents)
+        if user_message is None:
+            primary, alternative = model_router.route(tokens, vision)
+        else:
+            history_tokens = sum(message_tokens(msg) for msg in trim_history(conversation_history or [], with_image=vision))
+            primary, alternative = model_router.route(
+                estimate_tokens(user_message), vision, history_tokens, is_complex_message(user_message)
+            )
+        names = dict(self.tier_models)
+
+        if stream:
+            def attempt(tier):
+                return upstream_scheduler.stream(
+                    lambda: self._generate_content(tier, contents, stream=True), tokens, usage=usage_tokens
+                )
+            return self._recorded_stream(model_router.stream(primary, alternative, names, attempt))
+
+        def attempt(tier):
+            return upstream_scheduler.call(lambda: self._generate_content(tier, contents), tokens, usage=usage_tokens)
+        started = time.perf_counter()
+        try:
+            response = model_router.call(primary, alternative, names, attempt)
+        except Exception as e:
+            self._record_failure(e, started)
+            raise
+        llm_breaker.record(True, time.perf_counter() - started)
+        return response
+
+    def _recorded_stream(self, chunks: Iterator) -> Iterator:
+        """Pass a stream through, reported to the circuit breaker with its time to first chunk"""
+        started = time.perf_counter()
+        first_chunk = None
+        try:
+            for chunk in chunks:
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                yield chunk
+        except Exception as e:
+            self._record_failure(e, started)
+            raise
+        llm_breaker.record(True, first_chunk if first_chunk is not None else time.perf_counter() - started)
+
+    def _record_failure(self, error: Exception, started: float):
+        # Local refusals (UpstreamBusy) and rejected requests say nothing about upstream health
+        if is_upstream_failure(error):
+            llm_breaker.record(False, time.perf_counter() - started)
+
+    def _format_history(self, conversation_history: Optional[List[Dict]], language: str, with_image: bool = False) -> str:
+        """History lines for the prompt, within the token budget."""
+        conversation_context = ""
+        if conversation_history:
+            recent_history = trim_history(conversation_history, with_image)
+            for msg in recent_history:
+                role_label = {
+                    "fr": {"user": "Utilisateur", "assistant": "Assistant", "summary": "Résumé des échanges précédents"},
+                    "en": {"user": "User", "assistant": "Assistant", "summary": "Summary of the earlier conversation"},
+                    "ar": {"user": "المستخدم", "assistant": "المساعد", "summary": "ملخص المحادثة السابقة"}
+                }
+                role_name = role_label[language].get(msg.get("role", "user"), "User")
+                conversation_context += f"{role_name}: {msg.get('content', '')}\n"
+        return conversation_context
+
+    def _build_text_prompt(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict]],
+        language: str
+    ) -> str:
+        """Build the text prompt (system prompt + recent history + user message)."""
+        system_prompts = {
+            "fr": """Tu es un assistant IA intelligent et très utile. Tu dois:
+- Répondre à TOUTES les questions de manière directe et précise
+- Comprendre le contexte et donner des réponses complètes
+- Si tu ne connais pas quelque chose, dis-le honnêtement
+- Sois naturel, amical et professionnel
+- Réponds toujours en français""",
+            "en": """You are an intelligent and very helpful AI assistant. You must:
+- Answer ALL questions directly and accurately
+- Understand context and provide complete answers
+- If you don't know something, say so honestly
+- Be natural, friendly, and professional
+- Always respond in English""",
+            "ar": """أنت مساعد ذكي ومفيد جدًا. يجب عليك:
+- الإجابة على جميع الأسئلة بشكل مباشر ودقيق
+- فهم السياق وإعطاء إجابات كاملة
+- إذا كنت لا تعرف شيئًا، قل ذلك بصراحة
+- كن طبيعيًا وودودًا ومهنيًا
+- أجب دائمًا بالعربية"""
+        }
+
+        system_prompt = system_prompts.get(language, system_prompts["fr"])
+
+        # Build conversation context
+        conversation_context = self._format_history(conversation_history, language)
+
+        # Build prompt
+        if conversation_context:
+            if language == "ar":
+                return f"{system_prompt}\n\nتاريخ المحادثة:\n{conversation_context}\nالمستخدم: {user_message}\nالمساعد:"
+            elif language == "fr":
+                return f"{system_prompt}\n\nHistorique de la conversation:\n{conversation_context}\nUtilisateur: {user_message}\nAssistant:"
+            else:
+                return f"{system_prompt}\n\nConversation history:\n{conversation_context}\nUser: {user_message}\nAssistant:"
+        else:
+            if language == "ar":
+                return f"{system_prompt}\n\nالمستخدم: {user_message}\nالمساعد:"
+            elif language == "fr":
+                return f"{system_prompt}\n\nUtilisateur: {user_message}\nAssistant:"
+            else:
+                return f"{system_prompt}\n\nUser: {user_message}\nAssistant:"
+
+    def _build_image_contents(
+        self,
+        user_message: str,
+        image_path: str,
+        language: str,
+        image_hash: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> list:
+        """Build the [prompt, image] contents for the vision model."""
+        # Downscaled, re-encoded payload (cached by content hash)
+        image = image_preprocessor.prepare(image_path, image_hash).as_blob()
+
+        # Build prompt
+        if not user_message or not user_message.strip():
+            prompts = {
+                "fr": "Analyse cette image en détail et décris tout ce que tu vois.",
+                "en": "Analyze this image in detail and describe everything you see.",
+                "ar": "حلل هذه الصورة بالتفصيل ووصف كل ما تراه."
+            }
+        else:
+            prompts = {
+                "fr": f"Analyse cette image et réponds à cette question en français: {user_message}",
+                "en": f"Analyze this image and answer this question in English: {user_message}",
+                "ar": f"حلل هذه الصورة وأجب على هذا السؤال بالعربية: {user_message}"
+            }
+
+        prompt = prompts.get(language, prompts["fr"])
+
+        # Same budgeted history as the text path, minus the image's share
+        conversation_context = self._format_history(conversation_history, language, with_image=True)
+        if conversation_context:
+            history_titles = {
+                "fr": "Historique de la conversation",
+                "en": "Conversation history",
+                "ar": "تاريخ المحادثة"
+            }
+            prompt = f"{history_titles.get(language, history_titles['fr'])}:\n{conversation_context}\n{prompt}"
+
+        return [prompt, image]
+
+    def _extract_text(self, response) -> str:
+        """Extract the text of a (possibly partial) response."""
+        if hasattr(response, 'text') and response.text:
+            return response.text
+
+        if hasattr(response, 'candidates') and len(response.candidates) > 0:
+            candidate = response.candidates[0]
+            if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                if len(candidate.content.parts) > 0:
+                    part = candidate.content.parts[0]
+                    if hasattr(part, 'text') and part.text:
+                        return part.text
+
+        return str(response)
+
+    def _iter_stream(self, response) -> Iterator[str]:
+        """Yield the text of each chunk of a streamed response."""
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. safety metadata only)
+                continue
+            if text:
+                yield text
+
+    def summarize_conversation(self, previous_summary: Optional[str], messages: List[Dict]) -> str:
+        """
+        Fold older messages into the rolling conversation summary.
+        Errors are raised to the caller.
+        """
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        prompt = (
+            "You maintain a running summary of a conversation between a user and an assistant.\n"
+            "Update the summary with the new messages. Keep facts, names, numbers, decisions and "
+            "open questions the assistant may need later; drop small talk. At most 200 words, "
+            "written in the language of the conversation.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            "Updated summary:"
+        )
+        response = self._generate(False, prompt)
+        return self._extract_text(response).strip()
+
+    def generate_text_response(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict]] = None,
+        language: str = "fr"
+    ) -> str:
+        """
+        Generate a text response.
+        Errors are raised to the caller (ResponseGenerator turns them into a reply).
+        """
+        prompt = self._build_text_prompt(user_message, conversation_history, language)
+
+        # Generate response
+        response = self._generate(False, prompt, user_message=user_message, conversation_history=conversation_history)
+        return self._extract_text(response).strip()
+
+    def generate_image_response(
+        self,
+        user_message: str,
+        image_path: str,
+        conversation_history: Optional[List[Dict]] = None,
+        language: str = "fr",
+        image_hash: Optional[str] = None
+    ) -> str:
+        """
+        Generate a response based on image and text.
+        Errors are raised to the caller (ResponseGenerator turns them into a reply).
+        """
+        contents = self._build_image_contents(user_message, image_path, language, image_hash, conversation_history)
+
+        # Generate response
+        response = self._generate(True, contents, user_message=user_message, conversation_history=conversation_history)
+        return self._extract_text(response).strip()
+
+    def stream_text_response(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict]] = None,
+        language: str = "fr"
+    ) -> Iterator[str]:
+        """
+        Stream a text response chunk by chunk.
+        Errors are raised to the caller.
+        """
+        prompt = self._build_text_prompt(user_message, conversation_history, language)
+        response = self._generate(False, prompt, stream=True, user_message=user_message, conversation_history=conversation_history)
+        yield from self._iter_stream(response)
+
+    def stream_image_response(
+        self,
+        user_message: str,
+        image_path: str,
+        conversation_history: Optional[List[Dict]] = None,
+        language: str = "fr",
+        image_hash: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Stream a vision response chunk by chunk.
+        Errors are raised to the caller.
+        """
+        contents = self._build_image_contents(user_message, image_path, language, image_hash, conversation_history)
+        response = self._generate(True, contents, stream=True, user_message=user_message, conversation_history=conversation_history)
+        yield from self._iter_stream(response)
+
+# Providers selectable with LLM_PROVIDER: module and class, imported on first use
+PROVIDERS = {
+    "gemini": (".gemini_client", "GeminiClient"),
+    "stub": (".stub_provider", "StubProvider"),
+}
+
+def provider_class(name: str):
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}' (available: {', '.join(PROVIDERS)})")
+    module, class_name = PROVIDERS[name]
+    return getattr(importlib.import_module(module, __package__), class_name)
+
+class ProviderWarmup:
+    """
+    Initializes the LLM provider in a background task, retrying with
+    exponential backoff (and jitter) until it succeeds, so the app serves
+    immediately and requests never pay for (or repeat) the initialization.
+    States: pending -> warming -> ready, or retrying between attempts,
+    or failed when the provider is unknown or not configured (nothing to retry).
+    """
+
+    def __init__(self, provider_name: str, initial_delay: float, max_delay: float):
+        self.provider_name = provider_name
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.state = "pending"
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.next_attempt_at: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self._started_at = None
+        self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self):
+        """Start warming up in the background (call from the running event loop)"""
+        if self._task is None:
+            self._started_at = time.monotonic()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        global llm_provider
+        try:
+            cls = provider_class(self.provider_name)
+            problem = cls.missing_configuration()
+        except Exception as e:
+            problem = str(e)[:200]
+        if problem:
+            self.state = "failed"
+            self.last_error = problem
+            print(f"⚠️ Warning: LLM provider '{self.provider_name}' not initialized: {problem}")
+            return
+
+        while True:
+            self.state = "warming"
+            self.attempts += 1
+            try:
+                llm_provider = await run_blocking(cls)
+            except Exception as e:
+                delay = min(self.max_delay, self.initial_delay * 2 ** (self.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+                self.state = "retrying"
+                self.last_error = str(e)[:200]
+                self.next_attempt_at = time.time() + delay
+                print(f"⚠️ Warning: Could not initialize the {self.provider_name} provider (attempt {self.attempts}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            self.state = "ready"
+            self.last_error = None
+            self.next_attempt_at = None
+            self.ready_seconds = round(time.monotonic() - self._started_at, 3)
+            print(f"✅ LLM provider '{self.provider_name}' initialized successfully ({self.ready_seconds}s)")
+            return
+
+    def retry_after(self) -> int:
+        """Seconds a client should wait before retrying a request"""
+        if self.next_attempt_at is not None:
+            return max(1, int(self.next_attempt_at - time.time()) + 1)
+        return 1
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "provider": self.provider_name,
+            "state": self.state,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "retry_after": None if self.state in ("ready", "failed") else self.retry_after(),
+            "ready_seconds": self.ready_seconds,
+        }
+
+# Global instance
+llm_provider = None
+llm_warmup = ProviderWarmup(
+    provider_name=os.getenv("LLM_PROVIDER", "gemini").strip().lower(),
+    initial_delay=float(os.getenv("LLM_WARMUP_INITIAL_DELAY", "1")),
+    max_delay=float(os.getenv("LLM_WARMUP_MAX_DELAY", "300")),
+)
+
+def get_llm_provider() -> Optional[LLMProvider]:
+    """
+    The provider once llm_warmup has initialized it, else None.
+    Never initializes anything itself, so requests stay fast before warm-up.
+    """
+    return llm_provider
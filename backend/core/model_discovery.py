@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Preferred models, in order; the first one list_models() offers for generateContent wins
+PREFERRED_MODELS = [
+    'gemini-pro',
+    'gemini-1.5-pro',
+    'gemini-1.5-flash',
+]
+
+def tier_preferences() -> Dict[str, List[str]]:
+    """
+    Preferred models per routing tier (see model_router): a fast model for
+    short text prompts, a stronger one for long or image prompts.
+    GEMINI_FAST_MODEL / GEMINI_STRONG_MODEL force a tier's first choice,
+    GEMINI_MODEL both; they are still checked against list_models().
+    """
+    forced = [os.getenv("GEMINI_MODEL")] if os.getenv("GEMINI_MODEL") else []
+    fast = [os.getenv("GEMINI_FAST_MODEL")] if os.getenv("GEMINI_FAST_MODEL") else []
+    strong = [os.getenv("GEMINI_STRONG_MODEL")] if os.getenv("GEMINI_STRONG_MODEL") else []
+    return {
+        "fast": fast + forced + ['gemini-1.5-flash'] + PREFERRED_MODELS,
+        "strong": strong + forced + ['gemini-1.5-pro'] + PREFERRED_MODELS,
+    }
+
+def short_model_name(name: str) -> str:
+    return name.split('/')[-1]
+
+def is_model_unavailable_error(error: Exception) -> bool:
+    """Errors meaning the model itself is gone (not a transient or quota error)"""
+    message = str(error).lower()
+    return (
+        type(error).__name__ == "NotFound"
+        or "404" in message
+        or "not found" in message
+        or "is not supported for generatecontent" in message
+    )
+
+class ModelCache:
+    """
+    The chosen model per tier in a small JSON file with a TTL, shared by every
+    uvicorn worker (and every restart) on the machine. Keyed by a hash of the
+    API key, since another key may not see the same models, and by a hash of
+    the tier preferences, so changing GEMINI_*MODEL takes effect on restart.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+
+    def _key_id(self, api_key: str) -> str:
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def _preferences_id(self, preferences: Dict[str, List[str]]) -> str:
+        encoded = json.dumps(preferences, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+    def load(self, api_key: str, preferences: Dict[str, List[str]]) -> Optional[Dict[str, str]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key_id") != self._key_id(api_key) or entry.get("discovered_at", 0) + self.ttl < time.time():
+            return None
+        if entry.get("preferences_id") != self._preferences_id(preferences):
+            return None
+        return entry.get("models")
+
+    def save(self, api_key: str, models: Dict[str, str], preferences: Dict[str, List[str]]):
+        entry = {
+            "models": models,
+            "key_id": self._key_id(api_key),
+            "preferences_id": self._preferences_id(preferences),
+            "discovered_at": time.time(),
+        }
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            # Write then rename so a worker never reads a partial file
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Warning: Could not cache Gemini model choice: {e}")
+
+    def invalidate(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def discover_models(genai, preferences: Dict[str, List[str]], exclude: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Pick a model per tier from one list_models() call (metadata only, no
+    generation call): the first preferred model supporting generateContent,
+    else the first such model.
+    """
+    excluded = {short_model_name(name) for name in exclude}
+    available = [
+        short_model_name(model.name)
+        for model in genai.list_models()
+        if "generateContent" in (getattr(model, "supported_generation_methods", None) or [])
+    ]
+    available = [name for name in available if name not in excluded]
+    if not available:
+        raise ValueError("No Gemini model supporting generateContent is available for this API key")
+    models = {}
+    for tier, preferred in preferences.items():
+        models[tier] = next(
+            (short_model_name(name) for name in preferred if short_model_name(name) in available),
+            available[0]
+        )
+    return models
+
+# Global instance
+model_cache = ModelCache(
+    path=os.getenv("GEMINI_MODEL_CACHE_PATH", "cache/gemini_model.json"),
+    ttl=float(os.getenv("GEMINI_MODEL_CACHE_TTL", "86400")),
+)
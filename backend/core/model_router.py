@@ -0,0 +1,262 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+def _discard_result(future, discard: Callable[[Any], None]):
+    if not future.cancelled() and future.exception() is None:
+        discard(future.result())
+
+# Relative step of the running p90 estimate
+P90_STEP = 0.1
+
+# What makes a short message worth the strong model (matched lowercase):
+# code, and requests for reasoning or detail, in the supported languages
+COMPLEX_MARKERS = (
+    "```", "step by step", "in detail", "compare", "analyze", "analyse", "prove", "debug",
+    "étape par étape", "en détail", "démontre", "prouve",
+    "خطوة بخطوة", "بالتفصيل", "قارن", "حلل",
+)
+
+def is_complex_message(text: str) -> bool:
+    """Whether a user message asks for more than a quick answer (code, reasoning, several questions)"""
+    lowered = text.lower()
+    if any(marker in lowered for marker in COMPLEX_MARKERS):
+        return True
+    return lowered.count("?") + lowered.count("؟") >= 3
+
+class LatencyStats:
+    """
+    Latency of a model (seconds): an EWMA of the mean, and a running p90
+    estimate nudged by every sample (up by 0.9 steps when a sample is above
+    it, down by 0.1 steps otherwise, so it settles where 10% of samples are
+    above; steps are relative to the estimate). Unlike mean + z * stddev,
+    a few very slow calls do not drag it up.
+    """
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.p90 = 0.0
+        self.samples = 0
+        self.errors = 0
+
+    def add(self, latency: float):
+        if not self.samples:
+            self.mean = self.p90 = latency
+        else:
+            self.mean += self.alpha * (latency - self.mean)
+            step = P90_STEP * self.p90
+            self.p90 += step * 0.9 if latency > self.p90 else -step * 0.1
+        self.samples += 1
+
+class ModelRouter:
+    """
+    Chooses a model tier per request and optionally hedges:
+    - text requests go to the "fast" tier when the user's message is at most
+      `fast_max_tokens` and not complex (is_complex_message) and the history
+      sent with it is at most `fast_max_history_tokens`; others go to the
+      "strong" tier, image prompts to `image_tier`. The system prompt is the
+      same for every request and does not count;
+    - each model's latency is tracked as an EWMA, with a running p90;
+    - hedging: a raced request runs on the hedge pool while its caller
+      waits; when it is still running after its model's p90, the same request
+      is sent to the other tier and the first answer wins. Only `hedge_budget`
+      of the requests (e.g. 0.05 = 5%) are raced, once the model has
+      `min_samples` latency samples and while the pool has two free workers;
+      the others run inline on the caller's thread.
+    The losing request is left to finish (its latency is still recorded);
+    a losing stream is closed as soon as it has opened.
+    """
+
+    def __init__(self, fast_max_tokens: int, fast_max_history_tokens: int, image_tier: str, hedge_budget: float, min_samples: int, alpha: float, hedge_workers: int):
+        self.fast_max_tokens = fast_max_tokens
+        self.fast_max_history_tokens = fast_max_history_tokens
+        self.image_tier = image_tier
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.hedge_workers = hedge_workers
+        self._stats: Dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        # Earned by every request, spent by hedges; capped to limit bursts
+        self._hedge_credit = 0.0
+        self.routed = {"fast": 0, "strong": 0}
+        # Pool workers taken by raced requests and their hedges
+        self._pool_busy = 0
+        self.raced = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def route(self, message_tokens: int, has_image: bool, history_tokens: int = 0, complex_message: bool = False) -> Tuple[str, str]:
+        """(primary tier, alternative tier for hedging)"""
+        if has_image:
+            tier = self.image_tier
+        elif (
+            message_tokens <= self.fast_max_tokens
+            and history_tokens <= self.fast_max_history_tokens
+            and not complex_message
+        ):
+            tier = "fast"
+        else:
+            tier = "strong"
+        with self._lock:
+            self.routed[tier] = self.routed.get(tier, 0) + 1
+        return tier, "strong" if tier == "fast" else "fast"
+
+    # --- Latency tracking ---
+
+    def _record(self, model_name: str, latency: Optional[float]):
+        with self._lock:
+            stats = self._stats.setdefault(model_name, LatencyStats(self.alpha))
+            if latency is None:
+                stats.errors += 1
+            else:
+                stats.add(latency)
+
+    def _timed(self, model_name: str, fn: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            self._record(model_name, None)
+            raise
+        self._record(model_name, time.perf_counter() - started)
+        return result
+
+    def _race_delay(self, model_name: str) -> Optional[float]:
+        """
+        Seconds after which a request to model_name is hedged, or None to run
+        it inline: the caller can only take the hedge's answer if the first
+        call runs on the pool, so only raced requests use it.
+        """
+        if self.hedge_budget <= 0:
+            return None
+        with self._lock:
+            self._hedge_credit = min(10.0, self._hedge_credit + self.hedge_budget)
+            stats = self._stats.get(model_name)
+            if stats is None or stats.samples < self.min_samples:
+                return None
+            # Room for the first call and its hedge, or the race would queue
+            if self._hedge_credit < 1 or self._pool_busy + 2 > self.hedge_workers:
+                return None
+            self._hedge_credit -= 1
+            self.raced += 1
+            return stats.p90
+
+    def _release_worker(self, future):
+        with self._lock:
+            self._pool_busy -= 1
+
+    def _submit(self, fn: Callable, *args):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix="hedge")
+            pool = self._pool
+            self._pool_busy += 1
+        # Context variables (e.g. the upstream conversation) follow the request
+        future = pool.submit(contextvars.copy_context().run, fn, *args)
+        future.add_done_callback(self._release_worker)
+        return future
+
+    # --- Calls ---
+
+    def _race(self, primary: str, alternative: str, names: Dict[str, str], open_call: Callable[[str], Any], discard: Callable[[Any], None] = None) -> Any:
+        """
+        Run open_call(primary), inline unless the request is raced: then on
+        the pool, hedged with open_call(alternative) after the primary model's
+        p90. Returns the first successful result; discard() receives a losing
+        result that completes later.
+        """
+        delay = self._race_delay(names[primary])
+        if delay is None:
+            return self._timed(names[primary], lambda: open_call(primary))
+
+        first = self._submit(self._timed, names[primary], lambda: open_call(primary))
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        with self._lock:
+            self.hedged += 1
+        print(f"🏁 Hedging: {names[primary]} slower than its p90 ({delay:.1f}s), also asking {names[alternative]}")
+        second = self._submit(self._timed, names[alternative], lambda: open_call(alternative))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if future is second:
+                    with self._lock:
+                        self.hedge_wins += 1
+                if discard is not None:
+                    for loser in pending:
+                        loser.add_done_callback(lambda f: _discard_result(f, discard))
+                return future.result()
+        raise error
+
+    def call(self, primary: str, alternative: str, names: Dict[str, str], attempt: Callable[[str], Any]) -> Any:
+        """attempt(tier) runs the request on a tier's model; names maps tiers to model names"""
+        return self._race(primary, alternative, names, attempt)
+
+    def stream(self, primary: str, alternative: str, names: Dict[str, str], attempt: Callable[[str], Iterator]) -> Iterator:
+        """
+        Streaming counterpart of call(): attempt(tier) returns a chunk iterator.
+        Latency (and the race) is up to the first chunk.
+        """
+        def open_stream(tier: str):
+            chunks = iter(attempt(tier))
+            return next(chunks, None), chunks
+
+        def close_stream(opened):
+            close = getattr(opened[1], "close", None)
+            if close:
+                close()
+
+        first, chunks = self._race(primary, alternative, names, open_stream, discard=close_stream)
+        if first is None:
+            return
+        yield first
+        yield from chunks
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "routed": dict(self.routed),
+                "raced": self.raced,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "pool_busy": self._pool_busy,
+                "models": {
+                    name: {
+                        "samples": stats.samples,
+                        "errors": stats.errors,
+                        "ewma_seconds": round(stats.mean, 3),
+                        "p90_seconds": round(stats.p90, 3),
+                    }
+                    for name, stats in self._stats.items()
+                },
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+# Global instance
+model_router = ModelRouter(
+    fast_max_tokens=int(os.getenv("ROUTER_FAST_MAX_TOKENS", "600")),
+    fast_max_history_tokens=int(os.getenv("ROUTER_FAST_MAX_HISTORY_TOKENS", "2000")),
+    image_tier=os.getenv("ROUTER_IMAGE_TIER", "strong"),
+    hedge_budget=float(os.getenv("ROUTER_HEDGE_BUDGET", "0.05")),
+    min_samples=int(os.getenv("ROUTER_MIN_SAMPLES", "10")),
+    alpha=float(os.getenv("ROUTER_EWMA_ALPHA", "0.2")),
+    hedge_workers=int(os.getenv("ROUTER_HEDGE_WORKERS", "16")),
+)
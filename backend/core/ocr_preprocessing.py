@@ -0,0 +1,100 @@
+from typing import Optional, Tuple
+import numpy as np
+from PIL import Image, ImageOps
+
+# Full language set, used when the script cannot be detected
+ALL_LANGUAGES = "fra+eng+ara"
+# Tesseract OSD script name -> traineddata to load
+SCRIPT_LANGUAGES = {
+    "Latin": "fra+eng",
+    "Arabic": "ara",
+}
+
+def to_grayscale(image: Image.Image) -> Image.Image:
+    """Upright 8-bit grayscale copy, transparency flattened on white"""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    return image.convert("L")
+
+def text_region_ratio(gray: Image.Image, sample_side: int = 512, tile: int = 16, edge_threshold: int = 40, tile_density: float = 0.15) -> float:
+    """
+    Share of tiles that look like text: many strong horizontal/vertical
+    intensity steps. Smooth photos, gradients and blank scans score ~0.
+    """
+    sample = gray.copy()
+    sample.thumbnail((sample_side, sample_side))
+    pixels = np.asarray(sample, dtype=np.int16)
+    if pixels.shape[0] < 2 or pixels.shape[1] < 2:
+        return 0.0
+    edges = np.zeros(pixels.shape, dtype=bool)
+    edges[:, 1:] |= np.abs(np.diff(pixels, axis=1)) > edge_threshold
+    edges[1:, :] |= np.abs(np.diff(pixels, axis=0)) > edge_threshold
+
+    rows, cols = edges.shape[0] // tile, edges.shape[1] // tile
+    if rows == 0 or cols == 0:
+        return float(edges.mean() >= tile_density)
+    tiles = edges[:rows * tile, :cols * tile].reshape(rows, tile, cols, tile).mean(axis=(1, 3))
+    return float((tiles >= tile_density).mean())
+
+def normalize_scale(gray: Image.Image, min_side: int, max_side: int) -> Image.Image:
+    """
+    Bring the image to a size tesseract reads well: huge scans are downscaled,
+    small screenshots upscaled (glyphs need roughly 20+ px of height).
+    """
+    longest = max(gray.size)
+    if longest > max_side:
+        gray = gray.copy()
+        gray.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    elif longest < min_side:
+        factor = min_side / longest
+        gray = gray.resize((round(gray.width * factor), round(gray.height * factor)), Image.Resampling.BICUBIC)
+    return gray
+
+def binarize(gray: Image.Image) -> Image.Image:
+    """Otsu threshold computed with NumPy on the grayscale histogram"""
+    histogram = np.bincount(np.asarray(gray).ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    levels = np.arange(256)
+    weight_background = np.cumsum(histogram)
+    weight_foreground = total - weight_background
+    cumulative_mean = np.cumsum(histogram * levels)
+    mean_background = cumulative_mean / np.maximum(weight_background, 1)
+    mean_foreground = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_foreground, 1)
+    between_variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    threshold = int(np.argmax(between_variance))
+    return gray.point(lambda value: 255 if value > threshold else 0, mode="L")
+
+def detect_script(gray: Image.Image, timeout: float = 0) -> Tuple[Optional[str], int]:
+    """
+    Tesseract OSD pass: (script name, rotation in degrees to make the text upright).
+    Returns (None, 0) when OSD is unavailable or finds too little text.
+    """
+    import pytesseract
+
+    try:
+        osd = pytesseract.image_to_osd(gray, output_type=pytesseract.Output.DICT, timeout=timeout)
+    except (pytesseract.TesseractError, RuntimeError):
+        return None, 0
+    return osd.get("script"), int(osd.get("rotate", 0))
+
+def prepare_for_ocr(image: Image.Image, min_side: int, max_side: int, min_text_ratio: float, detect: bool = True, timeout: float = 0) -> Tuple[Optional[Image.Image], str]:
+    """
+    Adaptive preprocessing: (binarized image, tesseract languages), or
+    (None, "") when the image shows no text-like regions and OCR can be skipped.
+    """
+    gray = to_grayscale(image)
+    if text_region_ratio(gray) < min_text_ratio:
+        return None, ""
+
+    gray = normalize_scale(gray, min_side, max_side)
+    languages = ALL_LANGUAGES
+    if detect:
+        script, rotate = detect_script(gray, timeout)
+        if rotate:
+            # OSD gives the clockwise correction, PIL rotates counter-clockwise
+            gray = gray.rotate(-rotate, expand=True, fillcolor=255)
+        languages = SCRIPT_LANGUAGES.get(script, ALL_LANGUAGES)
+    return binarize(gray), languages
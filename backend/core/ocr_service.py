@@ -0,0 +1,205 @@
+import asyncio
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict
+from .image_store import file_sha256
+
+class OCRQueueFull(Exception):
+    """Every OCR worker is busy and the waiting queue is full."""
+
+def _ocr_job(image_path: str, options: Dict, timeout: float) -> Dict:
+    """
+    Runs in a worker process: OCR one image file.
+    Returns {"text", "languages", "skipped"}.
+    """
+    from PIL import Image
+    import pytesseract
+    from .ocr_preprocessing import ALL_LANGUAGES, prepare_for_ocr
+
+    if os.getenv("TESSERACT_CMD"):
+        pytesseract.pytesseract.tesseract_cmd = os.getenv("TESSERACT_CMD")
+
+    with Image.open(image_path) as image:
+        if not options["adaptive"]:
+            # pytesseract kills the tesseract process itself when the timeout expires
+            text = pytesseract.image_to_string(image, lang=ALL_LANGUAGES, timeout=timeout)
+            return {"text": text.strip(), "languages": ALL_LANGUAGES, "skipped": False}
+
+        prepared, languages = prepare_for_ocr(
+            image, options["min_side"], options["max_side"], options["min_text_ratio"],
+            detect=options["detect_script"], timeout=timeout
+        )
+    if prepared is None:
+        return {"text": "", "languages": "", "skipped": True}
+    text = pytesseract.image_to_string(prepared, lang=languages, timeout=timeout)
+    return {"text": text.strip(), "languages": languages, "skipped": False}
+
+class OCRService:
+    """
+    Tesseract OCR in a pool of worker processes (OCR is CPU-bound, threads would
+    serialize on the GIL for the pre/post-processing and oversubscribe the cores).
+
+    At most workers + max_queue jobs are accepted at a time, further requests
+    fail fast with OCRQueueFull. Each job has a timeout. Results are cached by
+    image SHA-256 and concurrent requests for the same image share one job.
+
+    With adaptive set, images without text-like regions are skipped and the
+    others are normalized, binarized and read with the languages of the script
+    found by tesseract OSD (see ocr_preprocessing), instead of fra+eng+ara always.
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float, cache_max_entries: int, adaptive: bool = True,
+                 min_side: int = 1000, max_side: int = 3000, min_text_ratio: float = 0.01, detect_script: bool = True):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.cache_max_entries = cache_max_entries
+        self.options = {
+            "adaptive": adaptive,
+            "min_side": min_side,
+            "max_side": max_side,
+            "min_text_ratio": min_text_ratio,
+            "detect_script": detect_script,
+        }
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._available: Optional[bool] = None
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._in_flight: Dict[str, Future] = {}
+        self._cache = OrderedDict()  # sha256 -> text
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.skipped = 0
+        self.languages: Dict[str, int] = {}
+
+    def available(self) -> bool:
+        """Whether the tesseract binary can be found (checked once)"""
+        if self._available is None:
+            self._available = shutil.which(os.getenv("TESSERACT_CMD") or "tesseract") is not None
+            if not self._available:
+                print("⚠️ Warning: tesseract not found, OCR is disabled")
+        return self._available
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Created on first use, so importing the app does not fork workers
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _submit(self, image_path: str, sha256: Optional[str]) -> Future:
+        """Cached result, in-flight job or new job for an image, as a Future"""
+        if sha256 is None:
+            sha256 = file_sha256(image_path)
+
+        with self._lock:
+            if sha256 in self._cache:
+                self._cache.move_to_end(sha256)
+                self.cache_hits += 1
+                future = Future()
+                future.set_result({"text": self._cache[sha256], "languages": "", "skipped": False})
+                return future
+            future = self._in_flight.get(sha256)
+            if future is not None:
+                return future
+
+            if not self._slots.acquire(blocking=False):
+                self.rejected += 1
+                raise OCRQueueFull(f"OCR queue is full ({self.workers} workers, {self.max_queue} waiting)")
+            self.submitted += 1
+            try:
+                future = self._get_pool().submit(_ocr_job, image_path, self.options, self.timeout)
+            except BaseException:
+                self._slots.release()
+                raise
+            self._in_flight[sha256] = future
+
+        future.add_done_callback(lambda f: self._on_done(sha256, f))
+        return future
+
+    def _on_done(self, sha256: str, future: Future):
+        self._slots.release()
+        with self._lock:
+            self._in_flight.pop(sha256, None)
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+                return
+            self.completed += 1
+            result = future.result()
+            if result["skipped"]:
+                self.skipped += 1
+            else:
+                self.languages[result["languages"]] = self.languages.get(result["languages"], 0) + 1
+            self._cache[sha256] = result["text"]
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def _wait_timeout(self) -> float:
+        # The job's own timeout plus the time it may spend in the queue
+        return self.timeout * (1 + self.max_queue / max(1, self.workers))
+
+    def _timed_out(self, image_path: str) -> TimeoutError:
+        with self._lock:
+            self.timeouts += 1
+        return TimeoutError(f"OCR timed out for {image_path}")
+
+    def extract_text(self, image_path: str, sha256: Optional[str] = None) -> str:
+        """Blocking API (for code already running in a worker thread)"""
+        future = self._submit(image_path, sha256)
+        try:
+            return future.result(timeout=self._wait_timeout())["text"]
+        except FutureTimeoutError:
+            raise self._timed_out(image_path)
+
+    async def extract_text_async(self, image_path: str, sha256: Optional[str] = None) -> str:
+        """Async API: awaits the worker process without blocking the event loop"""
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(file_sha256, image_path)
+        future = self._submit(image_path, sha256)
+        try:
+            # shield: a cancelled waiter must not cancel a job others may share
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self._wait_timeout())
+        except asyncio.TimeoutError:
+            raise self._timed_out(image_path)
+        return result["text"]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": len(self._in_flight),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "cache_hits": self.cache_hits,
+                "cache_entries": len(self._cache),
+                "skipped": self.skipped,
+                "languages": dict(self.languages),
+            }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Global instance
+ocr_service = OCRService(
+    workers=int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1))),
+    max_queue=int(os.getenv("OCR_MAX_QUEUE", "32")),
+    timeout=float(os.getenv("OCR_TIMEOUT", "30")),
+    cache_max_entries=int(os.getenv("OCR_CACHE_MAX_ENTRIES", "1000")),
+    adaptive=os.getenv("OCR_ADAPTIVE", "true").lower() == "true",
+    min_side=int(os.getenv("OCR_MIN_SIDE", "1000")),
+    max_side=int(os.getenv("OCR_MAX_SIDE", "3000")),
+    min_text_ratio=float(os.getenv("OCR_MIN_TEXT_RATIO", "0.01")),
+    detect_script=os.getenv("OCR_DETECT_SCRIPT", "true").lower() == "true",
+)
@@ -1,9 +1,5 @@
 import re
 import unicodedata
-import nltk
-
-# Ensurepunkt and stopwords are downloaded (or handle in startup)
-# nltk.download('punkt') # Consider doing this in main app startup to avoid reloading
 
 class TextProcessor:
     def __init__(self):
@@ -16,8 +12,8 @@ class TextProcessor:
         # Convert to lowercase
         text = text.lower()
 
-        # Remove accents
-        text = unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8')
+        # Remove accents (combining marks only, so Arabic and other scripts are kept)
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
 
         # Remove punctuation (keep only alphanumeric and spaces)
         text = re.sub(r'[^\w\s]', '', text)
@@ -31,9 +27,7 @@ class TextProcessor:
         """
         Splits text into tokens.
         """
-        # Simple tokenization by splitting on space if NLTK is too heavy for simple requirement
-        # But using nltk is better for robustness
-        # return nltk.word_tokenize(text)
+        # Whitespace split: text is already normalized (no punctuation)
         return text.split()
 
 processor = TextProcessor()
@@ -0,0 +1,38 @@
+import json
+from typing import Callable, Dict
+
+class ReadinessMiddleware:
+    """
+    Answers requests on the given paths with 503 + Retry-After while a
+    dependency is not ready, before the request body is read.
+    """
+
+    def __init__(self, app, paths, status: Callable[[], Dict]):
+        self.app = app
+        self.paths = tuple(paths)
+        self.status = status
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        status = self.status()
+        if status["ready"]:
+            await self.app(scope, receive, send)
+            return
+
+        detail = (
+            "The AI service is not configured"
+            if status["state"] == "failed"
+            else "The AI service is starting up, please retry shortly"
+        )
+        body = json.dumps({"detail": detail, "state": status["state"]}).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        if status.get("retry_after"):
+            headers.append((b"retry-after", str(status["retry_after"]).encode()))
+        await send({"type": "http.response.start", "status": 503, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict
+
+class InMemoryCacheBackend:
+    """Per-process LRU cache bounded by entry count and total bytes, with TTL."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.time() + ttl)
+            self._bytes += size
+            # Evict least recently used entries
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries), "bytes": self._bytes}
+
+class SQLiteCacheBackend:
+    """
+    LRU cache stored in a local SQLite file, shared by every uvicorn worker
+    process on the machine. Same bounds and TTL as InMemoryCacheBackend.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_access ON response_cache (last_access)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads: one per executor thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + ttl, now)
+            )
+            conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+            # Evict least recently used entries
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+            while count > self.max_entries or total > self.max_bytes:
+                victim = conn.execute(
+                    "SELECT key, size FROM response_cache ORDER BY last_access LIMIT 1"
+                ).fetchone()
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (victim[0],))
+                count -= 1
+                total -= victim[1]
+
+    def stats(self) -> Dict:
+        with self._connection() as conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM response_cache").fetchone()
+        return {"backend": "sqlite", "entries": count, "bytes": total}
+
+class ResponseCache:
+    """
+    Exact-match cache of Gemini answers, keyed on
+    (model, language, normalized prompt, history window sent, image hash).
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def make_key(self, model: str, language: str, normalized_prompt: str, history: Optional[List[Dict]] = None, image_hash: Optional[str] = None) -> str:
+        history_hash = hashlib.sha256(json.dumps(
+            [[msg.get("role"), msg.get("content")] for msg in (history or [])],
+            ensure_ascii=False
+        ).encode("utf-8")).hexdigest()
+        raw = json.dumps([model, language, normalized_prompt, history_hash, image_hash], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"⚠️ Response cache read failed: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            print(f"⚠️ Response cache write failed: {e}")
+
+    def stats(self) -> Dict:
+        stats = {"hits": self.hits, "misses": self.misses}
+        if self.enabled:
+            stats.update(self.backend.stats())
+        else:
+            stats["backend"] = "none"
+        return stats
+
+def _create_backend():
+    """Pick the cache backend from RESPONSE_CACHE_BACKEND (memory, sqlite or none)"""
+    backend = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+    max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    max_bytes = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(10 * 1024 * 1024)))
+    if backend == "sqlite":
+        path = os.getenv("RESPONSE_CACHE_PATH", "cache/responses.sqlite3")
+        return SQLiteCacheBackend(path, max_entries, max_bytes)
+    if backend == "memory":
+        return InMemoryCacheBackend(max_entries, max_bytes)
+    return None
+
+# Global instance
+response_cache = ResponseCache(_create_backend(), ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")))
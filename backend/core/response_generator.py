@@ -1,9 +1,19 @@
 import random
 import re
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Iterator, Union
 from .processor import processor
-from .image_analyzer import image_analyzer
-from .gemini_client import get_gemini_client
+from .circuit_breaker import LOCAL_FALLBACK_LANGUAGES, CircuitOpen, llm_breaker
+from .llm_provider import get_llm_provider, trim_history
+from .response_cache import response_cache
+from .semantic_cache import number_tokens, semantic_cache
+from .singleflight import Pending, singleflight
+from .upstream_scheduler import UpstreamBusy
+
+def _error_detail(error: Exception) -> str:
+    """The part of an error shown in the reply: OSError messages (PIL included) carry server file paths"""
+    if isinstance(error, OSError):
+        return type(error).__name__
+    return str(error)[:100]
 
 class ResponseGenerator:
     def __init__(self):
@@ -30,6 +40,28 @@ class ResponseGenerator:
             "en": "I don't understand your question well. Can you be more specific or rephrase it differently?",
             "ar": "لا أفهم سؤالك جيدًا. هل يمكنك أن تكون أكثر تحديدًا أو إعادة صياغته بشكل مختلف؟"
         }
+        
+        # Messages the local responder answers while the circuit is open. The whole
+        # message (normalized: lowercase, no accents or punctuation) must be one of
+        # these phrases, so "can you help me write..." still needs the model.
+        # Help and thanks answers come from _generate_intelligent_response.
+        self.intent_phrases = {
+            "help": {
+                "fr": {"aide", "aidez moi", "aide moi", "jai besoin daide", "help"},
+                "en": {"help", "help me", "help please", "i need help"},
+                "ar": {"مساعدة", "help"}
+            },
+            "thanks": {
+                "fr": {"merci", "merci beaucoup", "merci bien", "merci encore"},
+                "en": {"thanks", "thank you", "thanks a lot", "thank you very much", "many thanks"},
+                "ar": {"شكرا", "شكرا جزيلا", "شكرا لك"}
+            },
+            "greeting": {
+                "fr": {"bonjour", "salut", "bonsoir", "coucou", "hello", "hi"},
+                "en": {"hello", "hi", "hey", "hi there", "hello there", "good morning", "good afternoon", "good evening"},
+                "ar": {"مرحبا", "أهلا", "اهلا", "السلام عليكم", "salam", "marhaba", "ahlan"}
+            }
+        }
 
     def detect_language(self, text: str) -> str:
         """
@@ -63,10 +95,102 @@ class ResponseGenerator:
         # Default to English
         return "en"
 
-    def generate_response(self, user_message: str, image_data: Optional[bytes] = None, conversation_history: List[Dict] = None) -> Dict[str, str]:
+    def _cache_key(self, provider, language: str, normalized_text: str, user_message: str, conversation_history: List[Dict], image_hash: Optional[str] = None) -> str:
+        # normalize() drops punctuation ("2-2" -> "22"): the numbers as written are part of the key
+        prompt = f"{normalized_text}\x00{' '.join(number_tokens(user_message))}"
+        return response_cache.make_key(
+            provider.model_name, language, prompt, trim_history(conversation_history, with_image=image_hash is not None), image_hash
+        )
+
+    def _coalescing_key(self, provider, language: str, normalized_text: str, user_message: str, conversation_history: List[Dict], image_path: Optional[str], image_hash: Optional[str], use_cache: bool) -> Optional[str]:
+        """Cache/coalescing key of a request, or None when its answer must not be shared"""
+        if not use_cache or (image_path and not image_hash):
+            return None
+        return self._cache_key(provider, language, normalized_text, user_message, conversation_history, image_hash)
+
+    def _get_cached_answer(self, provider, language: str, normalized_text: str, user_message: str, conversation_history: List[Dict], image_path: Optional[str], image_hash: Optional[str], use_cache: bool) -> Optional[str]:
+        """
+        Look a request up in the exact-match cache (images by content hash),
+        then, for single-turn text questions only, in the semantic cache.
+        """
+        key = self._coalescing_key(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache)
+        if key is None:
+            return None
+        cached = None
+        if response_cache.enabled:
+            cached = response_cache.get(key)
+        if cached is None and not conversation_history and not image_path:
+            cached = semantic_cache.get(provider.model_name, language, normalized_text, user_message)
+        return cached
+
+    def _store_answer(self, provider, language: str, normalized_text: str, user_message: str, conversation_history: List[Dict], image_path: Optional[str], image_hash: Optional[str], use_cache: bool, answer: str):
+        """Store a complete Gemini answer in the caches that apply to the request"""
+        key = self._coalescing_key(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache)
+        if key is None:
+            return
+        if response_cache.enabled:
+            response_cache.set(key, answer)
+        if not conversation_history and not image_path:
+            semantic_cache.set(provider.model_name, language, normalized_text, user_message, answer)
+
+    def _image_prompt(self, user_message: str, language: str) -> str:
+        """The user's question about an image, or a default description request"""
+        if user_message.strip():
+            return user_message
+        return {
+            "fr": "Décris cette image en détail",
+            "en": "Describe this image in detail",
+            "ar": "اوصف هذه الصورة بالتفصيل"
+        }.get(language, "Describe this image in detail")
+
+    def image_text_answer(self, text: str, language: str) -> str:
+        """Local answer to an image turn while the circuit is open: the text OCR read in the image"""
+        intro = {
+            "fr": "Le service d'IA est momentanément indisponible. Voici le texte lu dans l'image :",
+            "en": "The AI service is temporarily unavailable. Here is the text read in the image:",
+            "ar": "خدمة الذكاء الاصطناعي غير متاحة مؤقتًا. إليك النص المقروء في الصورة:"
+        }
+        return f"{intro.get(language, intro['en'])}\n\n{text}"
+
+    def _detect_intent(self, normalized_text: str, language: str) -> Optional[str]:
+        """'help', 'thanks' or 'greeting' when the whole message is one, else None"""
+        text = " ".join(normalized_text.split())
+        for intent in ("help", "thanks", "greeting"):
+            if text in self.intent_phrases[intent][language]:
+                return intent
+        return None
+
+    def _local_answer(self, normalized_text: str, tokens: List[str], language: str, conversation_history: List[Dict]) -> Optional[str]:
         """
-        Generate a response based on user message and optional image using Gemini API.
-        Returns a dictionary with 'content' and 'language'.
+        Rule-based answer for bare greetings, thanks and help requests, used
+        while the circuit is open. None for anything the rules cannot answer.
+        """
+        if language not in LOCAL_FALLBACK_LANGUAGES:
+            return None
+        intent = self._detect_intent(normalized_text, language)
+        if intent is None:
+            return None
+        if intent == "greeting":
+            return random.choice(self.greetings[language])
+        return self._generate_intelligent_response(normalized_text, tokens, "", language, conversation_history)
+
+    def _degraded_response(self, normalized_text: str, tokens: List[str], language: str, conversation_history: List[Dict], image_path: Optional[str]) -> str:
+        """Local answer while the circuit is open; anything else is refused with CircuitOpen (503)"""
+        answer = None if image_path else self._local_answer(normalized_text, tokens, language, conversation_history)
+        if answer is None:
+            raise CircuitOpen("The AI service is temporarily unavailable", llm_breaker.retry_after())
+        print("🛟 Circuit open: answered locally")
+        return answer
+
+    def generate_response(self, user_message: str, image_path: Optional[str] = None, conversation_history: List[Dict] = None, use_cache: bool = True, image_hash: Optional[str] = None) -> Dict[str, str]:
+        """
+        Generate a response based on user message and optional image using the LLM provider.
+        Returns a dictionary with 'content', 'language' and 'engine' (who answered:
+        the provider's name such as "gemini", or "cache" or "local").
+        Set use_cache=False to bypass the response caches for this request; pass the
+        image's SHA-256 as image_hash so repeated images can be answered from the cache.
+        While the circuit breaker is open, greetings, thanks and help requests are
+        answered locally and anything else raises CircuitOpen (an UpstreamBusy).
         """
         if conversation_history is None:
             conversation_history = []
@@ -79,16 +203,17 @@ class ResponseGenerator:
         tokens = processor.tokenize(normalized_text)
         
         # Check for empty message
-        if not normalized_text.strip() and not image_data:
+        if not normalized_text.strip() and not image_path:
             return {
-                "content": random.choice(self.empty_message_responses[language]),
-                "language": language
+                "content": self.empty_message_responses[language],
+                "language": language,
+                "engine": "local"
             }
         
         # ALWAYS try to use Gemini API first - it's the main intelligence engine
-        gemini = get_gemini_client()
+        provider = get_llm_provider()
         
-        if not gemini:
+        if not provider:
             # If Gemini is not available, return a helpful error message
             error_msg = {
                 "fr": "Désolé, le service d'IA n'est pas disponible pour le moment. Veuillez réessayer plus tard.",
@@ -97,94 +222,160 @@ class ResponseGenerator:
             }
             return {
                 "content": error_msg.get(language, error_msg["en"]),
-                "language": language
+                "language": language,
+                "engine": "local"
+            }
+        
+        # Repeated questions are answered from the cache without calling Gemini
+        cached = self._get_cached_answer(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache)
+        if cached is not None:
+            print("⚡ Response served from cache")
+            return {
+                "content": cached,
+                "language": language,
+                "engine": "cache"
+            }
+        
+        # Gemini is failing or too slow: don't wait on it
+        if not llm_breaker.allow():
+            return {
+                "content": self._degraded_response(normalized_text, tokens, language, conversation_history, image_path),
+                "language": language,
+                "engine": "local"
             }
         
         # Use Gemini API - this is the primary method
         try:
+            # Identical concurrent requests (same cache key) share one upstream call
+            key = self._coalescing_key(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache)
+            
             # If image is provided, use vision model
-            if image_data:
-                print(f"📸 Analyzing image with Gemini Vision API (language: {language})")
-                response_content = gemini.generate_image_response(
-                    user_message=user_message if user_message.strip() else {
-                        "fr": "Décris cette image en détail",
-                        "en": "Describe this image in detail",
-                        "ar": "اوصف هذه الصورة بالتفصيل"
-                    }.get(language, "Describe this image in detail"),
-                    image_data=image_data,
-                    conversation_history=conversation_history,
-                    language=language
-                )
+            if image_path:
+                print(f"📸 Analyzing image with {provider.name} (language: {language})")
+                call = (provider.generate_image_response, self._image_prompt(user_message, language), image_path, conversation_history, language, image_hash)
             else:
                 # Use text model
-                print(f"💬 Generating text response with Gemini API (language: {language})")
-                response_content = gemini.generate_text_response(
-                    user_message=user_message,
-                    conversation_history=conversation_history,
-                    language=language
-                )
+                print(f"💬 Generating text response with {provider.name} (language: {language})")
+                call = (provider.generate_text_response, user_message, conversation_history, language)
+            
+            fn, *args = call
+            response_content = singleflight.do(key, fn, *args) if key else fn(*args)
             
             # Always return Gemini response if we got one
             if response_content:
-                print(f"✅ Gemini response received: {response_content[:100]}...")
+                print(f"✅ {provider.name} response received: {response_content[:100]}...")
+                self._store_answer(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache, response_content)
                 return {
                     "content": response_content,
-                    "language": language
+                    "language": language,
+                    "engine": provider.name
                 }
             else:
                 raise Exception("Empty response from Gemini API")
                 
+        except UpstreamBusy:
+            # Quota/queue exhausted: the endpoint answers 503 + Retry-After
+            raise
         except Exception as e:
-            print(f"❌ Error using Gemini API: {e}")
+            print(f"❌ Error using {provider.name}: {e}")
             import traceback
             traceback.print_exc()
             
-            # Only use fallback for very specific errors, otherwise retry
             error_msg = {
-                "fr": f"Désolé, une erreur s'est produite. Veuillez réessayer. Erreur: {str(e)[:100]}",
-                "en": f"Sorry, an error occurred. Please try again. Error: {str(e)[:100]}",
-                "ar": f"عذرًا، حدث خطأ. يرجى المحاولة مرة أخرى. الخطأ: {str(e)[:100]}"
+                "fr": f"Désolé, une erreur s'est produite. Veuillez réessayer. Erreur: {_error_detail(e)}",
+                "en": f"Sorry, an error occurred. Please try again. Error: {_error_detail(e)}",
+                "ar": f"عذرًا، حدث خطأ. يرجى المحاولة مرة أخرى. الخطأ: {_error_detail(e)}"
             }
             return {
                 "content": error_msg.get(language, error_msg["en"]),
-                "language": language
+                "language": language,
+                "engine": "local"
             }
+        finally:
+            # A follower or a local refusal made no upstream call: free the probe slot
+            llm_breaker.release()
+
+    def stream_response(self, user_message: str, image_path: Optional[str] = None, conversation_history: List[Dict] = None, use_cache: bool = True, image_hash: Optional[str] = None, info: Optional[Dict] = None) -> Iterator[Union[str, Pending]]:
+        """
+        Streaming counterpart of generate_response: yields the answer chunk by chunk.
+        Errors are turned into a final localized error chunk so the stream always ends cleanly,
+        except UpstreamBusy, which is raised to the caller.
+        When an identical request is already streaming, a singleflight Pending is
+        yielded first: wait for it (Pending.wait) before asking for the next chunk.
+        info, if given, receives the "engine" that answered.
+        """
+        if info is None:
+            info = {}
+        info["engine"] = "local"
+        if conversation_history is None:
+            conversation_history = []
         
-        # This should never be reached, but keep fallback as absolute last resort
-        # Process image if provided
-        image_context = ""
-        if image_data:
-            analysis = image_analyzer.analyze_image(image_data)
-            if analysis.get("has_text"):
-                image_context = f"L'image contient le texte suivant: {analysis['text']}. "
-            image_context += f"Description de l'image: {analysis.get('description', 'Image fournie')}. "
-        
-        # Check for greetings
-        greeting_keywords = {
-            "fr": ["bonjour", "salut", "bonsoir", "bonne nuit", "hello", "hi"],
-            "en": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
-            "ar": ["مرحبا", "أهلا", "السلام عليكم"]
-        }
+        language = self.detect_language(user_message)
+        normalized_text = processor.normalize(user_message)
+        tokens = processor.tokenize(normalized_text)
         
-        if any(keyword in normalized_text for keyword in greeting_keywords[language]):
-            return {
-                "content": random.choice(self.greetings[language]),
-                "language": language
+        if not normalized_text.strip() and not image_path:
+            yield self.empty_message_responses[language]
+            return
+        
+        provider = get_llm_provider()
+        
+        if not provider:
+            error_msg = {
+                "fr": "Désolé, le service d'IA n'est pas disponible pour le moment. Veuillez réessayer plus tard.",
+                "en": "Sorry, the AI service is not available at the moment. Please try again later.",
+                "ar": "عذرًا، خدمة الذكاء الاصطناعي غير متاحة حاليًا. يرجى المحاولة مرة أخرى لاحقًا."
             }
+            yield error_msg.get(language, error_msg["en"])
+            return
         
-        # Generate intelligent response
-        response = self._generate_intelligent_response(
-            normalized_text, 
-            tokens, 
-            image_context, 
-            language,
-            conversation_history
-        )
+        cached = self._get_cached_answer(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache)
+        if cached is not None:
+            print("⚡ Response served from cache")
+            info["engine"] = "cache"
+            yield cached
+            return
         
-        return {
-            "content": response,
-            "language": language
-        }
+        if not llm_breaker.allow():
+            yield self._degraded_response(normalized_text, tokens, language, conversation_history, image_path)
+            return
+        
+        parts = []
+        try:
+            if image_path:
+                print(f"📸 Streaming image analysis with {provider.name} (language: {language})")
+                call = (provider.stream_image_response, self._image_prompt(user_message, language), image_path, conversation_history, language, image_hash)
+            else:
+                print(f"💬 Streaming text response with {provider.name} (language: {language})")
+                call = (provider.stream_text_response, user_message, conversation_history, language)
+            
+            # Identical concurrent requests share one upstream stream
+            key = self._coalescing_key(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache)
+            fn, *args = call
+            chunks = singleflight.stream(key, fn, *args) if key else fn(*args)
+            info["engine"] = provider.name
+            for chunk in chunks:
+                if not isinstance(chunk, Pending):
+                    parts.append(chunk)
+                yield chunk
+            
+            # Only complete answers are cached
+            if parts:
+                self._store_answer(provider, language, normalized_text, user_message, conversation_history, image_path, image_hash, use_cache, "".join(parts).strip())
+        except UpstreamBusy:
+            # The endpoint ends the stream with an error event carrying retry_after
+            raise
+        except Exception as e:
+            print(f"❌ Error streaming from {provider.name}: {e}")
+            info["engine"] = "local"
+            error_msg = {
+                "fr": f"Désolé, une erreur s'est produite. Veuillez réessayer. Erreur: {_error_detail(e)}",
+                "en": f"Sorry, an error occurred. Please try again. Error: {_error_detail(e)}",
+                "ar": f"عذرًا، حدث خطأ. يرجى المحاولة مرة أخرى. الخطأ: {_error_detail(e)}"
+            }
+            yield error_msg.get(language, error_msg["en"])
+        finally:
+            llm_breaker.release()
 
     def _generate_intelligent_response(self, normalized_text: str, tokens: List[str], image_context: str, language: str, history: List[Dict]) -> str:
         """
@@ -0,0 +1,165 @@
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Optional, Dict, TYPE_CHECKING
+from .processor import processor
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Numbers as written, separators included ("2-2" is not "22", "1.5" is not "15")
+_NUMBER = re.compile(r"\d+(?:[.,:/\-]\d+)*")
+
+def number_tokens(text: str) -> tuple:
+    """The numbers of a raw (not normalized) message, which must match exactly for a hit"""
+    return tuple(sorted(_NUMBER.findall(text)))
+
+def token_overlap(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two token sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class _Partition:
+    """Embedding matrix + answers for one (model, language) pair, with LRU eviction."""
+
+    def __init__(self, capacity: int, dim: int):
+        import numpy as np
+
+        self.capacity = capacity
+        self.size = 0
+        # Storage grows by doubling up to capacity
+        self.vectors = np.zeros((min(capacity, 64), dim), dtype=np.float32)
+        self.last_used = np.zeros(min(capacity, 64), dtype=np.float64)
+        self.answers = []
+        # (token set, numbers) of each entry, checked on the embedding's candidates
+        self.keys = []
+
+    def search(self, vector: "np.ndarray", threshold: float):
+        """Indexes of the entries at least `threshold` similar, most similar first."""
+        import numpy as np
+
+        if self.size == 0:
+            return []
+        # Rows are unit vectors: the dot product is the cosine similarity
+        similarities = self.vectors[:self.size] @ vector
+        candidates = np.flatnonzero(similarities >= threshold)
+        return [int(index) for index in candidates[np.argsort(-similarities[candidates])]]
+
+    def add(self, vector: "np.ndarray", key: tuple, answer: str):
+        import numpy as np
+
+        if self.size < self.capacity:
+            if self.size == len(self.vectors):
+                new_rows = min(self.capacity, 2 * len(self.vectors))
+                self.vectors = np.resize(self.vectors, (new_rows, self.vectors.shape[1]))
+                self.last_used = np.resize(self.last_used, new_rows)
+            index = self.size
+            self.size += 1
+            self.answers.append(answer)
+            self.keys.append(key)
+        else:
+            # Replace the least recently used entry
+            index = int(np.argmin(self.last_used))
+            self.answers[index] = answer
+            self.keys[index] = key
+        self.vectors[index] = vector
+        self.last_used[index] = time.time()
+
+class SemanticCache:
+    """
+    Near-duplicate answer cache for single-turn text questions.
+
+    Questions are embedded locally with hashed character n-grams of their
+    tokens (no model, no network), so paraphrases that reuse the same words
+    ("comment ça marche" / "ça marche comment") land close to each other.
+    The embedding only finds candidates: trigrams cannot tell "with alcohol"
+    from "without alcohol" or "10 km" from "100 km", so a hit also needs the
+    same numbers and nearly the same set of words (min_token_overlap).
+    """
+
+    def __init__(self, enabled: bool, threshold: float, max_entries: int, dim: int, min_token_overlap: float = 0.9, ngram: int = 3):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.min_token_overlap = min_token_overlap
+        self.max_entries = max_entries
+        self.dim = dim
+        self.ngram = ngram
+        self.hits = 0
+        self.misses = 0
+        self._partitions: Dict[tuple, _Partition] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, normalized_text: str) -> Optional["np.ndarray"]:
+        """Hashed character n-gram embedding (unit vector), None for empty text"""
+        # NumPy is only imported when the cache is enabled and used
+        import numpy as np
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in processor.tokenize(normalized_text):
+            padded = f" {token} "
+            for i in range(max(1, len(padded) - self.ngram + 1)):
+                h = zlib.crc32(padded[i:i + self.ngram].encode("utf-8"))
+                # Signed hashing keeps bucket collisions from only adding up
+                vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _key(self, normalized_text: str, text: str) -> tuple:
+        return frozenset(processor.tokenize(normalized_text)), number_tokens(text)
+
+    def get(self, model: str, language: str, normalized_text: str, text: str) -> Optional[str]:
+        """The answer to a close enough question; text is the raw message (for its numbers)"""
+        if not self.enabled:
+            return None
+        vector = self.embed(normalized_text)
+        tokens, numbers = self._key(normalized_text, text)
+        with self._lock:
+            partition = self._partitions.get((model, language))
+            candidates = partition.search(vector, self.threshold) if partition and vector is not None else []
+            for index in candidates:
+                entry_tokens, entry_numbers = partition.keys[index]
+                if entry_numbers == numbers and token_overlap(entry_tokens, tokens) >= self.min_token_overlap:
+                    partition.last_used[index] = time.time()
+                    self.hits += 1
+                    return partition.answers[index]
+            self.misses += 1
+            return None
+
+    def set(self, model: str, language: str, normalized_text: str, text: str, answer: str):
+        if not self.enabled:
+            return
+        vector = self.embed(normalized_text)
+        if vector is None:
+            return
+        key = self._key(normalized_text, text)
+        with self._lock:
+            partition = self._partitions.get((model, language))
+            if partition is None:
+                partition = self._partitions[(model, language)] = _Partition(self.max_entries, self.dim)
+            partition.add(vector, key, answer)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": {
+                    f"{model}/{language}": partition.size
+                    for (model, language), partition in self._partitions.items()
+                },
+            }
+
+# Global instance
+semantic_cache = SemanticCache(
+    enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true",
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+    dim=int(os.getenv("SEMANTIC_CACHE_DIM", "512")),
+    min_token_overlap=float(os.getenv("SEMANTIC_CACHE_MIN_TOKEN_OVERLAP", "0.9")),
+)
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, Tuple, Union
+
+class CoalescedCallCancelled(Exception):
+    """The in-flight call a request was waiting on was abandoned by its leader."""
+
+class Pending:
+    """
+    Yielded by a follower's stream instead of blocking its thread on the
+    leader: the consumer waits for it (off the worker pool, see wait()) and
+    then keeps iterating, which returns the shared answer without blocking.
+    """
+
+    def __init__(self, future: Future):
+        self.future = future
+
+    async def wait(self):
+        """Wait on the event loop until the leader is done (its outcome is read by the stream)"""
+        try:
+            await asyncio.wrap_future(self.future)
+        except Exception:
+            pass
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader)
+    runs the upstream call, the others wait for it and share its result or error.
+    Works for blocking calls (do) and for streamed answers (stream).
+    A streaming leader needs a worker thread for every chunk, so nobody
+    blocks a worker thread on it: stream followers yield Pending, and
+    blocking callers (do) make their own call instead.
+    """
+
+    def __init__(self):
+        # key -> (future, whether the leader streams)
+        self._calls: Dict[str, Tuple[Future, bool]] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        self.cancelled = 0
+
+    def _begin(self, key: str, streaming: bool) -> Tuple[Future, bool]:
+        """
+        Return the in-flight future for key and whether the caller leads it.
+        None (and False) for a blocking caller when the call in flight streams.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                future, leader_streams = call
+                if leader_streams and not streaming:
+                    self.bypassed += 1
+                    return None, False
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._calls[key] = (future, streaming)
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn once per key among concurrent callers and return its result."""
+        future, leader = self._begin(key, streaming=False)
+        if future is None:
+            # Waiting here would hold a worker thread the streaming leader needs
+            return fn(*args, **kwargs)
+        if not leader:
+            try:
+                return future.result()
+            except CoalescedCallCancelled:
+                # The leader went away mid-call: make our own call
+                return fn(*args, **kwargs)
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def stream(self, key: str, fn: Callable[..., Iterator[str]], *args, **kwargs) -> Iterator[Union[str, Pending]]:
+        """
+        Streaming variant: the leader yields chunks as they arrive and shares
+        the joined text; followers first yield Pending, then that text in one
+        chunk once it is complete.
+        If the leader's stream is closed early (client gone), followers stream on their own.
+        """
+        future, leader = self._begin(key, streaming=True)
+        if not leader:
+            if not future.done():
+                yield Pending(future)
+            try:
+                yield future.result()
+            except CoalescedCallCancelled:
+                yield from fn(*args, **kwargs)
+            return
+        parts = []
+        try:
+            for chunk in fn(*args, **kwargs):
+                parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            with self._lock:
+                self.cancelled += 1
+            self._finish(key, future, error=CoalescedCallCancelled(key))
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result="".join(parts))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "bypassed": self.bypassed,
+                "cancelled": self.cancelled,
+            }
+
+# Global instance
+singleflight = SingleFlight()
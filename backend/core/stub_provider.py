@@ -0,0 +1,180 @@
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterator
+from .llm_provider import LLMProvider, estimate_contents_tokens
+
+# Time to first token (ms): lognormal around the median, sigma 0 for a fixed latency
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "400"))
+STUB_LATENCY_SIGMA = float(os.getenv("STUB_LATENCY_SIGMA", "0.3"))
+# Slow tail: with this probability a call takes STUB_TAIL_MS more
+STUB_TAIL_PROB = float(os.getenv("STUB_TAIL_PROB", "0.02"))
+STUB_TAIL_MS = float(os.getenv("STUB_TAIL_MS", "3000"))
+# The strong tier's latency relative to the fast one
+STUB_STRONG_LATENCY_FACTOR = float(os.getenv("STUB_STRONG_LATENCY_FACTOR", "2"))
+# Answer length and generation speed (0 = whole answer at once)
+STUB_RESPONSE_TOKENS = int(os.getenv("STUB_RESPONSE_TOKENS", "120"))
+STUB_TOKENS_PER_SECOND = float(os.getenv("STUB_TOKENS_PER_SECOND", "80"))
+STUB_CHUNK_TOKENS = int(os.getenv("STUB_CHUNK_TOKENS", "16"))
+# Error injection: share of calls failing with this HTTP status (429, 500, 503...)
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+STUB_ERROR_STATUS = int(os.getenv("STUB_ERROR_STATUS", "503"))
+# Seed of the latency/error draws (unset: different on every run)
+STUB_SEED = os.getenv("STUB_SEED")
+
+# Words the answers are made of, per language of the prompt
+_VOCABULARY = {
+    "fr": "le la les un une des réponse question simulée modèle local données exemple contexte image texte résultat voici donc aussi".split(),
+    "en": "the a an answer question simulated local model data example context image text result here so also".split(),
+    "ar": "هذا هذه جواب سؤال نموذج محلي بيانات مثال سياق صورة نص نتيجة هنا أيضا".split(),
+}
+
+class StubError(Exception):
+    """Injected upstream failure; `code` is the HTTP status, as on API errors"""
+
+    def __init__(self, code: int):
+        super().__init__(f"{code} Injected stub error")
+        self.code = code
+
+def _prompt_language(prompt: str) -> str:
+    if any("\u0600" <= char <= "\u06ff" for char in prompt):
+        return "ar"
+    return "fr" if "français" in prompt or "Utilisateur" in prompt else "en"
+
+class StubStream:
+    """A streamed stub response: iterates over chunks, usage_metadata as on Gemini's"""
+
+    def __init__(self, chunks: Iterator, total_tokens: int):
+        self._chunks = chunks
+        self.usage_metadata = SimpleNamespace(total_token_count=total_tokens)
+
+    def __iter__(self):
+        return self._chunks
+
+class StubProvider(LLMProvider):
+    """
+    Offline provider (LLM_PROVIDER=stub) to benchmark the whole backend
+    without an API key or network: the prompts are built, routed and
+    scheduled exactly as for Gemini, then answered locally.
+    - Answers are deterministic: the same contents always give the same text
+      (STUB_RESPONSE_TOKENS words, in the language of the prompt).
+    - Latency: time to first token drawn from a lognormal distribution plus
+      an optional slow tail, longer on the strong tier, then the answer is
+      produced at STUB_TOKENS_PER_SECOND (streamed in chunks).
+    - Errors: STUB_ERROR_RATE of the calls raise StubError(STUB_ERROR_STATUS)
+      before the first token, exercising retries and the circuit breaker.
+    Only the latency and error draws are random (seeded with STUB_SEED).
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_ms: float = STUB_LATENCY_MS,
+        latency_sigma: float = STUB_LATENCY_SIGMA,
+        tail_prob: float = STUB_TAIL_PROB,
+        tail_ms: float = STUB_TAIL_MS,
+        strong_latency_factor: float = STUB_STRONG_LATENCY_FACTOR,
+        response_tokens: int = STUB_RESPONSE_TOKENS,
+        tokens_per_second: float = STUB_TOKENS_PER_SECOND,
+        chunk_tokens: int = STUB_CHUNK_TOKENS,
+        error_rate: float = STUB_ERROR_RATE,
+        error_status: int = STUB_ERROR_STATUS,
+        seed=STUB_SEED,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tail_prob = tail_prob
+        self.tail_ms = tail_ms
+        self.strong_latency_factor = strong_latency_factor
+        self.response_tokens = max(1, response_tokens)
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tier_models = {"fast": "stub-fast", "strong": "stub-strong"}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.injected_errors = 0
+        self.tail_calls = 0
+        print(f"🧪 Stub LLM provider: {latency_ms:g} ms to first token (sigma {latency_sigma:g}), "
+              f"{tokens_per_second:g} tokens/s, error rate {error_rate:g}")
+
+    def _draw(self, tier: str):
+        """(seconds to first token, injected error or None) for one call"""
+        with self._lock:
+            self.calls += 1
+            seconds = self.latency_ms / 1000 * math.exp(self._random.gauss(0, self.latency_sigma))
+            if self._random.random() < self.tail_prob:
+                self.tail_calls += 1
+                seconds += self.tail_ms / 1000
+            error = None
+            if self._random.random() < self.error_rate:
+                self.injected_errors += 1
+                error = StubError(self.error_status)
+        if tier == "strong":
+            seconds *= self.strong_latency_factor
+        return seconds, error
+
+    def _answer(self, contents) -> str:
+        """The deterministic answer to a request's contents"""
+        prompt = contents if isinstance(contents, str) else "\n".join(part for part in contents if isinstance(part, str))
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        if not isinstance(contents, str):
+            # The image counts too (not its path: the payload sent)
+            blob = next((part for part in contents if not isinstance(part, str)), None)
+            data = blob.get("data", b"") if isinstance(blob, dict) else b""
+            digest = hashlib.sha256(digest + data).digest()
+        words = _VOCABULARY[_prompt_language(prompt)]
+        rng = random.Random(digest)
+        return " ".join(rng.choice(words) for _ in range(self.response_tokens)) + "."
+
+    def _response(self, text: str, prompt_tokens: int):
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(total_token_count=prompt_tokens + self.response_tokens),
+        )
+
+    def _generation_seconds(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate_content(self, tier: str, contents, stream: bool = False):
+        delay, error = self._draw(tier)
+        text = self._answer(contents)
+        prompt_tokens = estimate_contents_tokens(contents)
+        if stream:
+            return StubStream(self._stream(text, delay, error), prompt_tokens + self.response_tokens)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        time.sleep(self._generation_seconds(self.response_tokens))
+        return self._response(text, prompt_tokens)
+
+    def _stream(self, text: str, delay: float, error) -> Iterator:
+        """Chunks of chunk_tokens words, the first after the drawn latency"""
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        words = text.split(" ")
+        for start in range(0, len(words), self.chunk_tokens):
+            chunk = words[start:start + self.chunk_tokens]
+            time.sleep(self._generation_seconds(len(chunk)))
+            yield SimpleNamespace(text=" ".join(chunk) + (" " if start + self.chunk_tokens < len(words) else ""))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **super().stats(),
+                "calls": self.calls,
+                "injected_errors": self.injected_errors,
+                "tail_calls": self.tail_calls,
+                "latency_ms": self.latency_ms,
+                "latency_sigma": self.latency_sigma,
+                "tokens_per_second": self.tokens_per_second,
+                "error_rate": self.error_rate,
+            }
@@ -0,0 +1,111 @@
+import os
+import re
+import tempfile
+from typing import Dict, Optional
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from .image_preprocessor import to_rgb
+from .image_store import image_store
+from .singleflight import SingleFlight
+
+# Fixed widths only: every size is generated once and cached forever
+THUMBNAIL_WIDTHS = (160, 320, 640)
+# Blobs and thumbnails are named by content, they never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_BLOB_NAME = re.compile(r"^([0-9a-f]{64})\.\w+$")
+
+def blob_sha256(image_path: Optional[str]) -> Optional[str]:
+    """SHA-256 of an image stored in the content-addressed store, None for other paths"""
+    if not image_path or not image_path.startswith(f"{image_store.root}/"):
+        return None
+    match = _BLOB_NAME.match(os.path.basename(image_path))
+    return match.group(1) if match else None
+
+def thumbnail_urls(image_path: Optional[str]) -> Optional[Dict[str, str]]:
+    """URLs of the thumbnails of a message image, by width"""
+    sha256 = blob_sha256(image_path)
+    if sha256 is None:
+        return None
+    return {str(width): f"/api/thumbnails/{sha256}/{width}" for width in THUMBNAIL_WIDTHS}
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """If-None-Match comparison (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+class ThumbnailStore:
+    """
+    Thumbnails generated on demand from image blobs and kept on disk
+    (root/ab/<sha256>-<width>.jpg). Generation is blocking: call it from run_blocking.
+    """
+
+    def __init__(self, root: str, quality: int = 80):
+        self.root = root
+        self.quality = quality
+        # Own instance: thumbnail requests do not show up in the chat coalescing counters
+        self._singleflight = SingleFlight()
+
+    def thumbnail_path(self, sha256: str, width: int) -> str:
+        return f"{self.root}/{sha256[:2]}/{sha256}-{width}.jpg"
+
+    def get(self, blob_path: str, sha256: str, width: int) -> str:
+        """Path of the thumbnail, generated first if it does not exist yet"""
+        path = self.thumbnail_path(sha256, width)
+        if os.path.exists(path):
+            return path
+        # Concurrent requests for the same thumbnail share one generation
+        return self._singleflight.do(f"thumbnail:{sha256}:{width}", self._generate, blob_path, path, width)
+
+    def _generate(self, blob_path: str, path: str, width: int) -> str:
+        from PIL import Image, ImageOps
+
+        with Image.open(blob_path) as image:
+            image.draft("RGB", (width, width * 4))
+            image = ImageOps.exif_transpose(image)
+            image = to_rgb(image)
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so a reader never sees a partial file
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, "JPEG", quality=self.quality, optimize=True)
+            os.replace(temp_path, path)
+        return path
+
+    def stats(self) -> Dict:
+        return {"generation": self._singleflight.stats()}
+
+    def remove(self, sha256: str):
+        """Delete the thumbnails of a blob that is no longer referenced"""
+        for width in THUMBNAIL_WIDTHS:
+            try:
+                os.remove(self.thumbnail_path(sha256, width))
+            except FileNotFoundError:
+                pass
+
+class UploadStaticFiles(StaticFiles):
+    """
+    StaticFiles for /uploads: content-addressed blobs get their hash as a
+    strong ETag and an immutable Cache-Control; other files are served as before.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        sha256 = _BLOB_NAME.match(os.path.basename(str(full_path)))
+        if sha256 is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        headers = {"ETag": f'"{sha256.group(1)}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+        if etag_matches(headers["ETag"], Headers(scope=scope).get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+
+# Global instance
+thumbnail_store = ThumbnailStore("cache/thumbnails")
@@ -0,0 +1,43 @@
+import math
+import re
+from typing import Dict, List
+
+# Words (any script) and single punctuation/symbol characters
+_PIECES = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+def estimate_tokens(text: str) -> int:
+    """
+    Offline token estimate for prompt budgeting (no tokenizer call):
+    about one token per 4 characters of a word, one per punctuation mark.
+    Stored per message at insert time (Message.token_count).
+    """
+    if not text:
+        return 0
+    return sum(math.ceil(len(piece) / 4) for piece in _PIECES.findall(text))
+
+def message_tokens(message: Dict) -> int:
+    """Token count of a history entry, estimated only when it was not stored"""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = estimate_tokens(message.get("content", ""))
+    # Role label and line break
+    return tokens + 4
+
+def select_history(conversation_history: List[Dict], budget: int) -> List[Dict]:
+    """
+    Walk back from the newest message and keep messages while they fit in
+    budget tokens. A leading summary entry (role "summary") is always kept
+    and counted first. Chronological order is preserved.
+    """
+    summary = [msg for msg in conversation_history[:1] if msg.get("role") == "summary"]
+    remaining = budget - sum(message_tokens(msg) for msg in summary)
+
+    # Indexes, not a copy of the list: the cost depends on the kept messages only
+    start = len(conversation_history)
+    while start > len(summary):
+        cost = message_tokens(conversation_history[start - 1])
+        if cost > remaining:
+            break
+        remaining -= cost
+        start -= 1
+    return summary + conversation_history[start:]
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from .image_store import IMAGE_HEADER_BYTES, image_extension
+
+# Max 20MB for Gemini API
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Room for the multipart envelope and the text fields around the image
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+class StoredUpload:
+    """An upload streamed to a temporary file, with its size and SHA-256."""
+
+    def __init__(self, path: str, filename: Optional[str], size: int, sha256: str):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+
+    def discard(self):
+        """Remove the temporary file if it is still there"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+async def save_upload(upload: UploadFile, tmp_dir: str, max_bytes: int = MAX_IMAGE_BYTES) -> StoredUpload:
+    """
+    Copy an upload to a temporary file in chunks, hashing it on the way.
+    The copy stops as soon as the file exceeds max_bytes, or as soon as its
+    first bytes show it is not an image format we accept.
+    """
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    os.close(fd)
+    hasher = hashlib.sha256()
+    size = 0
+    header = b""
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=400, detail="Image file is too large (max 20MB)")
+                if len(header) < IMAGE_HEADER_BYTES:
+                    header += chunk[:IMAGE_HEADER_BYTES - len(header)]
+                    if len(header) == IMAGE_HEADER_BYTES:
+                        _check_format(header)
+                hasher.update(chunk)
+                await out.write(chunk)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Image file is empty")
+        if len(header) < IMAGE_HEADER_BYTES:
+            _check_format(header)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return StoredUpload(path, upload.filename, size, hasher.hexdigest())
+
+def _check_format(header: bytes):
+    if image_extension(header) is None:
+        raise HTTPException(status_code=400, detail="Unsupported image format (JPEG, PNG, GIF, BMP or WebP expected)")
+
+class UploadLimitMiddleware:
+    """
+    Rejects oversized request bodies on the given paths while they arrive,
+    before the multipart form is fully received and spooled.
+    """
+
+    def __init__(self, app, paths, max_body_bytes: int = MAX_IMAGE_BYTES + FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._reject(send)
+            return
+
+        # Chunked bodies: count the bytes as they are received
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    raise HTTPException(status_code=413, detail="Request body is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send):
+        body = b'{"detail":"Request body is too large"}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,358 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Conversation the current upstream call belongs to, for fair queueing.
+# Set by the chat endpoints; run_blocking carries it into the worker threads.
+upstream_conversation: ContextVar[Optional[int]] = ContextVar("upstream_conversation", default=None)
+
+# HTTP statuses worth retrying: quota, and transient upstream failures
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Final errors about the request itself, when they carry no HTTP status
+CLIENT_ERRORS = {"InvalidArgument", "BlockedPromptException", "StopCandidateException"}
+RETRYABLE_ERRORS = {"ResourceExhausted", "TooManyRequests", "InternalServerError", "ServiceUnavailable", "DeadlineExceeded", "BadGateway", "GatewayTimeout"}
+
+class UpstreamBusy(Exception):
+    """The upstream quota or queue is exhausted; retry after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _status(error: Exception) -> Optional[int]:
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+def is_throttling_error(error: Exception) -> bool:
+    """Whether the upstream rejected the call for quota/rate reasons (HTTP 429)"""
+    return (
+        _status(error) == 429
+        or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+        or "429" in str(error)[:100]
+    )
+
+def is_retryable_error(error: Exception) -> bool:
+    """Quota and transient server errors; anything else (bad request, safety block...) is final"""
+    return (
+        is_throttling_error(error)
+        or _status(error) in RETRYABLE_STATUSES
+        or type(error).__name__ in RETRYABLE_ERRORS
+    )
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    Whether an error says the upstream is unhealthy (for the circuit breaker):
+    not our own queue/quota refusal (UpstreamBusy), nor a final client error
+    (bad request, blocked prompt...), which the upstream answered properly.
+    """
+    if isinstance(error, UpstreamBusy):
+        return False
+    if is_retryable_error(error):
+        return True
+    status = _status(error)
+    if status is not None and 400 <= status < 500 and status != 408:
+        return False
+    return type(error).__name__ not in CLIENT_ERRORS
+
+class TokenBucket:
+    """
+    Per-minute quota as a token bucket: holds up to a minute's worth of
+    tokens and refills continuously. Not thread-safe (used under the scheduler lock).
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (0 if it can be taken now)"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        # Larger than the bucket: wait for a full bucket rather than forever
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        """Remove amount; the level may go negative when usage exceeded the estimate"""
+        if self.rate:
+            self._refill()
+            self.level -= amount
+
+class _Ticket:
+    __slots__ = ("key", "tokens", "granted", "enqueued", "admitted")
+
+    def __init__(self, key, tokens: int):
+        self.key = key
+        self.tokens = tokens
+        self.granted = False
+        self.enqueued = time.monotonic()
+        self.admitted = 0.0
+
+class UpstreamScheduler:
+    """
+    Admission in front of the upstream model API:
+    - token buckets for requests and tokens per minute (the API quotas),
+    - an AIMD concurrency limit: +1 per limit's worth of fast successes,
+      halved on 429, reduced on slow responses,
+    - a bounded queue served round-robin across conversations, so one busy
+      conversation cannot starve the others,
+    - retries with full-jitter exponential backoff for 429 and transient errors.
+    Callers block in a worker thread until admitted; UpstreamBusy is raised
+    when the queue is full, the wait exceeds max_wait, or 429s persist.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        initial_limit: int,
+        max_limit: int,
+        latency_target: float,
+        max_queue: int,
+        max_wait: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.min_limit = 1
+        self.max_limit = max(1, max_limit)
+        self.limit = float(min(max(1, initial_limit), self.max_limit))
+        self.latency_target = latency_target
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        # key -> waiting tickets (FIFO), and the round-robin order of keys
+        self._queues: Dict[Any, deque] = {}
+        self._order: deque = deque()
+        self._queued = 0
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        # Shortest wait before a bucket can admit the next ticket
+        self._refill_wait = 0.0
+
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+
+    # --- Admission ---
+
+    def _dispatch(self):
+        """Grant queued tickets, one conversation at a time, while limits allow. Lock held."""
+        self._refill_wait = 0.0
+        granted = False
+        while self._order and self._in_flight < int(self.limit):
+            key = self._order[0]
+            ticket = self._queues[key][0]
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(ticket.tokens))
+            if wait > 0:
+                # Head of line waits for the quota, nobody overtakes it
+                self._refill_wait = wait
+                break
+            self.requests.take(1)
+            self.tokens.take(ticket.tokens)
+            self._queues[key].popleft()
+            self._order.popleft()
+            if self._queues[key]:
+                self._order.append(key)
+            else:
+                del self._queues[key]
+            self._queued -= 1
+            self._in_flight += 1
+            ticket.granted = True
+            ticket.admitted = time.monotonic()
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _acquire(self, key, tokens: int) -> _Ticket:
+        ticket = _Ticket(key, tokens)
+        with self._cond:
+            if self._queued >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise UpstreamBusy("Too many requests waiting for the AI service", self.retry_after())
+            if key not in self._queues:
+                self._queues[key] = deque()
+                self._order.append(key)
+            self._queues[key].append(ticket)
+            self._queued += 1
+
+            deadline = ticket.enqueued + self.max_wait
+            while True:
+                self._dispatch()
+                if ticket.granted:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self.rejected_timeout += 1
+                    raise UpstreamBusy("Timed out waiting for the AI service quota", self.retry_after())
+                self._cond.wait(min(remaining, self._refill_wait) if self._refill_wait else remaining)
+
+            waited = time.monotonic() - ticket.enqueued
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait_seen = max(self.max_wait_seen, waited)
+        return ticket
+
+    def _remove(self, ticket: _Ticket):
+        queue = self._queues[ticket.key]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[ticket.key]
+            self._order.remove(ticket.key)
+        self._queued -= 1
+        # The next ticket may fit where this one did not
+        self._dispatch()
+
+    def _release(self, ticket: _Ticket, latency: float, throttled: bool = False, used_tokens: Optional[int] = None):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled or latency > self.latency_target:
+                # Multiplicative decrease, once per round trip: calls admitted
+                # before the last decrease were sent under the old limit, so
+                # their 429s must not shrink it again
+                if ticket.admitted >= self._last_decrease:
+                    factor = 0.5 if throttled else 0.9
+                    self.limit = max(self.min_limit, self.limit * factor)
+                    self._last_decrease = time.monotonic()
+            else:
+                # Additive increase: about +1 once `limit` calls succeeded
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if used_tokens is not None and used_tokens > ticket.tokens:
+                # Charge what the call really used (prompt + answer)
+                self.tokens.take(used_tokens - ticket.tokens)
+            self._dispatch()
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)]"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _open(self, fn: Callable[[], Any], tokens: int):
+        """Admit and run fn, retrying retryable errors. Returns (ticket, result, started)."""
+        key = upstream_conversation.get()
+        if key is None:
+            key = object()  # No conversation yet: a lane of its own
+        attempt = 0
+        while True:
+            ticket = self._acquire(key, tokens)
+            started = time.monotonic()
+            try:
+                return ticket, fn(), started
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                if throttled:
+                    self.throttled += 1
+                self._release(ticket, time.monotonic() - started, throttled=throttled)
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    if throttled:
+                        raise UpstreamBusy("The AI service quota is exhausted", self.retry_after()) from e
+                    raise
+                attempt += 1
+                self.retries += 1
+                delay = self._backoff(attempt)
+                print(f"⏳ Upstream error ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    # --- Public API ---
+
+    def call(self, fn: Callable[[], Any], tokens: int, usage: Callable[[Any], Optional[int]] = None) -> Any:
+        """
+        Run fn (one upstream request costing about `tokens`) under the limits.
+        usage(result) may return the real token count to settle the token bucket.
+        """
+        ticket, result, started = self._open(fn, tokens)
+        self._release(ticket, time.monotonic() - started, used_tokens=usage(result) if usage else None)
+        return result
+
+    def stream(self, fn: Callable[[], Any], tokens: int, usage: Callable[[Any], Optional[int]] = None) -> Iterator:
+        """
+        Streaming counterpart of call(): fn returns an iterable response. The
+        first chunk is fetched under the retry loop (that is where 429s show up),
+        latency is measured to it, and the concurrency slot is held until the
+        stream ends.
+        """
+        def open_stream():
+            response = fn()
+            chunks = iter(response)
+            return response, chunks, next(chunks, None)
+
+        ticket, (response, chunks, first), started = self._open(open_stream, tokens)
+        latency = time.monotonic() - started
+        try:
+            if first is None:
+                return
+            yield first
+            yield from chunks
+        finally:
+            used = None
+            if usage:
+                try:
+                    used = usage(response)
+                except Exception:
+                    pass
+            self._release(ticket, latency, used_tokens=used)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying"""
+        with self._cond:
+            wait = max(self.requests.wait_time(1), self._refill_wait)
+        return max(1, int(wait + 0.999))
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "queued_conversations": len(self._queues),
+                "admitted": self.admitted,
+                "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 1) if self.admitted else 0.0,
+                "max_wait_ms": round(self.max_wait_seen * 1000, 1),
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "failures": self.failures,
+                "requests_available": round(self.requests.level, 1) if self.requests.rate else None,
+                "tokens_available": round(self.tokens.level) if self.tokens.rate else None,
+            }
+
+# Global instance
+upstream_scheduler = UpstreamScheduler(
+    requests_per_minute=int(os.getenv("UPSTREAM_RPM", "60")),
+    tokens_per_minute=int(os.getenv("UPSTREAM_TPM", "250000")),
+    initial_limit=int(os.getenv("UPSTREAM_INITIAL_CONCURRENCY", "4")),
+    max_limit=int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16")),
+    latency_target=float(os.getenv("UPSTREAM_LATENCY_TARGET", "15")),
+    max_queue=int(os.getenv("UPSTREAM_MAX_QUEUE", "64")),
+    max_wait=float(os.getenv("UPSTREAM_MAX_WAIT", "30")),
+    max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "3")),
+    backoff_base=float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5")),
+    backoff_max=float(os.getenv("UPSTREAM_BACKOFF_MAX", "20")),
+)
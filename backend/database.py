@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import create_engine, event, inspect, text, Column, Integer, String, DateTime, Text, ForeignKey, Index
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -14,8 +16,50 @@ DATABASE_URL = os.getenv(
     "mysql+pymysql://root@localhost:3306/mini-chat-python"
 )
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# The driver in DATABASE_URL may be sync (pymysql, pysqlite) or async (aiomysql,
+# aiosqlite): each engine gets the matching driver of the same database.
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+SYNC_DRIVERS = {
+    "mysql+aiomysql": "mysql+pymysql",
+    "sqlite+aiosqlite": "sqlite",
+}
+
+def _with_driver(url: str, drivers: dict) -> str:
+    parsed = make_url(url)
+    drivername = drivers.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+SYNC_DATABASE_URL = _with_driver(DATABASE_URL, SYNC_DRIVERS)
+ASYNC_DATABASE_URL = _with_driver(DATABASE_URL, ASYNC_DRIVERS)
+
+# Sync engine: schema creation and scripts
+engine = create_engine(SYNC_DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine: used by every API route
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=True)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Round trips issued by the API (statements and commits), for /metrics
+db_stats = {"statements": 0, "commits": 0, "rollbacks": 0}
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    db_stats["statements"] += 1
+
+@event.listens_for(async_engine.sync_engine, "commit")
+def _count_commit(conn):
+    db_stats["commits"] += 1
+
+@event.listens_for(async_engine.sync_engine, "rollback")
+def _count_rollback(conn):
+    db_stats["rollbacks"] += 1
+
 Base = declarative_base()
 
 
@@ -26,9 +70,18 @@ class Conversation(Base):
     title = Column(String(255), nullable=False, default="Nouvelle conversation")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Rolling summary of the older turns (messages up to summary_until_id), sent instead of them
+    summary = Column(Text, nullable=True)
+    summary_until_id = Column(Integer, nullable=True)
+    summary_updated_at = Column(DateTime, nullable=True)
 
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination of the conversation list on (updated_at, id)
+        Index("ix_conversations_updated_id", "updated_at", "id"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -38,20 +91,79 @@ class Message(Base):
     role = Column(String(20), nullable=False)  # "user" or "assistant"
     content = Column(Text, nullable=False)
     image_path = Column(String(500), nullable=True)  # Path to uploaded image if any
+    token_count = Column(Integer, nullable=True)  # Estimated once at insert time, for prompt budgeting
     created_at = Column(DateTime, default=datetime.utcnow)
 
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        # History lookups and message pagination are range scans on (conversation_id, created_at, id)
+        Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+    )
+
+
+class ImageBlob(Base):
+    """A content-addressed image file, shared by every message that uploaded the same bytes"""
+    __tablename__ = "image_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(500), nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def blob_reference_statement(dialect_name: str, sha256: str, path: str, size: int):
+    """
+    Atomic upsert adding one reference to a blob (concurrent uploads of the
+    same image must not race on the primary key).
+    """
+    values = {"sha256": sha256, "path": path, "size": size, "ref_count": 1, "created_at": datetime.utcnow()}
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        return insert(ImageBlob).values(**values).on_duplicate_key_update(ref_count=ImageBlob.ref_count + 1)
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(ImageBlob).values(**values).on_conflict_do_update(
+        index_elements=[ImageBlob.sha256], set_={"ref_count": ImageBlob.ref_count + 1}
+    )
+
+
+# Indexes replaced under a new name (create_all would keep the old definition
+# of a changed index under its old name): dropped from existing databases
+REPLACED_INDEXES = {
+    "messages": ["ix_messages_conversation_created"],
+}
+
 
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables: add (nullable) columns introduced since they were created
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    # create_all skips existing tables: add indexes introduced since they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        for table_name, index_names in REPLACED_INDEXES.items():
+            existing = {index["name"] for index in inspect(connection).get_indexes(table_name)}
+            for index_name in index_names:
+                if index_name in existing:
+                    on_table = f" ON {table_name}" if engine.dialect.name == "mysql" else ""
+                    connection.execute(text(f"DROP INDEX {index_name}{on_table}"))
 
 
-def get_db():
-    """Dependency for getting database session"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,203 @@
+"""
+Script pour comparer le débit de la couche de persistance synchrone (Session
+dans le pool de threads de FastAPI, comme avant le passage à AsyncSession) et
+asynchrone (AsyncSession, utilisée par toutes les routes de main.py):
+- une base remplie de conversations et de messages
+- un serveur uvicorn exposant les deux variantes des mêmes requêtes
+  (liste des conversations, dernière page de messages)
+- N requêtes avec une concurrence fixe, par variante
+
+Usage:
+  python db_throughput_benchmark.py
+  python db_throughput_benchmark.py --requests 5000 --concurrency 64
+  DATABASE_URL=mysql+aiomysql://root@localhost:3306/chat-bench python db_throughput_benchmark.py
+
+Sans DATABASE_URL, une base SQLite temporaire est utilisée. Avec DATABASE_URL,
+des conversations de test sont ajoutées à cette base: utilisez une base dédiée.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from startup_benchmark import BACKEND_DIR, free_port
+from load_benchmark import percentile
+
+CONVERSATIONS = 200
+MESSAGES_PER_CONVERSATION = 100
+
+def build_app():
+    """The same two queries as main.py, once with a sync Session and once with an AsyncSession"""
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import select
+    from database import Conversation, Message, SessionLocal, get_db
+
+    app = FastAPI()
+
+    def get_sync_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def conversations_query():
+        return select(Conversation).order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(50)
+
+    def messages_query(conversation_id):
+        return (
+            select(Message).where(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at.desc(), Message.id.desc()).limit(50)
+        )
+
+    @app.get("/sync/conversations")
+    def sync_conversations(db=Depends(get_sync_db)):
+        return [conversation.title for conversation in db.execute(conversations_query()).scalars()]
+
+    @app.get("/sync/conversations/{conversation_id}/messages")
+    def sync_messages(conversation_id: int, db=Depends(get_sync_db)):
+        return [message.content for message in db.execute(messages_query(conversation_id)).scalars()]
+
+    @app.get("/async/conversations")
+    async def async_conversations(db=Depends(get_db)):
+        return [conversation.title for conversation in (await db.execute(conversations_query())).scalars()]
+
+    @app.get("/async/conversations/{conversation_id}/messages")
+    async def async_messages(conversation_id: int, db=Depends(get_db)):
+        return [message.content for message in (await db.execute(messages_query(conversation_id))).scalars()]
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return app
+
+def serve(port):
+    import uvicorn
+    uvicorn.run(build_app(), port=port, log_level="warning")
+
+def seed():
+    """CONVERSATIONS conversations of MESSAGES_PER_CONVERSATION messages; returns their ids"""
+    from database import Conversation, Message, engine, init_db
+
+    init_db()
+    now = datetime.utcnow()
+    ids = []
+    with engine.begin() as connection:
+        for index in range(CONVERSATIONS):
+            created_at = now - timedelta(minutes=index)
+            conversation_id = connection.execute(
+                Conversation.__table__.insert().values(title=f"Conversation {index}", created_at=created_at, updated_at=created_at)
+            ).inserted_primary_key[0]
+            connection.execute(Message.__table__.insert(), [
+                {
+                    "conversation_id": conversation_id,
+                    "role": "user" if turn % 2 == 0 else "assistant",
+                    "content": f"Message {turn} de la conversation {index}",
+                    "created_at": created_at + timedelta(seconds=turn),
+                }
+                for turn in range(MESSAGES_PER_CONVERSATION)
+            ])
+            ids.append(conversation_id)
+    return ids
+
+def start_server(env, timeout=60):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError("Le serveur s'est arrêté au démarrage")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1):
+                return server, base_url
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError(f"Le serveur n'était pas prêt après {timeout}s")
+
+def get(url):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            return response.status, time.perf_counter() - started
+    except urllib.error.HTTPError as e:
+        return e.code, time.perf_counter() - started
+    except OSError:
+        return "connexion", time.perf_counter() - started
+
+def run(base_url, variant, conversation_ids, requests, concurrency):
+    """Alternates the conversation list and message pages; returns (req/s, latencies, errors)"""
+    def url(index):
+        if index % 2 == 0:
+            return f"{base_url}/{variant}/conversations"
+        conversation_id = conversation_ids[index % len(conversation_ids)]
+        return f"{base_url}/{variant}/conversations/{conversation_id}/messages"
+
+    # Warm-up: connections of both pools opened before measuring
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda index: get(url(index)), range(concurrency)))
+        started = time.perf_counter()
+        results = list(pool.map(lambda index: get(url(index)), range(requests)))
+        elapsed = time.perf_counter() - started
+    latencies = [seconds for status, seconds in results if status == 200]
+    errors = len(results) - len(latencies)
+    return requests / elapsed, latencies, errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de la couche de persistance: Session synchrone contre AsyncSession")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    workdir = None
+    if not os.getenv("DATABASE_URL"):
+        workdir = tempfile.mkdtemp(prefix="db_throughput_benchmark_")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(workdir, 'chat.db')}"
+    sys.path.insert(0, BACKEND_DIR)
+
+    try:
+        print("⏳ Création des conversations...")
+        conversation_ids = seed()
+        server, base_url = start_server(dict(os.environ))
+        try:
+            results = {
+                variant: run(base_url, variant, conversation_ids, args.requests, args.concurrency)
+                for variant in ("sync", "async")
+            }
+        finally:
+            server.terminate()
+            server.wait()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n📊 {args.requests} requêtes, concurrence {args.concurrency}, base {os.environ['DATABASE_URL'].split(':')[0]}")
+    for variant, (throughput, latencies, errors) in results.items():
+        print(f"  {variant:>5}: {throughput:7.1f} req/s, p50 {percentile(latencies, 0.5) * 1000:6.1f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:6.1f} ms, erreurs {errors}")
+    print(f"  async / sync: {results['async'][0] / results['sync'][0]:.2f}x")
+    sys.exit(0 if not any(result[2] for result in results.values()) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Script pour vérifier que le coût d'un tour de conversation ne dépend pas de la
+longueur de la conversation (historique lu par une requête LIMIT sur l'index
+(conversation_id, created_at, id), pas la conversation entière):
+- base SQLite neuve, une conversation par longueur (10 à 100 000 messages)
+- tours /api/chat dans chacune (fournisseur stub sans latence, résumés désactivés)
+- durée médiane d'un tour, requêtes SQL par tour et lignes d'historique lues
+
+Usage: python history_benchmark.py [--turns 20] [--lengths 10,1000,100000]
+Code de sortie 1 si le tour le plus long coûte plus de --max-ratio fois le plus court.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORK_DIR = tempfile.mkdtemp(prefix="history_benchmark_")
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Before database/main are imported: throwaway database, instant model, no summaries
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(WORK_DIR, 'chat.db')}",
+    "LLM_PROVIDER": "stub",
+    "STUB_LATENCY_MS": "0",
+    "STUB_TAIL_PROB": "0",
+    "STUB_TOKENS_PER_SECOND": "0",
+    "STUB_ERROR_RATE": "0",
+    "RESPONSE_CACHE_BACKEND": "none",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "SUMMARY_EVERY_TURNS": "0",
+    # No quota pacing: only the turn itself is measured
+    "UPSTREAM_RPM": "0",
+    "UPSTREAM_TPM": "0",
+    "ROUTER_HEDGE_BUDGET": "0",
+})
+sys.path.insert(0, BACKEND_DIR)
+
+def seed(engine, Conversation, Message, estimate_tokens, length):
+    """A conversation of `length` messages, inserted in bulk; returns its id"""
+    started_at = datetime.utcnow() - timedelta(seconds=length + 1)
+    with engine.begin() as connection:
+        conversation_id = connection.execute(
+            Conversation.__table__.insert().values(title=f"{length} messages", created_at=started_at, updated_at=started_at)
+        ).inserted_primary_key[0]
+        batch = []
+        for index in range(length):
+            content = f"Message {index}: une question ou une réponse de longueur moyenne sur le sujet {index % 40}."
+            batch.append({
+                "conversation_id": conversation_id,
+                "role": "user" if index % 2 == 0 else "assistant",
+                "content": content,
+                "token_count": estimate_tokens(content),
+                "created_at": started_at + timedelta(seconds=index),
+            })
+            if len(batch) == 5000:
+                connection.execute(Message.__table__.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(Message.__table__.insert(), batch)
+    return conversation_id
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût d'un tour selon la longueur de la conversation")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--lengths", default="10,100,1000,10000,100000")
+    parser.add_argument("--max-ratio", type=float, default=2.0)
+    args = parser.parse_args()
+    lengths = [int(length) for length in args.lengths.split(",")]
+
+    os.chdir(WORK_DIR)
+    from fastapi.testclient import TestClient
+    import main as app_module
+    from core.llm_provider import HISTORY_WINDOW
+    from core.tokens import estimate_tokens
+    from database import Conversation, Message, db_stats, engine, init_db
+
+    init_db()
+    print("⏳ Création des conversations...")
+    conversations = [(length, seed(engine, Conversation, Message, estimate_tokens, length)) for length in lengths]
+
+    results = []
+    with TestClient(app_module.app) as client:
+        for length, conversation_id in conversations:
+            durations, statements = [], []
+            for turn in range(args.turns):
+                before = db_stats["statements"]
+                started = time.perf_counter()
+                response = client.post("/api/chat", data={
+                    "content": f"Question {turn} sur la suite de la conversation",
+                    "conversation_id": conversation_id,
+                })
+                durations.append(time.perf_counter() - started)
+                statements.append(db_stats["statements"] - before)
+                if response.status_code != 200:
+                    print(f"❌ {length} messages: HTTP {response.status_code} {response.text[:200]}")
+                    sys.exit(1)
+            results.append((length, statistics.median(durations), statistics.median(statements)))
+
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print(f"\n📊 {args.turns} tours par conversation, fenêtre d'historique {HISTORY_WINDOW} messages")
+    print(f"  {'messages':>9}  {'tour (médiane)':>15}  {'requêtes SQL':>12}  {'lignes lues':>11}")
+    for length, median, statement_count in results:
+        print(f"  {length:>9}  {median * 1000:>12.1f} ms  {statement_count:>12.0f}  {min(length, HISTORY_WINDOW):>11}")
+
+    ratio = results[-1][1] / results[0][1]
+    print(f"  Rapport plus longue / plus courte: {ratio:.2f}")
+    if ratio > args.max_ratio:
+        print(f"❌ Le coût d'un tour augmente avec la longueur de la conversation (> {args.max_ratio:g}x)")
+        sys.exit(1)
+    print("✅ Le coût d'un tour reste constant")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Script pour comparer ce qui part vers le modèle de vision avant et après la
+préparation des images (core/image_preprocessor.py):
+- avant: image décodée en entier puis envoyée comme image PIL, que le SDK
+  Gemini réencode en WebP sans perte
+- après: décodage réduit (draft), plus grand côté limité à --max-side,
+  réencodage JPEG (--quality), puis la même image servie par le cache
+- octets envoyés par image, temps de préparation, et latence de bout en bout
+  estimée: préparation + envoi des octets à --uplink-mbps (le temps de réponse
+  du modèle ne dépend pas de ce script)
+
+Usage:
+  python image_preprocessor_benchmark.py
+  python image_preprocessor_benchmark.py --photos ~/Images/telephone --uplink-mbps 10
+
+Sans --photos, des photos synthétiques 4032x3024 (type téléphone) sont générées.
+Code de sortie 1 si l'image préparée n'est pas plus petite que l'originale.
+"""
+import argparse
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from startup_benchmark import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+def synthetic_photos(directory, count):
+    """Phone-like 4032x3024 JPEGs: smooth gradients plus sensor noise"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:3024, 0:4032]
+    paths = []
+    for index in range(count):
+        pixels = np.stack([(x / 16 + index * 30) % 256, (y / 12) % 256, ((x + y) / 20) % 256], -1)
+        pixels += rng.normal(0, 8, pixels.shape)
+        path = os.path.join(directory, f"photo_{index}.jpg")
+        Image.fromarray(np.clip(pixels, 0, 255).astype("uint8")).save(path, quality=92)
+        paths.append(path)
+    return paths
+
+def before(path):
+    """Bytes of the full-size lossless WebP the SDK built from a decoded PIL image"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "WEBP", lossless=True)
+        return len(buffer.getvalue())
+
+def measure(paths, encode):
+    """(mean bytes, mean seconds) of encode(path) over the images"""
+    sizes, seconds = [], []
+    for path in paths:
+        started = time.perf_counter()
+        sizes.append(encode(path))
+        seconds.append(time.perf_counter() - started)
+    return sum(sizes) / len(sizes), sum(seconds) / len(seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description="Octets envoyés et latence avant/après la préparation des images")
+    parser.add_argument("--photos", help="Dossier de photos (.jpg, .jpeg, .png)")
+    parser.add_argument("--count", type=int, default=5, help="Photos synthétiques à générer sans --photos")
+    parser.add_argument("--max-side", type=int, default=int(os.getenv("IMAGE_MAX_SIDE", "1536")))
+    parser.add_argument("--quality", type=int, default=int(os.getenv("IMAGE_JPEG_QUALITY", "85")))
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="Débit montant vers l'API, en Mbit/s")
+    args = parser.parse_args()
+
+    from core.image_preprocessor import ImagePreprocessor
+
+    workdir = tempfile.mkdtemp(prefix="image_preprocessor_benchmark_")
+    try:
+        if args.photos:
+            paths = sorted(
+                path for pattern in ("*.jpg", "*.jpeg", "*.png")
+                for path in glob.glob(os.path.join(os.path.expanduser(args.photos), pattern))
+            )
+            if not paths:
+                print(f"❌ Aucune photo dans {args.photos}")
+                sys.exit(1)
+        else:
+            print(f"⏳ Génération de {args.count} photos synthétiques 4032x3024...")
+            paths = synthetic_photos(workdir, args.count)
+
+        # No disk cache: the first pass measures the real work
+        preprocessor = ImagePreprocessor(args.max_side, args.quality, None, 256 * 1024 * 1024)
+        results = {
+            "avant": measure(paths, before),
+            "après": measure(paths, lambda path: len(preprocessor.prepare(path).data)),
+            "après (cache)": measure(paths, lambda path: len(preprocessor.prepare(path).data)),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    print(f"\n📊 {len(paths)} image(s), plus grand côté {args.max_side}, JPEG qualité {args.quality}, "
+          f"envoi à {args.uplink_mbps:g} Mbit/s")
+    print(f"  {'':>14}  {'octets/image':>12}  {'préparation':>11}  {'envoi':>9}  {'bout en bout':>12}")
+    for name, (size, seconds) in results.items():
+        upload = size / bytes_per_second
+        print(f"  {name:>14}  {size / 1e6:>9.2f} MB  {seconds * 1000:>8.0f} ms  {upload * 1000:>6.0f} ms  "
+              f"{(seconds + upload) * 1000:>9.0f} ms")
+
+    before_size, after_size = results["avant"][0], results["après"][0]
+    print(f"  Réduction: {before_size / after_size:.0f}x moins d'octets envoyés")
+    if after_size >= before_size:
+        print("❌ L'image préparée n'est pas plus petite que l'originale")
+        sys.exit(1)
+    print("✅ Images réduites avant l'envoi au modèle")
+
+if __name__ == "__main__":
+    main()
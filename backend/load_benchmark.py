@@ -0,0 +1,182 @@
+"""
+Script pour mesurer le backend complet sous charge et comparer des fournisseurs
+LLM (LLM_PROVIDER) avec exactement la même charge:
+- un serveur uvicorn par configuration, base SQLite neuve, cache de réponses désactivé
+- N requêtes /api/chat (ou /api/chat/stream) envoyées avec une concurrence fixe
+- latences p50/p95/p99, débit, codes HTTP, qui a répondu (engine), compteurs /metrics
+
+Usage:
+  python load_benchmark.py stub
+  python load_benchmark.py --requests 500 --concurrency 32 stub stub:STUB_ERROR_RATE=0.2 gemini
+  python load_benchmark.py --stream stub:STUB_TOKENS_PER_SECOND=40,STUB_TAIL_PROB=0.1
+
+Chaque configuration est "fournisseur" ou "fournisseur:VAR=valeur,VAR=valeur"
+(variables d'environnement propres à cette exécution).
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from startup_benchmark import BACKEND_DIR, free_port
+
+# Every LONG_EVERY-th message is long enough to be routed to the strong tier
+LONG_EVERY = 5
+
+def parse_config(spec):
+    """"stub:STUB_ERROR_RATE=0.2,STUB_SEED=1" -> ("stub", {...})"""
+    provider, _, assignments = spec.partition(":")
+    env = {"LLM_PROVIDER": provider}
+    for assignment in filter(None, assignments.split(",")):
+        name, _, value = assignment.partition("=")
+        env[name.strip()] = value.strip()
+    return spec, env
+
+def message(index):
+    """The same sequence of messages for every configuration"""
+    text = f"Question {index}: explique le sujet numéro {index % 50} en quelques phrases."
+    if index % LONG_EVERY == 0:
+        text += " Voici le contexte détaillé de ma question." * 60
+    return text
+
+def start_server(env, timeout=60):
+    """Uvicorn in a subprocess, returned once /ready answers 200"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError("Le serveur s'est arrêté au démarrage")
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=1) as response:
+                if response.status == 200:
+                    return server, base_url
+        except urllib.error.HTTPError as e:
+            if e.code == 503 and json.loads(e.read() or b"{}").get("state") == "failed":
+                server.terminate()
+                raise RuntimeError("Le fournisseur n'a pas pu démarrer (configuration manquante ?)")
+            time.sleep(0.05)
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError(f"Le serveur n'était pas prêt après {timeout}s")
+
+def send(base_url, index, stream):
+    """(status, engine, seconds, seconds to the first chunk or None) of one chat turn"""
+    path = "/api/chat/stream" if stream else "/api/chat"
+    data = urllib.parse.urlencode({"content": message(index)}).encode()
+    started = time.perf_counter()
+    first_chunk = None
+    try:
+        with urllib.request.urlopen(f"{base_url}{path}", data=data, timeout=120) as response:
+            if not stream:
+                body = json.loads(response.read())
+                return response.status, body.get("engine"), time.perf_counter() - started, None
+            engine, event = None, None
+            for line in response:
+                line = line.decode().strip()
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    if event == "chunk" and first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                    elif event == "done":
+                        engine = json.loads(line[len("data:"):]).get("engine")
+                    elif event == "error":
+                        engine = "error"
+            return response.status, engine, time.perf_counter() - started, first_chunk
+    except urllib.error.HTTPError as e:
+        return e.code, None, time.perf_counter() - started, None
+    except OSError:
+        return "connexion", None, time.perf_counter() - started, None
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run(spec, env_overrides, requests, concurrency, stream):
+    workdir = tempfile.mkdtemp(prefix="load_benchmark_")
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'chat.db')}",
+        "RESPONSE_CACHE_BACKEND": "none",
+        "SEMANTIC_CACHE_ENABLED": "false",
+    })
+    env.update(env_overrides)
+
+    try:
+        server, base_url = start_server(env)
+    except RuntimeError:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda index: send(base_url, index, stream), range(requests)))
+        elapsed = time.perf_counter() - started
+        with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+            metrics = json.loads(response.read())
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    statuses = Counter(status for status, _, _, _ in results)
+    engines = Counter(engine for _, engine, _, _ in results if engine)
+    latencies = [seconds for status, _, seconds, _ in results if status == 200]
+    first_chunks = [first for _, _, _, first in results if first is not None]
+
+    print(f"\n📊 {spec}: {requests} requêtes, concurrence {concurrency}{' (stream)' if stream else ''}")
+    print(f"  Débit: {requests / elapsed:.1f} req/s ({elapsed:.1f} s)")
+    print(f"  Codes HTTP: {dict(statuses)}   engine: {dict(engines)}")
+    print(f"  Latence (200): p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, p99 {percentile(latencies, 0.99) * 1000:.0f} ms")
+    if first_chunks:
+        print(f"  Premier chunk: p50 {percentile(first_chunks, 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(first_chunks, 0.95) * 1000:.0f} ms")
+    upstream = metrics.get("upstream", {})
+    router = metrics.get("router", {})
+    circuit = metrics.get("circuit", {})
+    print(f"  Amont: {json.dumps({key: upstream.get(key) for key in ('limit', 'avg_wait_ms', 'throttled', 'retries', 'failures') if key in upstream})}")
+    print(f"  Routage: {router.get('routed')}, hedges {router.get('hedged')} (gagnés {router.get('hedge_wins')})")
+    print(f"  Disjoncteur: {circuit.get('state')}, {circuit.get('trips')} ouverture(s), {circuit.get('refused')} refus")
+    print(f"  Fournisseur: {json.dumps(metrics.get('provider'))}")
+    return statuses
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de charge du backend, un serveur par configuration de fournisseur")
+    parser.add_argument("configs", nargs="*", default=["stub"], help='"fournisseur" ou "fournisseur:VAR=valeur,..."')
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--stream", action="store_true", help="utiliser /api/chat/stream")
+    args = parser.parse_args()
+
+    ok = True
+    for spec in args.configs:
+        spec, env_overrides = parse_config(spec)
+        try:
+            statuses = run(spec, env_overrides, args.requests, args.concurrency, args.stream)
+        except RuntimeError as e:
+            print(f"\n❌ {spec}: {e}")
+            ok = False
+            continue
+        ok = ok and statuses.get(200, 0) > 0
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
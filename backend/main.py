@@ -1,41 +1,66 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Path, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from pydantic import BaseModel, ConfigDict
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select, delete, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, computed_field
 from datetime import datetime
 from contextlib import asynccontextmanager
+import json
 import os
 # 
-from database import get_db, init_db, Conversation, Message
+from database import get_db, init_db, AsyncSessionLocal, Conversation, Message, ImageBlob, blob_reference_statement, db_stats
+from pagination import keyset_page
+from summaries import conversation_summarizer
 from core.response_generator import response_generator
-from core.image_analyzer import image_analyzer
-from core.gemini_client import get_gemini_client
+from core.gemini_client import model_discovery_stats
+from core.llm_provider import get_llm_provider, llm_warmup, HISTORY_WINDOW
+from core.tokens import estimate_tokens
+from core.executor import blocking_executor, run_blocking
+from core.response_cache import response_cache
+from core.semantic_cache import semantic_cache
+from core.image_preprocessor import image_preprocessor
+from core.ocr_service import OCRQueueFull, ocr_service
+from core.singleflight import Pending, singleflight
+from core.model_router import model_router
+from core.upstream_scheduler import UpstreamBusy, upstream_conversation, upstream_scheduler
+from core.uploads import StoredUpload, UploadLimitMiddleware, save_upload
+from core.readiness import ReadinessMiddleware
+from core.admission import AdmissionMiddleware, chat_admission
+from core.circuit_breaker import CircuitOpen, llm_breaker
+from core.image_store import image_store
+from core.thumbnails import (
+    IMMUTABLE_CACHE_CONTROL, THUMBNAIL_WIDTHS, UploadStaticFiles, etag_matches, thumbnail_store, thumbnail_urls
+)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     init_db()
-    # Initialize Gemini client
-    try:
-        gemini_client = get_gemini_client()
-        if gemini_client:
-            print("✅ Gemini API client initialized successfully")
-        else:
-            print("⚠️ Warning: Gemini API client not initialized. Check GOOGLE_API_KEY in .env")
-    except Exception as e:
-        print(f"⚠️ Warning: Could not initialize Gemini client: {e}")
+    # Initialize the LLM provider (LLM_PROVIDER) in the background: serving starts right away, /ready tracks it
+    llm_warmup.start()
     yield
-    # Shutdown (if needed)
-    pass
+    # Shutdown
+    await llm_warmup.stop()
+    blocking_executor.shutdown()
+    ocr_service.shutdown()
+    model_router.shutdown()
 
 app = FastAPI(title="Mini Chatbot API", lifespan=lifespan)
 
-# Serve static files (uploaded images)
+# Serve static files (uploaded images; content-addressed blobs are cached as immutable)
 upload_dir = "uploads"
+upload_tmp_dir = os.path.join(upload_dir, "tmp")
 os.makedirs(upload_dir, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=upload_dir), name="uploads")
+app.mount("/uploads", UploadStaticFiles(directory=upload_dir), name="uploads")
+
+# Reject oversized chat uploads while they stream in
+app.add_middleware(UploadLimitMiddleware, paths=["/api/chat"])
+# Bounded number of chat turns in flight; the excess waits briefly or gets 503 + Retry-After
+app.add_middleware(AdmissionMiddleware, paths=["/api/chat"], controller=chat_admission)
+# Fast 503 for chat requests until the LLM provider is warmed up
+app.add_middleware(ReadinessMiddleware, paths=["/api/chat"], status=llm_warmup.status)
 
 # Configure CORS
 app.add_middleware(
@@ -44,6 +69,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "Retry-After"],
 )
 
 # Pydantic models
@@ -61,6 +87,12 @@ class MessageResponse(BaseModel):
     image_path: Optional[str] = None
     created_at: datetime
 
+    @computed_field
+    @property
+    def thumbnail_urls(self) -> Optional[Dict[str, str]]:
+        """Thumbnail URLs by width, for images in the content-addressed store"""
+        return thumbnail_urls(self.image_path)
+
 class ConversationResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -72,6 +104,8 @@ class ConversationResponse(BaseModel):
 class ChatResponse(BaseModel):
     message: MessageResponse
     conversation: ConversationResponse
+    # Who answered: the provider ("gemini", "stub"), "cache" or "local" (rule-based fallback)
+    engine: str
 
 @app.get("/")
 def read_root():
@@ -81,179 +115,496 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+def readiness_check(response: Response):
+    """Readiness (LLM provider warm-up state); 503 until chat requests can be served"""
+    status = llm_warmup.status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
+@app.get("/metrics")
+def metrics():
+    """Runtime counters (executor saturation, ...)"""
+    provider = get_llm_provider()
+    return {
+        "executor": blocking_executor.stats(),
+        "database": dict(db_stats),
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "singleflight": singleflight.stats(),
+        "image_preprocessor": image_preprocessor.stats(),
+        "thumbnails": thumbnail_store.stats(),
+        "ocr": ocr_service.stats(),
+        "provider": provider.stats() if provider else {"name": llm_warmup.provider_name},
+        "gemini_model": dict(model_discovery_stats),
+        "summaries": conversation_summarizer.stats(),
+        "upstream": upstream_scheduler.stats(),
+        "router": model_router.stats(),
+        "admission": chat_admission.stats(),
+        "circuit": llm_breaker.stats(),
+    }
+
+async def _start_chat_turn(db: AsyncSession, content: str, conversation_id: Optional[int]):
+    """
+    Read phase of a chat turn: resolve the conversation and load the history.
+    Nothing is written here; a new conversation only exists in memory until
+    _finish_chat_turn. Returns (conversation, history).
+    """
+    if not conversation_id:
+        return Conversation(title=content[:50] if content else "Nouvelle conversation"), []
+    
+    conversation = await db.get(Conversation, conversation_id)
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    # Get conversation history for context: only the window the prompt uses,
+    # after the messages already folded into the summary, newest first through
+    # the (conversation_id, created_at) index, then reversed. Stored token
+    # counts let the prompt builder apply its token budget without re-counting
+    history_rows = (await db.execute(
+        select(Message.role, Message.content, Message.token_count)
+        .where(
+            Message.conversation_id == conversation.id,
+            Message.id > (conversation.summary_until_id or 0)
+        )
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(HISTORY_WINDOW)
+    )).all()
+    
+    history = [
+        {"role": role, "content": msg_content, "tokens": token_count}
+        for role, msg_content, token_count in reversed(history_rows)
+    ]
+    # The rolling summary stands in for the older turns
+    if conversation.summary:
+        history.insert(0, {"role": "summary", "content": conversation.summary})
+    
+    # Don't hold a pooled connection while Gemini answers: end the read-only
+    # transaction and keep the conversation detached until the write phase
+    db.expunge(conversation)
+    await db.rollback()
+    
+    return conversation, history
+
+async def _finish_chat_turn(
+    db: AsyncSession,
+    conversation: Conversation,
+    content: str,
+    upload: Optional[StoredUpload],
+    bot_content: str,
+    received_at: datetime,
+    engine: str
+) -> ChatResponse:
+    """
+    Write phase of a chat turn, as a single unit of work: the conversation
+    (if new), the user message with its image and the bot response are
+    committed together with one commit, or not at all.
+    Ids and timestamps are known after the flush, so nothing is refreshed.
+    """
+    db.add(conversation)
+    
+    image_path = None
+    if upload is not None:
+        # Identical images share one content-addressed blob; the file is moved
+        # into place after the commit (see below)
+        image_path = await run_blocking(image_store.path_for, upload.path, upload.sha256)
+        await db.execute(blob_reference_statement(db.bind.dialect.name, upload.sha256, image_path, upload.size))
+        print(f"📸 Image uploaded: {upload.filename}, size: {upload.size} bytes, blob: {upload.sha256[:12]}")
+    
+    now = datetime.utcnow()
+    user_message = Message(
+        conversation=conversation,
+        role="user",
+        content=content,
+        image_path=image_path,
+        token_count=estimate_tokens(content),
+        created_at=received_at
+    )
+    bot_message = Message(
+        conversation=conversation,
+        role="assistant",
+        content=bot_content,
+        token_count=estimate_tokens(bot_content),
+        created_at=now
+    )
+    db.add_all([user_message, bot_message])
+    
+    # Update conversation timestamp
+    conversation.updated_at = now
+    
+    await db.commit()
+    
+    if upload is not None:
+        # Only now that the reference is committed: a concurrent delete of the
+        # same blob either sees it and keeps the file, or has removed the file
+        # and put() stores this upload again. Nothing to undo if the commit fails.
+        await run_blocking(image_store.put, upload.path, upload.sha256)
+    
+    return ChatResponse(
+        message=MessageResponse.model_validate(bot_message),
+        conversation=ConversationResponse.model_validate(conversation),
+        engine=engine
+    )
+
+async def _read_image(image: Optional[UploadFile]) -> Optional[StoredUpload]:
+    """Stream an uploaded image to a temporary file (validated and hashed on the way)."""
+    if not image:
+        return None
+    return await save_upload(image, upload_tmp_dir)
+
+async def _ocr_answer(content: str, upload: Optional[StoredUpload]) -> Optional[str]:
+    """
+    While the circuit is open, an image turn is answered with the text OCR
+    reads in the image (None: no image, no text or OCR unavailable). OCR runs
+    in the worker processes, cached by the upload's SHA-256.
+    """
+    if upload is None or not ocr_service.available():
+        return None
+    try:
+        text = await ocr_service.extract_text_async(upload.path, upload.sha256)
+    except (OCRQueueFull, TimeoutError) as e:
+        print(f"⚠️ Warning: No OCR answer for {upload.sha256[:12]}: {e}")
+        return None
+    except Exception as e:
+        print(f"⚠️ Warning: OCR failed for {upload.sha256[:12]}: {type(e).__name__}")
+        return None
+    if not text:
+        return None
+    print("🛟 Circuit open: image answered with its OCR text")
+    return response_generator.image_text_answer(text, response_generator.detect_language(content))
+
+def _sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(
+    background_tasks: BackgroundTasks,
     content: str = Form(...),
     conversation_id: Optional[int] = Form(None),
     image: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    no_cache: bool = Form(False),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Main chat endpoint. Processes user message and optional image, returns bot response.
+    Set `no_cache` to bypass the response cache.
     """
+    upload = None
     try:
         # Validate input
         if not content.strip() and not image:
             raise HTTPException(status_code=400, detail="Message cannot be empty")
         
-        # Get or create conversation
-        if conversation_id:
-            conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-            if not conversation:
-                raise HTTPException(status_code=404, detail="Conversation not found")
-        else:
-            # Create new conversation
-            conversation = Conversation(title=content[:50] if content else "Nouvelle conversation")
-            db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-        
-        # Save user message
-        image_path = None
-        image_data = None
-        
-        if image:
-            # Save uploaded image
-            timestamp = datetime.now().timestamp()
-            safe_filename = image.filename.replace(" ", "_") if image.filename else "image"
-            image_path = f"{upload_dir}/{conversation.id}_{timestamp}_{safe_filename}"
-            
-            image_bytes = await image.read()
-            
-            # Validate image
-            if len(image_bytes) == 0:
-                raise HTTPException(status_code=400, detail="Image file is empty")
-            
-            # Check image size (max 20MB for Gemini API)
-            if len(image_bytes) > 20 * 1024 * 1024:
-                raise HTTPException(status_code=400, detail="Image file is too large (max 20MB)")
-            
-            with open(image_path, "wb") as f:
-                f.write(image_bytes)
-            
-            image_data = image_bytes
-            print(f"📸 Image uploaded: {image.filename}, size: {len(image_bytes)} bytes")
-        
-        user_message = Message(
-            conversation_id=conversation.id,
-            role="user",
-            content=content,
-            image_path=image_path
-        )
-        db.add(user_message)
-        db.commit()
-        
-        # Get conversation history for context
-        history_messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id
-        ).order_by(Message.created_at).all()
-        
-        history = [
-            {"role": msg.role, "content": msg.content}
-            for msg in history_messages[:-1]  # Exclude current user message
-        ]
+        received_at = datetime.utcnow()
+        upload = await _read_image(image)
         
-        # Generate bot response
-        response_data = response_generator.generate_response(
-            user_message=content,
-            image_data=image_data,
-            conversation_history=history
-        )
-        
-        # Save bot response
-        bot_message = Message(
-            conversation_id=conversation.id,
-            role="assistant",
-            content=response_data["content"]
-        )
-        db.add(bot_message)
-        
-        # Update conversation timestamp
-        conversation.updated_at = datetime.utcnow()
+        conversation, history = await _start_chat_turn(db, content, conversation_id)
+        # Upstream calls are queued fairly per conversation
+        upstream_conversation.set(conversation.id)
         
-        db.commit()
-        db.refresh(bot_message)
-        db.refresh(conversation)
+        # Generate bot response (blocking Gemini call, kept off the event loop).
+        # If this raises, nothing of the turn has been persisted.
+        try:
+            response_data = await run_blocking(
+                response_generator.generate_response,
+                user_message=content,
+                image_path=upload.path if upload else None,
+                conversation_history=history,
+                use_cache=not no_cache,
+                image_hash=upload.sha256 if upload else None
+            )
+        except CircuitOpen:
+            answer = await _ocr_answer(content, upload)
+            if answer is None:
+                raise
+            response_data = {"content": answer, "engine": "ocr"}
         
-        return ChatResponse(
-            message=MessageResponse.model_validate(bot_message),
-            conversation=ConversationResponse.model_validate(conversation)
+        result = await _finish_chat_turn(
+            db, conversation, content, upload, response_data["content"], received_at, response_data["engine"]
         )
+        # Summary refresh runs after the response is sent
+        if conversation_summarizer.needs_refresh(history):
+            background_tasks.add_task(conversation_summarizer.refresh, result.conversation.id)
+        return result
+    
+    except HTTPException:
+        raise
+    except UpstreamBusy as e:
+        # Nothing was persisted: the client can resend the same message
+        await db.rollback()
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        # No-op once the upload has been moved into place
+        if upload:
+            upload.discard()
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+    background_tasks: BackgroundTasks,
+    content: str = Form(...),
+    conversation_id: Optional[int] = Form(None),
+    image: Optional[UploadFile] = File(None),
+    no_cache: bool = Form(False)
+):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+    Emits `chunk` events with partial text, then a `done` event carrying the
+    stored message and conversation (same shape as /api/chat), or an `error` event.
+    """
+    if not content.strip() and not image:
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    received_at = datetime.utcnow()
+    upload = await _read_image(image)
     
+    # The session outlives this handler (it is used while streaming),
+    # so it is owned by the stream rather than by the get_db dependency.
+    db = AsyncSessionLocal()
+    try:
+        conversation, history = await _start_chat_turn(db, content, conversation_id)
     except HTTPException:
+        await db.close()
+        if upload:
+            upload.discard()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        await db.close()
+        if upload:
+            upload.discard()
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    upstream_conversation.set(conversation.id)
+    
+    async def event_stream():
+        info = {}
+        chunks = response_generator.stream_response(
+            user_message=content,
+            image_path=upload.path if upload else None,
+            conversation_history=history,
+            use_cache=not no_cache,
+            image_hash=upload.sha256 if upload else None,
+            info=info
+        )
+        parts = []
+        try:
+            try:
+                while True:
+                    # Each next() may block on the network: pull chunks off the event loop
+                    chunk = await run_blocking(next, chunks, None)
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, Pending):
+                        # An identical request is streaming: wait here, not on a worker thread it needs
+                        await chunk.wait()
+                        continue
+                    parts.append(chunk)
+                    yield _sse("chunk", {"text": chunk})
+            except CircuitOpen:
+                answer = await _ocr_answer(content, upload)
+                if answer is None:
+                    raise
+                parts = [answer]
+                info["engine"] = "ocr"
+                yield _sse("chunk", {"text": answer})
+            
+            # The turn is only persisted once the stream completed
+            result = await _finish_chat_turn(
+                db, conversation, content, upload, "".join(parts).strip(), received_at, info["engine"]
+            )
+            yield _sse("done", result.model_dump(mode="json"))
+            # Runs once the stream is closed (StreamingResponse background)
+            if conversation_summarizer.needs_refresh(history):
+                background_tasks.add_task(conversation_summarizer.refresh, result.conversation.id)
+        except UpstreamBusy as e:
+            await db.rollback()
+            yield _sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            await db.rollback()
+            yield _sse("error", {"detail": f"Internal server error: {str(e)}"})
+        finally:
+            await db.close()
+            if upload:
+                upload.discard()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        background=background_tasks,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _set_cursor_headers(response: Response, older_cursor: Optional[str], newer_cursor: Optional[str]):
+    """Expose pagination cursors: X-Next-Cursor goes back in time (pass it as `before`), X-Prev-Cursor forward (`after`)."""
+    if older_cursor:
+        response.headers["X-Next-Cursor"] = older_cursor
+    if newer_cursor:
+        response.headers["X-Prev-Cursor"] = newer_cursor
 
 @app.get("/api/conversations", response_model=List[ConversationResponse])
-def get_conversations(db: Session = Depends(get_db)):
-    """Get all conversations"""
-    conversations = db.query(Conversation).order_by(Conversation.updated_at.desc()).all()
+async def get_conversations(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get conversations, most recently updated first (keyset paginated on (updated_at, id))"""
+    try:
+        conversations, older_cursor, newer_cursor = await keyset_page(
+            db, select(Conversation), Conversation.updated_at, Conversation.id, limit, before, after
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _set_cursor_headers(response, older_cursor, newer_cursor)
     return conversations
 
 @app.get("/api/conversations/{conversation_id}", response_model=ConversationResponse)
-def get_conversation(conversation_id: int, db: Session = Depends(get_db)):
+async def get_conversation(conversation_id: int, db: AsyncSession = Depends(get_db)):
     """Get a specific conversation"""
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conversation = await db.get(Conversation, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
 
 @app.get("/api/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
-def get_messages(conversation_id: int, db: Session = Depends(get_db)):
-    """Get all messages for a conversation"""
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.created_at).all()
+async def get_messages(
+    conversation_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get messages for a conversation in chronological order.
+    Returns the latest page by default (keyset paginated on (created_at, id)).
+    """
+    try:
+        messages, older_cursor, newer_cursor = await keyset_page(
+            db, select(Message).where(Message.conversation_id == conversation_id),
+            Message.created_at, Message.id, limit, before, after
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _set_cursor_headers(response, older_cursor, newer_cursor)
+    messages.reverse()
     return messages
 
+@app.get("/api/thumbnails/{sha256}/{width}")
+async def get_thumbnail(
+    width: int,
+    request: Request,
+    sha256: str = Path(..., pattern="^[0-9a-f]{64}$"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    JPEG thumbnail of an uploaded image, generated on first request and cached on disk.
+    Thumbnails are named by content: strong ETag, immutable caching, Range support.
+    """
+    if width not in THUMBNAIL_WIDTHS:
+        raise HTTPException(status_code=404, detail=f"Thumbnail width must be one of {list(THUMBNAIL_WIDTHS)}")
+    
+    headers = {"ETag": f'"{sha256}-{width}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(headers["ETag"], request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    
+    path = thumbnail_store.thumbnail_path(sha256, width)
+    if not os.path.exists(path):
+        blob = await db.get(ImageBlob, sha256)
+        if not blob:
+            raise HTTPException(status_code=404, detail="Image not found")
+        # Decoding and resizing are blocking: keep them off the event loop
+        path = await run_blocking(thumbnail_store.get, blob.path, sha256, width)
+    
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
 @app.put("/api/conversations/{conversation_id}")
-def update_conversation(
+async def update_conversation(
     conversation_id: int,
     title: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update conversation title"""
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conversation = await db.get(Conversation, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     conversation.title = title
     conversation.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(conversation)
+    await db.commit()
+    await db.refresh(conversation)
     
     return ConversationResponse.model_validate(conversation)
 
 @app.delete("/api/conversations/{conversation_id}")
-def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
+async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a conversation and all its messages"""
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conversation = await db.get(Conversation, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # Delete associated images
-    messages = db.query(Message).filter(Message.conversation_id == conversation_id).all()
-    for msg in messages:
-        if msg.image_path and os.path.exists(msg.image_path):
-            try:
-                os.remove(msg.image_path)
-            except:
-                pass
+    # Drop this conversation's references to its image blobs
+    blob_refs = (await db.execute(
+        select(ImageBlob.sha256, func.count(Message.id))
+        .join(Message, Message.image_path == ImageBlob.path)
+        .where(Message.conversation_id == conversation_id)
+        .group_by(ImageBlob.sha256)
+    )).all()
+    for sha256, references in blob_refs:
+        await db.execute(
+            update(ImageBlob)
+            .where(ImageBlob.sha256 == sha256)
+            .values(ref_count=ImageBlob.ref_count - references)
+        )
+    
+    # Blobs nobody references anymore are deleted with the conversation
+    orphan_blobs = (await db.execute(
+        select(ImageBlob.sha256, ImageBlob.path).where(
+            ImageBlob.sha256.in_([sha256 for sha256, _ in blob_refs]),
+            ImageBlob.ref_count <= 0
+        )
+    )).all()
+    if orphan_blobs:
+        await db.execute(delete(ImageBlob).where(
+            ImageBlob.sha256.in_([sha256 for sha256, _ in orphan_blobs]),
+            ImageBlob.ref_count <= 0
+        ))
+    
+    # Bulk delete instead of loading every message for the ORM cascade
+    await db.execute(delete(Message).where(Message.conversation_id == conversation_id))
+    await db.delete(conversation)
+    await db.commit()
     
-    db.delete(conversation)
-    db.commit()
+    # Files are only removed once the deletion is committed. A chat turn may
+    # have referenced the same image again since: move the file aside, check
+    # the blob row again, and put the file back if it exists
+    for sha256, path in orphan_blobs:
+        retired = await run_blocking(image_store.retire, path)
+        if retired is None:
+            continue
+        referenced = await db.scalar(select(ImageBlob.sha256).where(ImageBlob.sha256 == sha256))
+        # End the read so the next check sees fresh data
+        await db.rollback()
+        if referenced:
+            await run_blocking(image_store.restore, retired, path)
+        else:
+            await run_blocking(image_store.remove, retired)
+            await run_blocking(thumbnail_store.remove, sha256)
     
     return {"message": "Conversation deleted successfully"}
 
 @app.post("/api/conversations/new")
-def create_new_conversation(db: Session = Depends(get_db)):
+async def create_new_conversation(db: AsyncSession = Depends(get_db)):
     """Create a new empty conversation"""
     conversation = Conversation(title="Nouvelle conversation")
     db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
+    await db.commit()
+    await db.refresh(conversation)
     return ConversationResponse.model_validate(conversation)
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+"""
+Script pour migrer les images existantes vers le stockage adressé par contenu
+(uploads/blobs), avec comptage des références dans la table image_blobs.
+"""
+import os
+import shutil
+import tempfile
+from sqlalchemy import select
+from database import SessionLocal, init_db, Message, blob_reference_statement
+from core.image_store import file_sha256, image_store
+
+def migrate_images():
+    """Déplace chaque image référencée hors du store dans uploads/blobs"""
+    init_db()
+    db = SessionLocal()
+    moved = {}
+    migrated = missing = 0
+    try:
+        messages = db.execute(
+            select(Message).where(
+                Message.image_path.is_not(None),
+                Message.image_path.not_like(f"{image_store.root}/%")
+            )
+        ).scalars().all()
+
+        for message in messages:
+            old_path = message.image_path
+            if old_path not in moved:
+                if not os.path.exists(old_path):
+                    print(f"❌ Image introuvable pour le message {message.id}: {old_path}")
+                    missing += 1
+                    continue
+                sha256 = file_sha256(old_path)
+                size = os.path.getsize(old_path)
+                # Copy first: the original is only removed once its references are committed
+                os.makedirs(image_store.root, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=image_store.root, suffix=".part")
+                os.close(fd)
+                shutil.copyfile(old_path, temp_path)
+                path, _ = image_store.put(temp_path, sha256)
+                moved[old_path] = (sha256, path, size)
+
+            sha256, path, size = moved[old_path]
+            db.execute(blob_reference_statement(db.bind.dialect.name, sha256, path, size))
+            message.image_path = path
+            db.commit()
+            migrated += 1
+    finally:
+        db.close()
+
+    for old_path in moved:
+        os.remove(old_path)
+
+    print(f"✅ {migrated} image(s) migrée(s), {missing} introuvable(s)")
+
+if __name__ == "__main__":
+    migrate_images()
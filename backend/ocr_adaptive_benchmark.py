@@ -0,0 +1,101 @@
+"""
+Script pour comparer l'OCR adaptatif (core/ocr_preprocessing.py: images sans
+texte ignorées, langues choisies par OSD, mise à l'échelle et binarisation) à
+l'OCR fixe fra+eng+ara sur l'image brute (OCR_ADAPTIVE=false):
+- les mêmes images lues dans les deux modes, une par une, dans ce processus
+  (le même travail qu'un worker de core/ocr_service.py)
+- temps OCR par image, et précision: similarité des caractères avec le texte
+  attendu (difflib), une image sans texte attendu est juste si rien n'est lu
+- images ignorées à tort (du texte était attendu) et langues choisies
+
+Usage:
+  python ocr_adaptive_benchmark.py
+  python ocr_adaptive_benchmark.py --images ~/Images/echantillon
+
+Avec --images, le texte attendu d'une image est lu dans <nom>.txt à côté d'elle
+(les images sans .txt ne comptent que pour le temps). Sans --images, des images
+sont générées (voir ocr_benchmark.py). Sans tesseract, le script s'arrête sans échec.
+Code de sortie 1 si le mode adaptatif est moins précis que le mode fixe de plus
+de --max-accuracy-loss.
+"""
+import argparse
+import difflib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from ocr_benchmark import images_from_args, tesseract_available
+
+def accuracy(text, expected):
+    """Character similarity of two texts, whitespace collapsed (1.0: identical)"""
+    text, expected = " ".join(text.split()), " ".join(expected.split())
+    if not expected:
+        return 1.0 if not text else 0.0
+    return difflib.SequenceMatcher(None, text, expected).ratio()
+
+def run(images, options, timeout):
+    """[(seconds, result, expected)] for every image in one mode"""
+    from core.ocr_service import _ocr_job
+
+    results = []
+    for path, expected in images:
+        started = time.perf_counter()
+        result = _ocr_job(path, options, timeout)
+        results.append((time.perf_counter() - started, result, expected))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR adaptatif contre fra+eng+ara fixe: temps et précision")
+    parser.add_argument("--images", help="Dossier d'images avec leur texte attendu (<nom>.txt)")
+    parser.add_argument("--count", type=int, default=16, help="Images générées sans --images")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-accuracy-loss", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if not tesseract_available():
+        print("⏭️ tesseract introuvable (TESSERACT_CMD): benchmark ignoré")
+        return
+
+    from core.ocr_service import ocr_service
+
+    # Same settings as the service (OCR_MIN_SIDE, OCR_MAX_SIDE...), only the mode changes
+    modes = {
+        "fixe": dict(ocr_service.options, adaptive=False),
+        "adaptatif": dict(ocr_service.options, adaptive=True),
+    }
+    workdir = tempfile.mkdtemp(prefix="ocr_adaptive_benchmark_")
+    try:
+        images = images_from_args(args, workdir)
+        results = {name: run(images, options, args.timeout) for name, options in modes.items()}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n📊 {len(images)} image(s), {sum(1 for _, expected in images if expected is not None)} avec texte attendu")
+    print(f"  {'mode':>9}  {'médiane':>9}  {'total':>8}  {'précision':>9}  {'ignorées':>8}  {'à tort':>6}")
+    mean_accuracy = {}
+    for name, runs in results.items():
+        seconds = [elapsed for elapsed, _, _ in runs]
+        scored = [accuracy(result["text"], expected) for _, result, expected in runs if expected is not None]
+        mean_accuracy[name] = statistics.mean(scored) if scored else None
+        skipped = sum(1 for _, result, _ in runs if result["skipped"])
+        wrongly_skipped = sum(1 for _, result, expected in runs if result["skipped"] and expected and expected.strip())
+        shown = f"{mean_accuracy[name]:.1%}" if scored else "-"
+        print(f"  {name:>9}  {statistics.median(seconds) * 1000:>6.0f} ms  {sum(seconds):>6.1f} s  {shown:>9}  "
+              f"{skipped:>8}  {wrongly_skipped:>6}")
+    languages = Counter(result["languages"] or "(ignorée)" for _, result, _ in results["adaptatif"])
+    print(f"  Langues choisies (adaptatif): {dict(languages)}")
+
+    fixed_total = sum(elapsed for elapsed, _, _ in results["fixe"])
+    adaptive_total = sum(elapsed for elapsed, _, _ in results["adaptatif"])
+    print(f"  Temps adaptatif / fixe: {adaptive_total / fixed_total:.2f}")
+    if mean_accuracy["fixe"] is not None and mean_accuracy["adaptatif"] < mean_accuracy["fixe"] - args.max_accuracy_loss:
+        print(f"❌ Le mode adaptatif perd plus de {args.max_accuracy_loss:.0%} de précision")
+        sys.exit(1)
+    print("✅ Mode adaptatif au moins aussi précis (à la tolérance près)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Script pour mesurer le débit de l'OCR (core/ocr_service.py) selon le nombre de
+processus de travail:
+- un jeu d'images: --images DIR, ou des images générées (texte français et
+  anglais de longueurs variées, et des photos sans texte)
+- pour chaque nombre de workers (1, 2, 4... jusqu'au nombre de cœurs), toutes
+  les images soumises en même temps à un OCRService neuf (sans cache)
+- images/s, et accélération par rapport à un worker
+
+Usage:
+  python ocr_benchmark.py
+  python ocr_benchmark.py --images ~/Images/scans --workers 1,2,4,8
+
+Nécessite tesseract (avec fra, eng et ara); sans lui, le script s'arrête sans
+échec. Avec --images, un fichier <nom>.txt à côté d'une image donne le texte
+attendu (utilisé par ocr_adaptive_benchmark.py).
+"""
+import argparse
+import asyncio
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from startup_benchmark import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+SENTENCES = [
+    "Facture numéro 2024-118, total à payer 342,50 euros avant le 15 mars.",
+    "The meeting is moved to Thursday at 10 am in room B, bring the quarterly report.",
+    "Ordonnance: paracétamol 500 mg, deux comprimés trois fois par jour pendant cinq jours.",
+    "Warning: do not operate this machine without protective glasses and gloves.",
+    "Horaires d'ouverture: du lundi au vendredi de 9 h à 18 h, le samedi de 10 h à 13 h.",
+    "Delivery address: 221B Baker Street, London NW1 6XE, United Kingdom.",
+]
+
+def tesseract_available():
+    return shutil.which(os.getenv("TESSERACT_CMD") or "tesseract") is not None
+
+def sample_images(directory, count):
+    """
+    Generated images as (path, expected text): one to several sentences drawn on
+    a white page, and every fourth one a photo-like gradient without text.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    font = ImageFont.load_default(size=28)
+    rng = np.random.default_rng(0)
+    images = []
+    for index in range(count):
+        path = os.path.join(directory, f"sample_{index}.png")
+        if index % 4 == 3:
+            y, x = np.mgrid[0:900, 0:1200]
+            pixels = np.stack([(x / 5 + index * 20) % 256, (y / 4) % 256, ((x + y) / 8) % 256], -1)
+            pixels += rng.normal(0, 6, pixels.shape)
+            Image.fromarray(np.clip(pixels, 0, 255).astype("uint8")).save(path)
+            images.append((path, ""))
+            continue
+        lines = [SENTENCES[(index + line) % len(SENTENCES)] for line in range(1 + index % 6)]
+        page = Image.new("L", (1400, 80 + 50 * len(lines)), 255)
+        draw = ImageDraw.Draw(page)
+        for line, text in enumerate(lines):
+            draw.text((40, 40 + 50 * line), text, fill=0, font=font)
+        page.save(path)
+        images.append((path, "\n".join(lines)))
+    return images
+
+def load_images(directory):
+    """(path, expected text or None) for the images of a directory"""
+    images = []
+    for pattern in ("*.png", "*.jpg", "*.jpeg", "*.tif", "*.tiff"):
+        for path in glob.glob(os.path.join(os.path.expanduser(directory), pattern)):
+            expected_path = os.path.splitext(path)[0] + ".txt"
+            expected = None
+            if os.path.exists(expected_path):
+                with open(expected_path, encoding="utf-8") as f:
+                    expected = f.read()
+            images.append((path, expected))
+    return sorted(images)
+
+def images_from_args(args, workdir):
+    if args.images:
+        images = load_images(args.images)
+        if not images:
+            print(f"❌ Aucune image dans {args.images}")
+            sys.exit(1)
+        return images
+    print(f"⏳ Génération de {args.count} images...")
+    return sample_images(workdir, args.count)
+
+async def run_all(service, paths):
+    """Every image submitted at once; returns the elapsed seconds"""
+    from core.image_store import file_sha256
+
+    hashes = [file_sha256(path) for path in paths]
+    started = time.perf_counter()
+    # Failures and timeouts are counted in the service stats
+    await asyncio.gather(*(service.extract_text_async(path, sha256) for path, sha256 in zip(paths, hashes)), return_exceptions=True)
+    return time.perf_counter() - started
+
+def worker_counts(spec):
+    if spec:
+        return [int(count) for count in spec.split(",")]
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Images OCR par seconde selon le nombre de workers")
+    parser.add_argument("--images", help="Dossier d'images (sinon des images générées)")
+    parser.add_argument("--count", type=int, default=32, help="Images générées sans --images")
+    parser.add_argument("--workers", help="Nombres de workers, ex. 1,2,4 (défaut: 1, 2, 4... jusqu'aux cœurs)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--fixed", action="store_true", help="OCR fra+eng+ara sans prétraitement (OCR_ADAPTIVE=false)")
+    args = parser.parse_args()
+
+    if not tesseract_available():
+        print("⏭️ tesseract introuvable (TESSERACT_CMD): benchmark ignoré")
+        return
+
+    from core.ocr_service import OCRService
+
+    workdir = tempfile.mkdtemp(prefix="ocr_benchmark_")
+    try:
+        paths = [path for path, _ in images_from_args(args, workdir)]
+        results = []
+        for workers in worker_counts(args.workers):
+            service = OCRService(workers=workers, max_queue=len(paths), timeout=args.timeout,
+                                 cache_max_entries=len(paths), adaptive=not args.fixed)
+            try:
+                # Includes starting the worker processes, as on the first requests after a restart
+                elapsed = asyncio.run(run_all(service, paths))
+                stats = service.stats()
+            finally:
+                service.shutdown()
+            results.append((workers, len(paths) / elapsed, stats))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n📊 {len(paths)} image(s), OCR {'fixe fra+eng+ara' if args.fixed else 'adaptatif'}, {os.cpu_count()} cœur(s)")
+    print(f"  {'workers':>7}  {'images/s':>9}  {'accélération':>12}  {'ignorées':>8}  {'échecs':>6}")
+    single = results[0][1]
+    for workers, throughput, stats in results:
+        print(f"  {workers:>7}  {throughput:>9.2f}  {throughput / single:>11.2f}x  {stats['skipped']:>8}  "
+              f"{stats['failed'] + stats['timeouts']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Build an opaque cursor from a row's (timestamp, id) key"""
+    raw = json.dumps([sort_value.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor built by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+async def keyset_page(db: AsyncSession, stmt: Select, sort_column, id_column, limit: int, before: Optional[str] = None, after: Optional[str] = None):
+    """
+    Keyset pagination of a select() on (sort_column, id_column), no OFFSET.
+
+    Without a cursor, or with `before`, returns the `limit` rows just below the
+    cursor (so the newest rows by default); with `after`, the `limit` rows just above it.
+    Returns (rows in descending key order, older_cursor, newer_cursor); a cursor
+    is None when there is nothing more in that direction.
+    """
+    if before and after:
+        raise ValueError("Use either 'before' or 'after', not both")
+
+    if after:
+        sort_value, row_id = decode_cursor(after)
+        stmt = stmt.where(or_(
+            sort_column > sort_value,
+            and_(sort_column == sort_value, id_column > row_id)
+        )).order_by(sort_column.asc(), id_column.asc())
+    else:
+        if before:
+            sort_value, row_id = decode_cursor(before)
+            stmt = stmt.where(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id)
+            ))
+        stmt = stmt.order_by(sort_column.desc(), id_column.desc())
+
+    # One extra row tells whether another page exists
+    rows = list((await db.execute(stmt.limit(limit + 1))).scalars().all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after:
+        rows.reverse()
+
+    def cursor_of(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    has_older = has_more if not after else True
+    has_newer = has_more if after else bool(before)
+    older_cursor = cursor_of(rows[-1]) if rows and has_older else None
+    newer_cursor = cursor_of(rows[0]) if rows and has_newer else None
+    return rows, older_cursor, newer_cursor
@@ -0,0 +1,103 @@
+"""
+Script pour mesurer le cache sémantique avec beaucoup d'entrées:
+- N questions différentes (100 000 par défaut) dans une partition
+- temps d'une recherche (calcul de l'embedding + produit matriciel + vérification
+  des nombres et des mots), pour des questions absentes et des questions connues
+- taux de réponses pour des paraphrases et pour des questions au sens différent
+
+Usage: python semantic_cache_benchmark.py [--entries 100000] [--lookups 1000]
+Code de sortie 1 si la recherche p95 dépasse --max-ms ou si une question au sens
+différent est servie depuis le cache.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from load_benchmark import percentile
+from startup_benchmark import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+SUBJECTS = ["ibuprofène", "paracétamol", "python", "javascript", "paris", "londres", "la photosynthèse", "les volcans",
+            "le cholestérol", "la fibre optique", "un prêt immobilier", "le café", "la marée", "un moteur diesel"]
+FORMS = ["qu'est-ce que {}", "comment fonctionne {}", "pourquoi parle-t-on de {}", "explique {} simplement",
+         "quels sont les risques de {}", "donne un exemple avec {}"]
+
+# (question en cache, question posée, même sens ?)
+PAIRS = [
+    ("Comment ça marche ?", "ça marche comment", True),
+    ("quelle est la capitale de la France", "Quelle est la capitale de la France ?", True),
+    ("is it safe to take ibuprofen with alcohol", "is it safe to take ibuprofen without alcohol", False),
+    ("convert 10 km to miles", "convert 100 km to miles", False),
+    ("question 0", "question 4", False),
+    ("what is 22", "what is 2-2", False),
+]
+
+def question(rng, index):
+    return f"{rng.choice(FORMS).format(rng.choice(SUBJECTS))} {index}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence de recherche du cache sémantique")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--max-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    from core.processor import processor
+    from core.semantic_cache import SemanticCache, semantic_cache
+
+    cache = SemanticCache(
+        enabled=True,
+        threshold=semantic_cache.threshold,
+        max_entries=args.entries,
+        dim=semantic_cache.dim,
+        min_token_overlap=semantic_cache.min_token_overlap,
+    )
+    rng = random.Random(0)
+
+    print(f"⏳ Remplissage de {args.entries} entrées...")
+    started = time.perf_counter()
+    stored = []
+    for index in range(args.entries):
+        text = question(rng, index)
+        cache.set("modele", "fr", processor.normalize(text), text, f"réponse {index}")
+        stored.append(text)
+    fill_seconds = time.perf_counter() - started
+
+    def timed_lookups(texts):
+        latencies, answers = [], 0
+        for text in texts:
+            started = time.perf_counter()
+            answer = cache.get("modele", "fr", processor.normalize(text), text)
+            latencies.append(time.perf_counter() - started)
+            answers += answer is not None
+        return latencies, answers
+
+    absent = [question(rng, args.entries + index) for index in range(args.lookups)]
+    known = [rng.choice(stored) for _ in range(args.lookups)]
+    absent_latencies, absent_answers = timed_lookups(absent)
+    known_latencies, known_answers = timed_lookups(known)
+
+    wrong = 0
+    print(f"\n📊 {args.entries} entrées ({fill_seconds:.1f} s de remplissage), seuil {cache.threshold:g}, "
+          f"mots communs {cache.min_token_overlap:g}, {cache.dim} dimensions")
+    for name, latencies, answers in (("absentes", absent_latencies, absent_answers), ("connues", known_latencies, known_answers)):
+        print(f"  Questions {name:>8}: p50 {percentile(latencies, 0.5) * 1000:6.2f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:6.2f} ms, servies {answers}/{len(latencies)}")
+    for cached, asked, same_meaning in PAIRS:
+        cache.set("modele", "fr", processor.normalize(cached), cached, "réponse")
+        served = cache.get("modele", "fr", processor.normalize(asked), asked) is not None
+        wrong += served != same_meaning
+        mark = "✅" if served == same_meaning else "❌"
+        print(f"  {mark} {cached!r} -> {asked!r}: {'servie' if served else 'non servie'}")
+
+    p95_ms = max(percentile(absent_latencies, 0.95), percentile(known_latencies, 0.95)) * 1000
+    if p95_ms > args.max_ms or wrong:
+        print(f"❌ Attendu: recherche p95 sous {args.max_ms:g} ms et aucune réponse d'une autre question")
+        sys.exit(1)
+    print("✅ Recherche rapide et sans réponse d'une autre question")
+
+if __name__ == "__main__":
+    main()
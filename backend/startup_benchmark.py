@@ -0,0 +1,102 @@
+"""
+Script pour mesurer le démarrage du backend:
+- temps d'import de main.py (python -X importtime), avec un budget
+- temps entre le lancement d'uvicorn et la première requête servie
+
+Usage: python startup_benchmark.py [budget_ms]
+Code de sortie 1 si le budget est dépassé ou si un module lourd est importé trop tôt.
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Heavy modules that must only be imported at first use
+LAZY_MODULES = ["google.generativeai", "nltk", "pytesseract", "numpy", "PIL"]
+IMPORT_TIME_BUDGET_MS = 1000
+RUNS = 5
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_importtime(stderr):
+    """Lines of -X importtime as (self_us, cumulative_us, depth, module)"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return entries
+
+def measure_import_time(module="main"):
+    """One cold import of module in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    total_us = next(cumulative for _, cumulative, depth, name in entries if depth == 0 and name == module)
+    return total_us / 1000, entries
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def measure_first_request(timeout=60):
+    """Seconds from spawning uvicorn to the first successful GET /health"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"Le serveur n'a pas répondu en {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else IMPORT_TIME_BUDGET_MS
+    ok = True
+
+    timings = []
+    for _ in range(RUNS):
+        total_ms, entries = measure_import_time()
+        timings.append(total_ms)
+    median_ms = statistics.median(timings)
+
+    print("📦 Imports les plus lents (cumulé, dernier run):")
+    top_level = sorted((e for e in entries if e[2] == 1), key=lambda e: e[1], reverse=True)
+    for _, cumulative_us, _, name in top_level[:10]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    imported = {name for _, _, _, name in entries}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        print(f"❌ Modules lourds importés au démarrage: {', '.join(eager)}")
+        ok = False
+
+    status = "✅" if median_ms <= budget_ms else "❌"
+    print(f"{status} Import de main.py: {median_ms:.0f} ms (médiane de {RUNS}, budget {budget_ms:.0f} ms)")
+    ok = ok and median_ms <= budget_ms
+
+    print(f"🚀 Lancement -> première requête: {measure_first_request():.2f} s")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import select, update
+from database import AsyncSessionLocal, Conversation, Message
+from core.circuit_breaker import llm_breaker
+from core.executor import run_blocking
+from core.llm_provider import get_llm_provider, HISTORY_TOKEN_BUDGET, HISTORY_WINDOW, SUMMARY_EVERY_TURNS
+from core.tokens import message_tokens
+
+class ConversationSummarizer:
+    """
+    Maintains Conversation.summary: every `every_turns` turns, all messages but
+    the last few are folded into the summary, in a background task after the
+    response was sent. The prompt window then always starts where the summary
+    ends, so prompts carry the summary plus at most `window` recent messages.
+    A refresh also happens as soon as those messages overflow `token_budget`,
+    so long messages are summarized instead of silently dropped.
+    While the circuit breaker refuses calls, refreshes are deferred: the
+    next turn triggers them again.
+    """
+
+    def __init__(self, every_turns: int, window: int, token_budget: int):
+        # A refresh must happen before unsummarized messages overflow the window
+        self.every_turns = min(every_turns, window // 2)
+        self.window = window
+        # Messages left verbatim after a refresh; the next turns fill the window up again
+        self.keep = window - 2 * self.every_turns
+        # ...and at most this many tokens of them
+        self.keep_tokens = token_budget // 2
+        self.token_budget = token_budget
+        self._running = set()
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.deferred = 0
+        self.last_seconds: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.every_turns > 0
+
+    def needs_refresh(self, history: List[Dict]) -> bool:
+        """Whether the turn that used this history (plus its 2 new messages) should trigger a refresh"""
+        if not self.enabled:
+            return False
+        messages = [msg for msg in history if msg["role"] != "summary"]
+        if len(messages) + 2 >= self.window:
+            return True
+        return sum(message_tokens(msg) for msg in history) > self.token_budget
+
+    async def refresh(self, conversation_id: int):
+        """Fold the older unsummarized messages of a conversation into its summary"""
+        with self._lock:
+            if conversation_id in self._running:
+                return
+            self._running.add(conversation_id)
+        started = time.perf_counter()
+        try:
+            await self._refresh(conversation_id)
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️ Warning: Could not summarize conversation {conversation_id}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(conversation_id)
+            self.last_seconds = round(time.perf_counter() - started, 3)
+
+    async def _refresh(self, conversation_id: int):
+        provider = get_llm_provider()
+        if not provider:
+            return
+
+        async with AsyncSessionLocal() as db:
+            conversation = await db.get(Conversation, conversation_id)
+            if not conversation:
+                return
+            previous_summary = conversation.summary
+            previous_until_id = conversation.summary_until_id
+            rows = (await db.execute(
+                select(Message.id, Message.role, Message.content, Message.token_count)
+                .where(Message.conversation_id == conversation_id, Message.id > (previous_until_id or 0))
+                .order_by(Message.created_at, Message.id)
+            )).all()
+            to_fold = rows[:len(rows) - self._kept_count(rows)]
+            if not to_fold:
+                return
+            # No connection held during the provider call
+            await db.rollback()
+
+            # The upstream is failing: no extra call on top of the chat traffic
+            if not llm_breaker.allow():
+                self.deferred += 1
+                return
+            try:
+                summary = await run_blocking(
+                    provider.summarize_conversation,
+                    previous_summary,
+                    [{"role": role, "content": content} for _, role, content, _ in to_fold]
+                )
+            finally:
+                llm_breaker.release()
+            if not summary:
+                return
+
+            # Only if nobody refreshed it meanwhile; updated_at is kept so the
+            # conversation does not jump to the top of the list
+            until_unchanged = (
+                Conversation.summary_until_id.is_(None) if previous_until_id is None
+                else Conversation.summary_until_id == previous_until_id
+            )
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id, until_unchanged)
+                .values(
+                    summary=summary,
+                    summary_until_id=to_fold[-1][0],
+                    summary_updated_at=datetime.utcnow(),
+                    updated_at=Conversation.updated_at,
+                )
+            )
+            await db.commit()
+        self.runs += 1
+
+    def _kept_count(self, rows) -> int:
+        """How many of the newest rows stay verbatim: up to `keep` messages and `keep_tokens` tokens"""
+        kept = 0
+        tokens = 0
+        for _, role, content, token_count in reversed(rows):
+            tokens += message_tokens({"content": content, "tokens": token_count})
+            if kept >= self.keep or tokens > self.keep_tokens:
+                break
+            kept += 1
+        return kept
+
+    def stats(self) -> Dict:
+        with self._lock:
+            running = len(self._running)
+        return {
+            "every_turns": self.every_turns,
+            "window": self.window,
+            "keep": self.keep,
+            "keep_tokens": self.keep_tokens,
+            "running": running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "deferred": self.deferred,
+            "last_seconds": self.last_seconds,
+        }
+
+# Global instance
+conversation_summarizer = ConversationSummarizer(SUMMARY_EVERY_TURNS, HISTORY_WINDOW, HISTORY_TOKEN_BUDGET)
@@ -0,0 +1,36 @@
+"""
+Tests run the whole app on a throwaway SQLite database with the offline stub
+provider: no MySQL, API key or network needed. The environment is set before
+main/database are imported, and the app runs in a temporary working directory
+(uploads/, cache/).
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="chatbot_tests_")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(WORK_DIR, 'chat.db')}",
+    "LLM_PROVIDER": "stub",
+    "STUB_LATENCY_MS": "0",
+    "STUB_TAIL_PROB": "0",
+    "STUB_TOKENS_PER_SECOND": "0",
+    "STUB_ERROR_RATE": "0",
+    "RESPONSE_CACHE_BACKEND": "none",
+    "SEMANTIC_CACHE_ENABLED": "false",
+})
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    os.chdir(WORK_DIR)
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,79 @@
+"""Admission control under a synthetic overload of slow chat turns"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from core.admission import AdmissionController, AdmissionMiddleware
+
+def _app(controller: AdmissionController, turn_seconds: float) -> FastAPI:
+    """Slow chat endpoints behind the middleware, as in main.py, plus cheap ones"""
+    app = FastAPI()
+
+    @app.post("/api/chat")
+    async def chat():
+        await asyncio.sleep(turn_seconds)
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/conversations")
+    async def conversations():
+        return []
+
+    app.add_middleware(AdmissionMiddleware, paths=["/api/chat"], controller=controller)
+    return app
+
+async def _overload(controller, turn_seconds, chats):
+    """(chat results, cheap request results) of `chats` concurrent turns; results are (status, seconds, Retry-After)"""
+    transport = httpx.ASGITransport(app=_app(controller, turn_seconds))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def request(method, path):
+            started = time.perf_counter()
+            response = await client.request(method, path)
+            return response.status_code, time.perf_counter() - started, response.headers.get("retry-after")
+
+        async def probe():
+            results = []
+            for _ in range(10):
+                for path in ("/health", "/api/conversations"):
+                    results.append(await request("GET", path))
+                await asyncio.sleep(0.01)
+            return results
+
+        *chat_results, cheap_results = await asyncio.gather(
+            *[request("POST", "/api/chat") for _ in range(chats)], probe()
+        )
+    return chat_results, cheap_results
+
+def test_overload_is_shed_quickly_with_retry_after():
+    controller = AdmissionController(max_in_flight=2, max_queue=3, queue_timeout=5)
+    chats, cheap = asyncio.run(_overload(controller, turn_seconds=0.2, chats=20))
+
+    ok = [result for result in chats if result[0] == 200]
+    shed = [result for result in chats if result[0] == 503]
+    # 2 in flight + 3 queued get through, the rest is shed at once
+    assert len(ok) == 5 and len(shed) == 15
+    assert all(seconds < 0.1 for _, seconds, _ in shed)
+    assert all(retry_after and int(retry_after) >= 1 for _, _, retry_after in shed)
+
+    stats = controller.stats()
+    assert stats["shed_queue_full"] == 15
+    assert stats["admitted"] == 5 and stats["max_queued"] == 3
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+    # Cheap endpoints are never shed nor stuck behind the chat turns
+    assert {status for status, _, _ in cheap} == {200}
+    assert max(seconds for _, seconds, _ in cheap) < 0.1
+
+def test_queued_requests_are_shed_after_the_deadline():
+    controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=0.1)
+    chats, _ = asyncio.run(_overload(controller, turn_seconds=0.3, chats=4))
+
+    assert sorted(status for status, _, _ in chats) == [200, 503, 503, 503]
+    stats = controller.stats()
+    assert stats["shed_timeout"] == 3
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
@@ -0,0 +1,26 @@
+"""A chat turn is persisted with one commit and a fixed number of statements"""
+import pytest
+
+from database import db_stats
+
+def _turn(client, path, **data):
+    """(response, db_stats delta) of one chat turn"""
+    before = dict(db_stats)
+    response = client.post(path, data={"content": "Explique la photosynthèse", **data})
+    return response, {key: db_stats[key] - before[key] for key in db_stats}
+
+def test_new_conversation_turn(client):
+    response, delta = _turn(client, "/api/chat")
+    assert response.status_code == 200
+    # INSERT conversation, INSERT both messages (batched), then the commit
+    assert delta["commits"] == 1
+    assert delta["statements"] == 3
+
+@pytest.mark.parametrize("path", ["/api/chat", "/api/chat/stream"])
+def test_existing_conversation_turn(client, path):
+    conversation_id = client.post("/api/chat", data={"content": "Bonjour, une question"}).json()["conversation"]["id"]
+    response, delta = _turn(client, path, conversation_id=conversation_id)
+    assert response.status_code == 200
+    # Read phase: conversation + history; write phase: messages + conversation update
+    assert delta["commits"] == 1
+    assert delta["statements"] == 5
@@ -0,0 +1,66 @@
+"""Half-open circuit: one probe at a time, given back when no upstream call was made"""
+import time
+
+import pytest
+
+import core.response_generator as response_generator_module
+from core.circuit_breaker import CircuitBreaker
+from core.response_generator import response_generator
+from core.upstream_scheduler import UpstreamBusy
+
+def _half_open_breaker():
+    breaker = CircuitBreaker(window=5, min_calls=2, max_error_rate=0.5, max_p95_latency=10, open_seconds=0.05)
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    return breaker
+
+def test_single_probe_closes_the_circuit_on_success():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True, 0.1)
+    breaker.release()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+def test_released_probe_without_call_lets_the_next_request_probe():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    breaker.release()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+class _BusyProvider:
+    name = "busy"
+    model_name = "busy"
+
+    def generate_text_response(self, *args):
+        raise UpstreamBusy("queue full", 1)
+
+    def stream_text_response(self, *args):
+        raise UpstreamBusy("queue full", 1)
+        yield
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_probe_refused_locally_is_given_back(monkeypatch, stream):
+    breaker = _half_open_breaker()
+    monkeypatch.setattr(response_generator_module, "llm_breaker", breaker)
+    monkeypatch.setattr(response_generator_module, "get_llm_provider", lambda: _BusyProvider())
+
+    with pytest.raises(UpstreamBusy):
+        if stream:
+            list(response_generator.stream_response("hello there", info={}))
+        else:
+            response_generator.generate_response("hello there")
+    # The probe never reached the upstream: the next request may probe
+    assert breaker.allow()
@@ -0,0 +1,7 @@
+"""A message with nothing to answer gets the whole localized prompt, not one character of it"""
+from core.response_generator import response_generator
+
+def test_empty_message_response_is_the_full_sentence():
+    expected = response_generator.empty_message_responses["en"]
+    assert response_generator.generate_response("?!")["content"] == expected
+    assert list(response_generator.stream_response("?!")) == [expected]
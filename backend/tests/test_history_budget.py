@@ -0,0 +1,62 @@
+"""Token-budgeted history selection (core.tokens) and its use by the prompt builder"""
+import random
+
+import pytest
+
+from core.llm_provider import HISTORY_TOKEN_BUDGET, IMAGE_PROMPT_TOKENS, trim_history
+from core.tokens import estimate_tokens, message_tokens, select_history
+
+def _history(rng, length, stored=True, summary=True):
+    history = [{"role": "summary", "content": "résumé " * 50}] if summary else []
+    for index in range(length):
+        content = " ".join(f"mot{rng.randint(0, 999)}" for _ in range(rng.randint(1, 300)))
+        history.append({
+            "role": "user" if index % 2 == 0 else "assistant",
+            "content": content,
+            "tokens": estimate_tokens(content) if stored else None,
+        })
+    return history
+
+@pytest.mark.parametrize("seed", range(5))
+def test_selection_is_the_longest_suffix_within_budget(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        history = _history(rng, rng.randint(0, 40), summary=rng.random() < 0.5)
+        budget = rng.randint(0, 3000)
+        selected = select_history(history, budget)
+
+        summary = history[:1] if history and history[0]["role"] == "summary" else []
+        assert selected[:len(summary)] == summary
+        messages = selected[len(summary):]
+        # Newest messages, in chronological order
+        assert messages == history[len(history) - len(messages):]
+        used = sum(map(message_tokens, selected))
+        if messages:
+            assert used <= budget
+        dropped = len(history) - len(summary) - len(messages)
+        if dropped:
+            # The next older message would not have fit
+            assert used + message_tokens(history[-len(messages) - 1]) > budget
+
+def test_stored_counts_are_used_without_re_counting():
+    message = {"role": "user", "content": "un texte assez long " * 100, "tokens": 7}
+    assert message_tokens(message) == 7 + 4
+    assert message_tokens({**message, "tokens": None}) == estimate_tokens(message["content"]) + 4
+
+def test_one_huge_message_does_not_push_out_the_budget():
+    history = [
+        {"role": "user", "content": "question courte", "tokens": 3},
+        {"role": "assistant", "content": "log " * 20000, "tokens": 20000},
+        {"role": "user", "content": "et maintenant ?", "tokens": 4},
+    ]
+    # Selection stops at the oversized message, older messages included
+    assert select_history(history, 100) == history[-1:]
+
+def test_vision_path_leaves_room_for_the_image():
+    per_message = HISTORY_TOKEN_BUDGET // 10
+    history = [{"role": "user", "content": "x", "tokens": per_message - 4} for _ in range(20)]
+    text = trim_history(history)
+    vision = trim_history(history, with_image=True)
+    assert sum(map(message_tokens, text)) <= HISTORY_TOKEN_BUDGET
+    assert sum(map(message_tokens, vision)) <= HISTORY_TOKEN_BUDGET - IMAGE_PROMPT_TOKENS
+    assert len(vision) < len(text)
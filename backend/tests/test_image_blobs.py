@@ -0,0 +1,71 @@
+"""Content-addressed image blobs: shared files, reference counts and deletion races"""
+import io
+import os
+
+from PIL import Image
+
+from core.image_store import ImageStore, image_store
+from database import ImageBlob, blob_reference_statement, engine
+
+def _png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def _send_image(client, data: bytes):
+    """(conversation id, blob path) of a new conversation started with this image"""
+    response = client.post(
+        "/api/chat",
+        data={"content": "Que vois-tu ?"},
+        files={"image": ("photo.png", data, "image/png")},
+    )
+    assert response.status_code == 200, response.text
+    conversation_id = response.json()["conversation"]["id"]
+    messages = client.get(f"/api/conversations/{conversation_id}/messages").json()
+    return conversation_id, messages[0]["image_path"]
+
+def test_shared_blob_is_removed_with_its_last_reference(client):
+    data = _png((200, 30, 30))
+    first, path = _send_image(client, data)
+    second, same_path = _send_image(client, data)
+    assert same_path == path and os.path.exists(path)
+
+    client.delete(f"/api/conversations/{first}")
+    assert os.path.exists(path)
+    client.delete(f"/api/conversations/{second}")
+    assert not os.path.exists(path)
+
+def test_delete_keeps_a_blob_referenced_again_meanwhile(client, monkeypatch):
+    data = _png((30, 200, 30))
+    conversation_id, path = _send_image(client, data)
+    sha256 = os.path.basename(path).split(".")[0]
+    retire = image_store.retire
+
+    def retire_during_a_turn(blob_path):
+        retired = retire(blob_path)
+        # A concurrent turn commits a new reference to the same image here
+        with engine.begin() as connection:
+            connection.execute(blob_reference_statement(engine.dialect.name, sha256, path, len(data)))
+        return retired
+
+    monkeypatch.setattr(image_store, "retire", retire_during_a_turn)
+    assert client.delete(f"/api/conversations/{conversation_id}").status_code == 200
+    assert os.path.exists(path)
+    assert not os.path.exists(f"{path}.deleting")
+    with engine.connect() as connection:
+        assert connection.execute(ImageBlob.__table__.select().where(ImageBlob.sha256 == sha256)).first()
+
+def test_put_after_retire_stores_the_file_again(tmp_path):
+    store = ImageStore(str(tmp_path / "blobs"))
+    sha256 = "ab" * 32
+    for name in ("first.part", "second.part"):
+        (tmp_path / name).write_bytes(b"\x89PNG\r\n\x1a\n" + b"0" * 32)
+
+    path, created = store.put(str(tmp_path / "first.part"), sha256)
+    assert created
+    retired = store.retire(path)
+    # A turn committed its reference after the delete: its upload is moved in
+    assert store.put(str(tmp_path / "second.part"), sha256) == (path, True)
+    store.remove(retired)
+    assert os.path.exists(path)
+    assert store.retire(str(tmp_path / "blobs" / "missing.png")) is None
@@ -0,0 +1,81 @@
+"""Tier routing: the user's message decides, history is only counted separately"""
+import threading
+
+import pytest
+
+from core import llm_provider as llm_provider_module
+from core.model_router import ModelRouter, is_complex_message
+from core.stub_provider import StubProvider
+
+def _router(**overrides):
+    settings = dict(fast_max_tokens=600, fast_max_history_tokens=2000, image_tier="strong",
+                    hedge_budget=0, min_samples=10, alpha=0.2, hedge_workers=2)
+    settings.update(overrides)
+    return ModelRouter(**settings)
+
+def test_route():
+    router = _router()
+    assert router.route(20, False)[0] == "fast"
+    assert router.route(20, False, history_tokens=2000)[0] == "fast"
+    assert router.route(20, False, history_tokens=2001)[0] == "strong"
+    assert router.route(601, False)[0] == "strong"
+    assert router.route(20, False, complex_message=True)[0] == "strong"
+    assert router.route(20, True) == ("strong", "fast")
+    assert router.stats()["routed"] == {"fast": 2, "strong": 4}
+
+@pytest.mark.parametrize("text, expected", [
+    ("Quelle est la capitale de la France ?", False),
+    ("Explique la photosynthèse", False),
+    ("Compare Python et Java étape par étape", True),
+    ("Why does this fail?\n```\nprint(1/0)\n```", True),
+    ("Qui ? Quand ? Où ? Pourquoi ?", True),
+    ("اشرح الفكرة بالتفصيل", True),
+])
+def test_complex_message(text, expected):
+    assert is_complex_message(text) == expected
+
+def test_short_question_with_full_history_goes_fast(monkeypatch):
+    routes = []
+    router = _router()
+    original = router.route
+    monkeypatch.setattr(llm_provider_module, "model_router", router)
+    monkeypatch.setattr(router, "route", lambda *args: routes.append(original(*args)) or routes[-1])
+
+    provider = StubProvider(latency_ms=0, tail_prob=0, tokens_per_second=0, error_rate=0)
+    history = [
+        {"role": "user" if index % 2 == 0 else "assistant", "content": "mot " * 150}
+        for index in range(20)
+    ]
+    provider.generate_text_response("Et ensuite ?", history, "fr")
+    provider.generate_text_response("Et ensuite ? " + "détail " * 700, history, "fr")
+    assert [tier for tier, _ in routes] == ["fast", "strong"]
+
+def _warm(router, name, latency=0.01):
+    for _ in range(router.min_samples):
+        router._record(name, latency)
+
+def test_unraced_requests_run_inline():
+    router = _router(hedge_budget=0.25, min_samples=3)
+    names = {"fast": "m-fast", "strong": "m-strong"}
+    _warm(router, "m-fast")
+    threads = [router.call("fast", "strong", names, lambda tier: threading.current_thread().name) for _ in range(40)]
+    # Only the budgeted share leaves the caller's thread
+    assert sum(name.startswith("hedge") for name in threads) == router.stats()["raced"] == 10
+    router.shutdown()
+
+def test_slow_raced_request_is_hedged():
+    router = _router(hedge_budget=1, min_samples=3)
+    names = {"fast": "m-fast", "strong": "m-strong"}
+    _warm(router, "m-fast")
+    release = threading.Event()
+
+    def attempt(tier):
+        if tier == "fast":
+            release.wait(5)
+        return tier
+
+    assert router.call("fast", "strong", names, attempt) == "strong"
+    release.set()
+    stats = router.stats()
+    assert (stats["raced"], stats["hedged"], stats["hedge_wins"]) == (1, 1, 1)
+    router.shutdown()
@@ -0,0 +1,60 @@
+"""While the circuit is open, image turns are answered with the text OCR reads in the image"""
+import io
+import json
+
+import pytest
+from PIL import Image
+
+import core.response_generator as response_generator_module
+from core.circuit_breaker import CircuitBreaker
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 32), "white").save(buffer, "PNG")
+    return buffer.getvalue()
+
+@pytest.fixture
+def open_circuit(monkeypatch):
+    breaker = CircuitBreaker(window=5, min_calls=1, max_error_rate=0.5, max_p95_latency=10, open_seconds=60)
+    breaker.record(False, 0.1)
+    monkeypatch.setattr(response_generator_module, "llm_breaker", breaker)
+
+@pytest.fixture
+def ocr(client, monkeypatch):
+    """Stands in for tesseract: {"text": what it reads, "calls": the hashes it was asked for}"""
+    from core.ocr_service import ocr_service
+
+    state = {"text": "TOTAL 42,00 EUR", "calls": []}
+
+    async def extract_text_async(image_path, sha256=None):
+        state["calls"].append(sha256)
+        return state["text"]
+
+    monkeypatch.setattr(ocr_service, "available", lambda: True)
+    monkeypatch.setattr(ocr_service, "extract_text_async", extract_text_async)
+    return state
+
+def _post(client, path):
+    return client.post(path, data={"content": "Que dit ce ticket ?"}, files={"image": ("ticket.png", _png(), "image/png")})
+
+def test_image_turn_answered_with_ocr_text(client, open_circuit, ocr):
+    response = _post(client, "/api/chat")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["engine"] == "ocr"
+    assert "TOTAL 42,00 EUR" in body["message"]["content"]
+    # Keyed by the upload's content hash
+    assert len(ocr["calls"]) == 1 and len(ocr["calls"][0]) == 64
+
+def test_stream_image_turn_answered_with_ocr_text(client, open_circuit, ocr):
+    response = _post(client, "/api/chat/stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    done = [json.loads(lines[1][len("data: "):]) for lines in events if lines[0] == "event: done"]
+    assert done and done[0]["engine"] == "ocr"
+    assert "TOTAL 42,00 EUR" in done[0]["message"]["content"]
+
+def test_image_without_text_is_still_refused(client, open_circuit, ocr):
+    ocr["text"] = ""
+    response = _post(client, "/api/chat")
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
@@ -0,0 +1,59 @@
+"""Semantic cache lookups: paraphrases hit, questions that mean something else miss"""
+import pytest
+
+from core.response_generator import response_generator
+from core.semantic_cache import SemanticCache, semantic_cache
+from core.processor import processor
+
+def _cache():
+    # The defaults of the global instance, enabled
+    return SemanticCache(
+        enabled=True,
+        threshold=semantic_cache.threshold,
+        max_entries=1000,
+        dim=semantic_cache.dim,
+        min_token_overlap=semantic_cache.min_token_overlap,
+    )
+
+def _store(cache, question, answer):
+    cache.set("model", "en", processor.normalize(question), question, answer)
+
+def _lookup(cache, question):
+    return cache.get("model", "en", processor.normalize(question), question)
+
+def test_paraphrase_hits():
+    cache = _cache()
+    _store(cache, "Comment ça marche ?", "answer")
+    assert _lookup(cache, "ça marche comment") == "answer"
+    assert cache.stats()["hits"] == 1
+
+@pytest.mark.parametrize("stored, asked", [
+    ("is it safe to take ibuprofen with alcohol", "is it safe to take ibuprofen without alcohol"),
+    ("convert 10 km to miles", "convert 100 km to miles"),
+    ("question 0", "question 4"),
+    ("what is 22", "what is 2-2"),
+    ("what is 2.5 times 3", "what is 25 times 3"),
+])
+def test_different_meaning_misses(stored, asked):
+    cache = _cache()
+    _store(cache, stored, "answer")
+    assert _lookup(cache, stored) == "answer"
+    assert _lookup(cache, asked) is None
+
+def test_same_question_other_numbers_among_many_entries():
+    cache = _cache()
+    for index in range(50):
+        _store(cache, f"question {index}", f"answer {index}")
+    for index in range(50):
+        assert _lookup(cache, f"question {index}") == f"answer {index}"
+
+def test_exact_cache_key_keeps_number_punctuation():
+    class Provider:
+        model_name = "model"
+
+    keys = {
+        question: response_generator._cache_key(Provider(), "en", processor.normalize(question), question, [])
+        for question in ("what is 22", "what is 2-2", "What is 22?")
+    }
+    assert keys["what is 22"] != keys["what is 2-2"]
+    assert keys["what is 22"] == keys["What is 22?"]
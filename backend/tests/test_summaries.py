@@ -0,0 +1,34 @@
+"""Conversation summaries are deferred while the circuit breaker refuses upstream calls"""
+import summaries
+from core.circuit_breaker import CircuitBreaker
+from summaries import conversation_summarizer
+
+def _open_breaker():
+    breaker = CircuitBreaker(window=5, min_calls=1, max_error_rate=0.5, max_p95_latency=10, open_seconds=60)
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    return breaker
+
+def _turns_until_refresh(client, conversation_id):
+    """Chat turns until the summarizer has been triggered once more"""
+    before = conversation_summarizer.runs + conversation_summarizer.deferred
+    for turn in range(conversation_summarizer.window):
+        response = client.post("/api/chat", data={"content": f"Question {turn} sur la photosynthèse", "conversation_id": conversation_id})
+        assert response.status_code == 200
+        if conversation_summarizer.runs + conversation_summarizer.deferred > before:
+            return
+    raise AssertionError("no summary refresh was triggered")
+
+def test_refresh_is_deferred_while_the_circuit_is_open(client, monkeypatch):
+    conversation_id = client.post("/api/chat", data={"content": "Bonjour"}).json()["conversation"]["id"]
+    runs, deferred = conversation_summarizer.runs, conversation_summarizer.deferred
+
+    monkeypatch.setattr(summaries, "llm_breaker", _open_breaker())
+    _turns_until_refresh(client, conversation_id)
+    assert conversation_summarizer.runs == runs
+    assert conversation_summarizer.deferred == deferred + 1
+
+    # Circuit closed again: the next turn summarizes
+    monkeypatch.undo()
+    _turns_until_refresh(client, conversation_id)
+    assert conversation_summarizer.runs == runs + 1
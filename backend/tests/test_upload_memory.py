@@ -0,0 +1,55 @@
+"""Peak memory of an upload: streamed to disk in chunks, never held whole"""
+import asyncio
+import os
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from core.uploads import CHUNK_SIZE, MAX_IMAGE_BYTES, save_upload
+
+def _write_image_file(path: str, size: int):
+    """A file of `size` bytes with a PNG signature, written chunk by chunk"""
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        written = 8
+        while written < size:
+            chunk = os.urandom(min(CHUNK_SIZE, size - written))
+            f.write(chunk)
+            written += len(chunk)
+
+def _peak_bytes(path: str, tmp_dir: str):
+    """(stored upload, peak bytes allocated) of save_upload on the file at path"""
+    with open(path, "rb") as f:
+        upload = UploadFile(file=f, filename=os.path.basename(path))
+        tracemalloc.start()
+        try:
+            stored = asyncio.run(save_upload(upload, tmp_dir))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return stored, peak
+
+def test_peak_memory_does_not_grow_with_upload_size(tmp_path):
+    peaks = {}
+    for size in (2 * CHUNK_SIZE, MAX_IMAGE_BYTES - CHUNK_SIZE):
+        source = str(tmp_path / f"image_{size}.png")
+        _write_image_file(source, size)
+        stored, peak = _peak_bytes(source, str(tmp_path / "tmp"))
+        assert stored.size == size and os.path.getsize(stored.path) == size
+        stored.discard()
+        peaks[size] = peak
+
+    # A few chunks in flight at most, whatever the size (19 MB here)
+    assert max(peaks.values()) < 4 * CHUNK_SIZE
+    small, large = peaks.values()
+    assert large < small + CHUNK_SIZE
+
+def test_oversized_upload_stops_at_the_limit(tmp_path):
+    source = str(tmp_path / "huge.png")
+    _write_image_file(source, MAX_IMAGE_BYTES + 5 * CHUNK_SIZE)
+    with pytest.raises(HTTPException) as error:
+        _peak_bytes(source, str(tmp_path / "tmp"))
+    assert error.value.status_code == 400
+    # The partial temporary file is removed
+    assert os.listdir(tmp_path / "tmp") == []
@@ -0,0 +1,36 @@
+"""Uploads that are not images are refused while streaming, without leaking server paths"""
+import os
+
+def _tmp_files():
+    tmp_dir = os.path.join("uploads", "tmp")
+    return os.listdir(tmp_dir) if os.path.isdir(tmp_dir) else []
+
+def test_non_image_upload_is_rejected(client):
+    response = client.post(
+        "/api/chat",
+        data={"content": "Lis ce fichier"},
+        files={"image": ("notes.png", b"just some text, not an image" * 100, "image/png")},
+    )
+    assert response.status_code == 400
+    assert "Unsupported image format" in response.json()["detail"]
+    assert _tmp_files() == []
+
+def test_stream_rejects_non_image_upload(client):
+    response = client.post(
+        "/api/chat/stream",
+        data={"content": "Lis ce fichier"},
+        files={"image": ("notes.txt", b"%PDF-1.7", "application/pdf")},
+    )
+    assert response.status_code == 400
+    assert _tmp_files() == []
+
+def test_undecodable_image_reply_has_no_server_path(client):
+    # Right signature, broken content: the error becomes the reply
+    response = client.post(
+        "/api/chat",
+        data={"content": "Que vois-tu ?"},
+        files={"image": ("broken.png", b"\x89PNG\r\n\x1a\n" + b"\x00" * 64, "image/png")},
+    )
+    assert response.status_code == 200
+    reply = response.json()["message"]["content"]
+    assert os.getcwd() not in reply and "uploads" not in reply and ".part" not in reply
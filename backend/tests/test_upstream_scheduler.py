@@ -0,0 +1,136 @@
+"""UpstreamScheduler against a local fake upstream (no network, no API key)"""
+import threading
+import time
+
+import pytest
+
+from core.upstream_scheduler import UpstreamBusy, UpstreamScheduler, upstream_conversation
+
+class ResourceExhausted(Exception):
+    """A 429, shaped like the Gemini SDK's"""
+    code = 429
+
+class InvalidArgument(Exception):
+    code = 400
+
+class FakeUpstream:
+    """Serves `capacity` concurrent calls and answers 429 above that"""
+
+    def __init__(self, capacity: int, latency: float):
+        self.capacity = capacity
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            if self.active >= self.capacity:
+                self.throttled += 1
+                raise ResourceExhausted("429 Resource has been exhausted")
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self._lock:
+            self.active -= 1
+        return "ok"
+
+def _scheduler(**overrides) -> UpstreamScheduler:
+    settings = dict(
+        requests_per_minute=0, tokens_per_minute=0, initial_limit=2, max_limit=32,
+        latency_target=5, max_queue=200, max_wait=30, max_retries=8,
+        backoff_base=0.01, backoff_max=0.1,
+    )
+    settings.update(overrides)
+    return UpstreamScheduler(**settings)
+
+def _run(scheduler, upstream, conversations):
+    """One thread per call, started in order; returns (completion order, UpstreamBusy errors)"""
+    done, busy = [], []
+    lock = threading.Lock()
+
+    def worker(conversation):
+        upstream_conversation.set(conversation)
+        try:
+            scheduler.call(upstream, 100)
+        except UpstreamBusy as e:
+            with lock:
+                busy.append(e)
+            return
+        with lock:
+            done.append(conversation)
+
+    threads = [threading.Thread(target=worker, args=(conversation,)) for conversation in conversations]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    return done, busy
+
+def test_limit_backs_off_on_429_and_every_call_succeeds():
+    upstream = FakeUpstream(capacity=4, latency=0.02)
+    scheduler = _scheduler(initial_limit=16)
+    done, busy = _run(scheduler, upstream, [i % 10 for i in range(60)])
+
+    assert len(done) == 60 and not busy
+    assert upstream.throttled > 0
+    stats = scheduler.stats()
+    assert stats["throttled"] == upstream.throttled
+    assert stats["retries"] == upstream.throttled
+    assert stats["failures"] == 0
+    # Multiplicative decrease brought the limit down from 16
+    assert scheduler.limit < 16
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+
+def test_queue_is_fair_across_conversations():
+    upstream = FakeUpstream(capacity=100, latency=0.02)
+    scheduler = _scheduler(initial_limit=1, max_limit=1)
+    # Conversation 1 queues 20 calls before conversation 2 sends 3
+    done, _ = _run(scheduler, upstream, [1] * 20 + [2] * 3)
+
+    positions = [index for index, conversation in enumerate(done) if conversation == 2]
+    # Round-robin: served alternately with conversation 1, not after its 20 calls
+    assert max(positions) < 10
+
+def test_full_queue_and_deadline_are_rejected():
+    upstream = FakeUpstream(capacity=100, latency=0.3)
+    scheduler = _scheduler(initial_limit=1, max_limit=1, max_queue=3, max_wait=0.2)
+    done, busy = _run(scheduler, upstream, list(range(10)))
+
+    stats = scheduler.stats()
+    assert done and busy
+    assert stats["rejected_queue_full"] > 0
+    assert stats["rejected_timeout"] > 0
+    assert stats["rejected_queue_full"] + stats["rejected_timeout"] == len(busy)
+    assert all(error.retry_after >= 1 for error in busy)
+
+def test_requests_per_minute_bucket_paces_calls():
+    scheduler = _scheduler(requests_per_minute=600, initial_limit=32)
+    scheduler.requests.level = 0  # Burst already spent: 10 calls per second
+    started = time.monotonic()
+    _run(scheduler, FakeUpstream(capacity=100, latency=0), list(range(5)))
+    assert time.monotonic() - started >= 0.4
+
+def test_persistent_429_becomes_upstream_busy():
+    scheduler = _scheduler(max_retries=2)
+    upstream = FakeUpstream(capacity=0, latency=0)
+    with pytest.raises(UpstreamBusy):
+        scheduler.call(upstream, 100)
+    assert upstream.calls == 3
+
+def test_client_errors_are_not_retried():
+    scheduler = _scheduler()
+    calls = []
+
+    def invalid():
+        calls.append(1)
+        raise InvalidArgument("400 Request contains an invalid argument")
+
+    with pytest.raises(InvalidArgument):
+        scheduler.call(invalid, 100)
+    assert len(calls) == 1
+    assert scheduler.stats()["retries"] == 0
@@ -0,0 +1,52 @@
+"""
+Script pour mesurer le coût de la sélection de l'historique par budget de jetons:
+- select_history() sur des historiques de 10 à 100 000 messages
+- avec les nombres de jetons stockés (Message.token_count) ou recomptés
+Le constructeur de prompts n'en passe que HISTORY_WINDOW (+ le résumé): les
+grandes longueurs montrent que le coût ne dépend que des messages gardés.
+
+Usage: python token_budget_benchmark.py [budget]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.llm_provider import HISTORY_TOKEN_BUDGET, HISTORY_WINDOW
+from core.tokens import estimate_tokens, select_history
+
+LENGTHS = [10, 100, 1000, 10000, 100000]
+
+def build_history(length, stored, seed=1):
+    """A summary then `length` messages of 5 to 300 words"""
+    rng = random.Random(seed)
+    history = [{"role": "summary", "content": "résumé " * 50}]
+    for index in range(length):
+        content = " ".join(f"mot{rng.randint(0, 999)}" for _ in range(rng.randint(5, 300)))
+        history.append({
+            "role": "user" if index % 2 == 0 else "assistant",
+            "content": content,
+            "tokens": estimate_tokens(content) if stored else None,
+        })
+    return history
+
+def per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+def main():
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else HISTORY_TOKEN_BUDGET
+    print(f"📊 Sélection de l'historique, budget {budget} jetons, fenêtre {HISTORY_WINDOW} messages")
+    print(f"  {'messages':>9}  {'stockés':>10}  {'recomptés':>10}  {'gardés':>6}")
+    for length in LENGTHS:
+        stored = build_history(length, stored=True)
+        counted = build_history(length, stored=False)
+        number = 2000 if length <= 10000 else 200
+        stored_us = per_call_us(lambda: select_history(stored, budget), number)
+        counted_us = per_call_us(lambda: select_history(counted, budget), number)
+        kept = len(select_history(stored, budget)) - 1
+        print(f"  {length:>9}  {stored_us:>7.1f} µs  {counted_us:>7.1f} µs  {kept:>6}")
+
+if __name__ == "__main__":
+    main()
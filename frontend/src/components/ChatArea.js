@@ -5,16 +5,18 @@ import { Loader } from 'lucide-react';
 import './ChatArea.css';
 
 const ChatArea = () => {
-  const { messages, loading, currentConversationId } = useChat();
+  const { messages, loading, currentConversationId, hasOlderMessages, loadOlderMessages } = useChat();
   const messagesEndRef = useRef(null);
+  const lastMessage = messages[messages.length - 1];
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
+  // Follow the newest message only: loading older ones must not jump to the bottom
   useEffect(() => {
     scrollToBottom();
-  }, [messages, loading]);
+  }, [lastMessage?.id, lastMessage?.content, loading]);
 
   return (
     <div className="chat-area">
@@ -40,9 +42,17 @@ const ChatArea = () => {
       )}
 
       <div className="messages-container">
-        {messages.map((message) => (
-          <MessageBubble key={message.id} message={message} />
-        ))}
+        {hasOlderMessages && (
+          <button className="load-older-btn" onClick={loadOlderMessages}>
+            Charger les messages précédents
+          </button>
+        )}
+        {messages
+          // Skip the bot bubble while its stream has not produced any text yet
+          .filter((message) => message.role === 'user' || message.content)
+          .map((message) => (
+            <MessageBubble key={message.id} message={message} />
+          ))}
         {loading && (
           <div className="loading-indicator">
             <Loader className="spinner" size={20} />
@@ -22,7 +22,8 @@ const InputArea = () => {
   const handleSend = async () => {
     if ((!input.trim() && !selectedImage) || loading) return;
 
-    await sendMessage(input.trim(), selectedImage);
+    // Keep the text and image to resend when nothing was stored
+    if (!(await sendMessage(input.trim(), selectedImage))) return;
     setInput('');
     setSelectedImage(null);
     setImagePreview(null);
@@ -8,6 +8,13 @@ const MessageBubble = ({ message }) => {
   const [copied, setCopied] = useState(false);
   const isUser = message.role === 'user';
 
+  // Thumbnails (cached by the browser forever) instead of the full-size original
+  const thumbnails = message.thumbnail_urls;
+  const thumbnailSrc = thumbnails && `http://localhost:8000${thumbnails['320']}`;
+  const thumbnailSrcSet = thumbnails && Object.entries(thumbnails)
+    .map(([width, url]) => `http://localhost:8000${url} ${width}w`)
+    .join(', ');
+
   const copyToClipboard = () => {
     navigator.clipboard.writeText(message.content);
     setCopied(true);
@@ -56,10 +63,13 @@ const MessageBubble = ({ message }) => {
   return (
     <div className={`message-bubble ${isUser ? 'user' : 'assistant'}`}>
       <div className="message-content">
-        {message.image_path && (
+        {(message.image_path || message.local_image_url) && (
           <div className="message-image">
             <img
-              src={`http://localhost:8000/${message.image_path}`}
+              src={message.local_image_url || thumbnailSrc || `http://localhost:8000/${message.image_path}`}
+              srcSet={message.local_image_url ? undefined : thumbnailSrcSet}
+              sizes={thumbnailSrcSet ? '(max-width: 600px) 90vw, 320px' : undefined}
+              loading="lazy"
               alt="Uploaded"
               onError={(e) => {
                 e.target.style.display = 'none';
@@ -11,6 +11,8 @@ const Sidebar = ({ darkMode, setDarkMode }) => {
     selectConversation,
     deleteConversation,
     updateConversationTitle,
+    hasOlderConversations,
+    loadOlderConversations,
   } = useChat();
 
   const [editingId, setEditingId] = useState(null);
@@ -139,6 +141,11 @@ const Sidebar = ({ darkMode, setDarkMode }) => {
             </div>
           ))
         )}
+        {hasOlderConversations && (
+          <button className="load-more-btn" onClick={loadOlderConversations}>
+            Charger plus
+          </button>
+        )}
       </div>
     </div>
   );
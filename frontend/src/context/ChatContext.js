@@ -1,4 +1,4 @@
-import React, { createContext, useState, useContext, useEffect } from 'react';
+import React, { createContext, useState, useContext, useEffect, useRef } from 'react';
 import axios from 'axios';
 
 const ChatContext = createContext();
@@ -19,6 +19,12 @@ export const ChatProvider = ({ children }) => {
   const [messages, setMessages] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  // X-Next-Cursor of the last page loaded (null: nothing older)
+  const [olderConversationsCursor, setOlderConversationsCursor] = useState(null);
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState(null);
+  const currentConversationRef = useRef(null);
+  // Object URLs of the images previewed in pending user messages
+  const localImageUrlsRef = useRef(new Set());
 
   // Load conversations on mount
   useEffect(() => {
@@ -27,6 +33,8 @@ export const ChatProvider = ({ children }) => {
 
   // Load messages when conversation changes
   useEffect(() => {
+    currentConversationRef.current = currentConversationId;
+    setOlderMessagesCursor(null);
     if (currentConversationId) {
       loadMessages(currentConversationId);
     } else {
@@ -34,10 +42,45 @@ export const ChatProvider = ({ children }) => {
     }
   }, [currentConversationId]);
 
+  // Revoke an image preview once no message shows it anymore (replaced by the
+  // stored message, removed on error, or another conversation loaded)
+  useEffect(() => {
+    const shown = new Set(messages.map((msg) => msg.local_image_url).filter(Boolean));
+    localImageUrlsRef.current.forEach((url) => {
+      if (!shown.has(url)) {
+        URL.revokeObjectURL(url);
+        localImageUrlsRef.current.delete(url);
+      }
+    });
+  }, [messages]);
+
+  useEffect(() => {
+    const localImageUrls = localImageUrlsRef.current;
+    return () => localImageUrls.forEach((url) => URL.revokeObjectURL(url));
+  }, []);
+
   const loadConversations = async () => {
     try {
       const response = await axios.get(`${API_BASE_URL}/api/conversations`);
       setConversations(response.data);
+      setOlderConversationsCursor(response.headers['x-next-cursor'] || null);
+    } catch (err) {
+      console.error('Error loading conversations:', err);
+      setError('Erreur lors du chargement des conversations');
+    }
+  };
+
+  const loadOlderConversations = async () => {
+    if (!olderConversationsCursor) return;
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/conversations`, {
+        params: { before: olderConversationsCursor },
+      });
+      setConversations((prev) => {
+        const known = new Set(prev.map((conversation) => conversation.id));
+        return [...prev, ...response.data.filter((conversation) => !known.has(conversation.id))];
+      });
+      setOlderConversationsCursor(response.headers['x-next-cursor'] || null);
     } catch (err) {
       console.error('Error loading conversations:', err);
       setError('Erreur lors du chargement des conversations');
@@ -49,17 +92,87 @@ export const ChatProvider = ({ children }) => {
       const response = await axios.get(
         `${API_BASE_URL}/api/conversations/${conversationId}/messages`
       );
+      // The conversation may have changed while the request was in flight
+      if (currentConversationRef.current !== conversationId) return;
       setMessages(response.data);
+      setOlderMessagesCursor(response.headers['x-next-cursor'] || null);
     } catch (err) {
       console.error('Error loading messages:', err);
       setError('Erreur lors du chargement des messages');
     }
   };
 
+  // Prepend the page of messages before the oldest one shown
+  const loadOlderMessages = async () => {
+    const conversationId = currentConversationId;
+    if (!conversationId || !olderMessagesCursor) return;
+    try {
+      const response = await axios.get(
+        `${API_BASE_URL}/api/conversations/${conversationId}/messages`,
+        { params: { before: olderMessagesCursor } }
+      );
+      if (currentConversationRef.current !== conversationId) return;
+      setMessages((prev) => {
+        const known = new Set(prev.map((msg) => msg.id));
+        return [...response.data.filter((msg) => !known.has(msg.id)), ...prev];
+      });
+      setOlderMessagesCursor(response.headers['x-next-cursor'] || null);
+    } catch (err) {
+      console.error('Error loading messages:', err);
+      setError('Erreur lors du chargement des messages');
+    }
+  };
+
+  // Parse a Server-Sent Events stream, calling onEvent(event, data) for each event
+  const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach((line) => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        onEvent(event, data ? JSON.parse(data) : null);
+      }
+    }
+  };
+
   const sendMessage = async (content, imageFile = null) => {
     setLoading(true);
     setError(null);
 
+    // Show the user message and an empty bot bubble right away
+    const pendingUserId = `pending-user-${Date.now()}`;
+    const pendingBotId = `pending-bot-${Date.now()}`;
+    const localImageUrl = imageFile ? URL.createObjectURL(imageFile) : null;
+    if (localImageUrl) {
+      localImageUrlsRef.current.add(localImageUrl);
+    }
+    setMessages((prev) => [
+      ...prev,
+      {
+        id: pendingUserId,
+        role: 'user',
+        content,
+        image_path: null,
+        local_image_url: localImageUrl,
+      },
+      { id: pendingBotId, role: 'assistant', content: '' },
+    ]);
+
     try {
       const formData = new FormData();
       formData.append('content', content);
@@ -70,34 +183,57 @@ export const ChatProvider = ({ children }) => {
         formData.append('image', imageFile);
       }
 
-      const response = await axios.post(
-        `${API_BASE_URL}/api/chat`,
-        formData,
-        {
-          headers: {
-            'Content-Type': 'multipart/form-data',
-          },
+      const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.detail || 'Erreur lors de l\'envoi du message');
+      }
+
+      let result = null;
+      await readEventStream(response, (event, data) => {
+        if (event === 'chunk') {
+          // First chunk arrived: hide the typing indicator
+          setLoading(false);
+          setMessages((prev) =>
+            prev.map((msg) =>
+              msg.id === pendingBotId ? { ...msg, content: msg.content + data.text } : msg
+            )
+          );
+        } else if (event === 'done') {
+          result = data;
+        } else if (event === 'error') {
+          throw new Error(data.detail);
         }
+      });
+
+      if (!result) {
+        throw new Error('Réponse incomplète du serveur');
+      }
+
+      // Replace the pending bot bubble with the stored message
+      setMessages((prev) =>
+        prev.map((msg) => (msg.id === pendingBotId ? result.message : msg))
       );
 
-      // Add user message and bot response to messages
-      const newMessages = [...messages];
-      
-      // Find user message (should be the last one before bot response)
-      // Actually, we need to reload messages to get the complete conversation
-      await loadMessages(response.data.conversation.id);
-      
       // Update current conversation if it was a new one
       if (!currentConversationId) {
-        setCurrentConversationId(response.data.conversation.id);
+        setCurrentConversationId(result.conversation.id);
         await loadConversations();
       }
 
       setLoading(false);
+      return true;
     } catch (err) {
       console.error('Error sending message:', err);
-      setError(err.response?.data?.detail || 'Erreur lors de l\'envoi du message');
+      // Nothing was stored: drop both pending bubbles
+      setMessages((prev) => prev.filter((msg) => msg.id !== pendingUserId && msg.id !== pendingBotId));
+      setError(err.message || 'Erreur lors de l\'envoi du message');
       setLoading(false);
+      return false;
     }
   };
 
@@ -155,6 +291,10 @@ export const ChatProvider = ({ children }) => {
     deleteConversation,
     updateConversationTitle,
     loadConversations,
+    hasOlderConversations: Boolean(olderConversationsCursor),
+    loadOlderConversations,
+    hasOlderMessages: Boolean(olderMessagesCursor),
+    loadOlderMessages,
   };
 
   return <ChatContext.Provider value={value}>{children}</ChatContext.Provider>;